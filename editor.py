@@ -8,7 +8,7 @@ import argparse
 import sip
 sip.setapi('QString', 2)
 
-from PyQt4.QtGui import QApplication, QMainWindow
+from PyQt4.QtGui import QApplication, QMainWindow, QMessageBox
 
 
 def _parseCommandLine():
@@ -41,7 +41,7 @@ def main():
     import qutepart  # after correct sys.path has been set
 
     with open(ns.file) as file:
-        text = unicode(file.read(), 'utf8')
+        firstLine = unicode(file.readline(), 'utf8').rstrip('\r\n') or None
 
     if ns.debug:
         logging.getLogger('qutepart').setLevel(logging.DEBUG)
@@ -53,13 +53,15 @@ def main():
     qpart = qutepart.Qutepart()
     window.setCentralWidget(qpart)
 
-    firstLine = text.splitlines()[0] if text else None
     qpart.detectSyntax(sourceFilePath=ns.file, firstLine=firstLine)
     qpart.lineLengthEdge = 20
 
     qpart.indentUseTabs = True
 
-    qpart.text = text
+    loader = qpart.loadFile(ns.file, 'utf8')
+    loader.progress.connect(lambda loaded, total: window.statusBar().showMessage('Loading %d%%' % (loaded * 100 / max(total, 1))))
+    loader.finished.connect(lambda completely: window.statusBar().clearMessage())
+    loader.error.connect(lambda message: QMessageBox.critical(window, 'Failed to load', message))
 
     qpart.setWindowTitle(ns.file)
 
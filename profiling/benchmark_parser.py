@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+"""Headless parser benchmark.
+
+Highlights every file of the corpus (tests/test_syntax/files by default) with the C and the Python parser,
+as is and scaled up (lines are repeated). Every file is measured in a separate process.
+
+Measured per file and parser:
+    * syntax loading time
+    * lines/sec and bytes/sec for every scale
+    * allocations: count of objects, which are kept alive by the line data of all lines.
+      Measured with gc.get_objects(), because tracemalloc is not available in Python 2
+    * peak memory (max RSS) of the process
+    * highlighter convergence: count of lines, parsed after inserting '"' to the start of a line,
+      until line data became equal to the line data before the change. This is the way the SyntaxHighlighter works
+
+Results might be saved as JSON and compared with a saved baseline.
+Exit code is 1, if any metric regressed more than the threshold.
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import os.path
+import platform
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+_DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'test_syntax', 'files')
+_PARSERS = ('c', 'python')
+_CONVERGENCE_SAMPLES = 20
+
+# metric: True if bigger is better
+_METRICS = {'linesPerSec': True,
+            'bytesPerSec': True,
+            'loadTime': False,
+            'allocations': False,
+            'peakMemoryKb': False,
+            'convergenceMean': False}
+
+
+################################################################################
+##                               Child process
+################################################################################
+
+def _importSyntax(parserName):
+    """Import qutepart.syntax with the requested parser.
+    Returns (SyntaxManager class, parser name, which is really used)
+    """
+    if parserName == 'python':
+        sys.modules['qutepart.syntax.cParser'] = None  # ImportError. Loader falls back to the Python parser
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    import qutepart
+    from qutepart.syntax import SyntaxManager
+
+    return SyntaxManager, 'c' if qutepart.binaryParserAvailable else 'python'
+
+
+def _highlightLines(syntax, lines):
+    lineDataList = []
+    contextStack = None
+    for line in lines:
+        lineData, segments = syntax.highlightBlock(line, contextStack)
+        lineDataList.append(lineData)
+        contextStack = lineData[0]
+    return lineDataList
+
+
+def _measureConvergence(syntax, lines, lineDataList):
+    """Insert '"' to the start of sample lines and parse next lines while line data is changed.
+    Returns list of counts of parsed lines
+    """
+    counts = []
+    step = max(1, len(lines) / _CONVERGENCE_SAMPLES)
+    for index in range(0, len(lines), step):
+        contextStack = lineDataList[index - 1][0] if index > 0 else None
+        lineData, segments = syntax.highlightBlock(u'"' + lines[index], contextStack)
+        count = 1
+        for nextIndex in range(index + 1, len(lines)):
+            if lineData == lineDataList[nextIndex - 1]:
+                break
+            lineData, segments = syntax.highlightBlock(lines[nextIndex], lineData[0])
+            count += 1
+        counts.append(count)
+    return counts
+
+
+def _benchmarkFile(parserName, path, scales, connection):
+    try:
+        SyntaxManager, usedParserName = _importSyntax(parserName)
+        if usedParserName != parserName:
+            connection.send({'error': 'parser not available'})
+            return
+
+        with open(path, 'rb') as file_:
+            lines = [line.decode('utf8', 'replace').rstrip(u'\r\n') for line in file_]
+
+        timeBefore = time.time()
+        syntax = SyntaxManager().getSyntax(sourceFilePath=path, firstLine=lines[0] if lines else None)
+        loadTime = time.time() - timeBefore
+        if syntax is None:
+            connection.send({'error': 'syntax not detected'})
+            return
+
+        result = {'syntax': syntax.name, 'loadTime': loadTime, 'scales': {}}
+
+        for scale in scales:
+            scaledLines = lines * scale
+            byteCount = sum([len(line.encode('utf8')) + 1 for line in scaledLines])
+
+            gc.collect()
+            objectsBefore = len(gc.get_objects())
+            timeBefore = time.time()
+            lineDataList = _highlightLines(syntax, scaledLines)
+            seconds = max(time.time() - timeBefore, 1e-9)
+            gc.collect()
+            allocations = len(gc.get_objects()) - objectsBefore
+
+            result['scales'][str(scale)] = {'lines': len(scaledLines),
+                                            'bytes': byteCount,
+                                            'time': seconds,
+                                            'linesPerSec': len(scaledLines) / seconds,
+                                            'bytesPerSec': byteCount / seconds,
+                                            'allocations': allocations}
+            if scale == 1:
+                counts = _measureConvergence(syntax, lines, lineDataList)
+                if counts:
+                    result['convergenceMean'] = float(sum(counts)) / len(counts)
+                    result['convergenceMax'] = max(counts)
+            del lineDataList
+
+        if resource is not None:
+            result['peakMemoryKb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        connection.send(result)
+    except Exception as ex:
+        connection.send({'error': '%s: %s' % (ex.__class__.__name__, ex)})
+
+
+################################################################################
+##                               Main process
+################################################################################
+
+def _runInChildProcess(parserName, path, scales):
+    parentConnection, childConnection = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_benchmarkFile, args=(parserName, path, scales, childConnection))
+    process.start()
+    childConnection.close()  # otherwise recv() doesn't get EOF, if the child dies
+    try:
+        result = parentConnection.recv()
+    except EOFError:  # crashed, i.e. segfault in the C parser
+        result = None
+    finally:
+        parentConnection.close()
+    process.join()
+
+    if result is None:
+        result = {'error': 'Child process failed with exit code %s' % process.exitcode}
+    return result
+
+
+def _flatMetrics(result):
+    """Get dictionary metric name: value for comparison
+    """
+    metrics = {}
+    for name in ('loadTime', 'peakMemoryKb', 'convergenceMean'):
+        if name in result:
+            metrics[name] = result[name]
+    for scale, scaleResult in result.get('scales', {}).items():
+        for name in ('linesPerSec', 'bytesPerSec', 'allocations'):
+            metrics['%s[x%s]' % (name, scale)] = scaleResult[name]
+    return metrics
+
+
+def _compare(results, baseline, threshold, timeThreshold):
+    """Compare results with baseline. Return list of regressions as strings
+    """
+    regressions = []
+    for parserName, fileResults in results.items():
+        for fileName, result in fileResults.items():
+            baseResult = baseline.get(parserName, {}).get(fileName)
+            if baseResult is None or 'error' in result or 'error' in baseResult:
+                continue
+
+            metrics = _flatMetrics(result)
+            for name, baseValue in _flatMetrics(baseResult).items():
+                if not name in metrics or not baseValue:
+                    continue
+                value = metrics[name]
+                metric = name.split('[')[0]
+                allowed = timeThreshold if metric in ('linesPerSec', 'bytesPerSec', 'loadTime') else threshold
+                if _METRICS[metric]:
+                    change = (baseValue - value) / float(baseValue) * 100
+                else:
+                    change = (value - baseValue) / float(baseValue) * 100
+                if change > allowed:
+                    regressions.append('%s %s %s: %.4g -> %.4g (%.1f%% worse)' % \
+                                        (parserName, fileName, name, baseValue, value, change))
+    return regressions
+
+
+def _printSummary(results, scales):
+    for parserName, fileResults in sorted(results.items()):
+        print 'Parser:', parserName
+        print '    %-24s %-20s %9s %12s %12s %10s %8s' % \
+                ('file', 'syntax', 'load, ms', 'lines/sec', 'KB/sec', 'peak, MB', 'converg')
+        for fileName, result in sorted(fileResults.items()):
+            if 'error' in result:
+                print '    %-24s %s' % (fileName, result['error'])
+                continue
+            biggest = result['scales'][str(max(scales))]
+            print '    %-24s %-20s %9.1f %12.0f %12.1f %10s %8s' % \
+                    (fileName[:24], result['syntax'][:20], result['loadTime'] * 1000,
+                     biggest['linesPerSec'], biggest['bytesPerSec'] / 1024,
+                     '%.1f' % (result['peakMemoryKb'] / 1024.) if 'peakMemoryKb' in result else '-',
+                     '%.1f' % result['convergenceMean'] if 'convergenceMean' in result else '-')
+        print
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=_DEFAULT_CORPUS, help='Directory with source files')
+    parser.add_argument('--parsers', default=','.join(_PARSERS), help='Comma separated list of parsers: c,python')
+    parser.add_argument('--scales', default='1,10,100', help='Comma separated list of line count multipliers')
+    parser.add_argument('--filter', default='', help='Benchmark only files, which names contain this string')
+    parser.add_argument('--save', metavar='FILE', help='Save results as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare results with saved JSON')
+    parser.add_argument('--threshold', type=float, default=10.,
+                        help='Allowed regression in percents for memory, allocations and convergence')
+    parser.add_argument('--time-threshold', type=float, default=20.,
+                        help='Allowed regression in percents for speed and loading time')
+    args = parser.parse_args()
+
+    parserNames = [name for name in args.parsers.split(',') if name]
+    for name in parserNames:
+        if not name in _PARSERS:
+            parser.error('Unknown parser %s' % name)
+    scales = sorted([int(scale) for scale in args.scales.split(',')])
+
+    fileNames = sorted([fileName for fileName in os.listdir(args.corpus) \
+                            if args.filter in fileName and \
+                               os.path.isfile(os.path.join(args.corpus, fileName))])
+
+    results = {}
+    for parserName in parserNames:
+        results[parserName] = {}
+        for index, fileName in enumerate(fileNames):
+            sys.stderr.write('\r%s: [%d/%d] %-30s' % (parserName, index + 1, len(fileNames), fileName))
+            results[parserName][fileName] = _runInChildProcess(parserName,
+                                                               os.path.join(args.corpus, fileName),
+                                                               scales)
+        sys.stderr.write('\n')
+
+    _printSummary(results, scales)
+
+    if args.save:
+        with open(args.save, 'w') as file_:
+            json.dump({'meta': {'python': platform.python_version(),
+                                'platform': platform.platform(),
+                                'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                                'scales': scales},
+                       'results': results},
+                      file_, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as file_:
+            baseline = json.load(file_)['results']
+        regressions = _compare(results, baseline, args.threshold, args.time_threshold)
+        if regressions:
+            print 'Regressions:'
+            for regression in regressions:
+                print '    ' + regression
+            return 1
+        else:
+            print 'No regressions'
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Measure throughput of the headless highlighting API in MB/s
+
+Usage:
+    highlight_throughput.py FILE...
+"""
+
+import os.path
+import sys
+import time
+
+sys.path.insert(0, '.')
+sys.path.insert(0, '..')
+
+import qutepart
+from qutepart.syntax import SyntaxManager
+
+
+def measure(manager, path):
+    with open(path, 'rb') as file_:
+        firstLine = file_.readline().decode('utf8', 'replace').rstrip('\r\n')
+        file_.seek(0)
+
+        try:
+            # syntax is loaded before measuring
+            lines = manager.highlight(file_, sourceFilePath=path, firstLine=firstLine)
+        except KeyError:
+            return None
+
+        timeBefore = time.time()
+        lineCount = 0
+        for spans in lines:
+            lineCount += 1
+        timeAfter = time.time()
+
+    return lineCount, timeAfter - timeBefore
+
+
+def main():
+    if len(sys.argv) < 2:
+        print __doc__
+        return 1
+
+    print 'Parser:', 'C' if qutepart.binaryParserAvailable else 'Python'
+
+    manager = SyntaxManager()
+    totalBytes = 0
+    totalTime = 0.
+
+    for path in sys.argv[1:]:
+        result = measure(manager, path)
+        if result is None:
+            print '%-40s syntax not detected' % path
+            continue
+
+        lineCount, seconds = result
+        size = os.path.getsize(path)
+        totalBytes += size
+        totalTime += seconds
+        print '%-40s %7d lines %8.3f MB %8.3f sec %8.3f MB/s' % \
+                (path, lineCount, size / 1024. / 1024., seconds, size / 1024. / 1024. / max(seconds, 1e-9))
+
+    if totalTime:
+        print 'Total: %.3f MB in %.3f sec. %.3f MB/s' % \
+                (totalBytes / 1024. / 1024., totalTime, totalBytes / 1024. / 1024. / totalTime)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Compare bulk operations of the Lines API with the line by line access
+
+Usage:
+    lines_bulk_benchmark.py [LINE_COUNT]
+"""
+
+import sys
+import time
+
+sys.path.insert(0, '.')
+sys.path.insert(0, '..')
+
+import sip
+sip.setapi('QString', 2)
+
+from PyQt4.QtGui import QApplication
+
+import qutepart
+
+
+def _measure(name, qpart, text, function):
+    qpart.text = text
+    qpart.detectSyntax(language='Python')
+    app.processEvents()
+
+    timeBefore = time.time()
+    function(qpart)
+    seconds = time.time() - timeBefore
+    print '%-40s %8.3f sec' % (name, seconds)
+
+
+def main():
+    lineCount = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    text = '\n'.join(['    value_%d = compute(%d)  # comment' % (i, i) for i in range(lineCount)])
+    newLines = ['    value_%d = %d' % (i, i) for i in range(lineCount)]
+
+    qpart = qutepart.Qutepart()
+    print '%d lines' % lineCount
+
+    _measure('read line by line',
+             qpart, text, lambda qpart: [qpart.lines[i] for i in range(lineCount)])
+    _measure('read slice',
+             qpart, text, lambda qpart: qpart.lines[:])
+
+    def setLineByLine(qpart):
+        with qpart:
+            for i, line in enumerate(newLines):
+                qpart.lines[i] = line
+    _measure('write line by line', qpart, text, setLineByLine)
+    _measure('write slice',
+             qpart, text, lambda qpart: qpart.lines.__setitem__(slice(0, lineCount), newLines))
+
+    def setEverySecondLine(qpart):
+        with qpart:
+            for i in range(0, lineCount, 2):
+                qpart.lines[i] = newLines[i]
+    _measure('write every second line by line', qpart, text, setEverySecondLine)
+    _measure('write every second with replaceMany',
+             qpart, text, lambda qpart: qpart.lines.replaceMany(dict([(i, newLines[i]) \
+                                                                      for i in range(0, lineCount, 2)])))
+
+    def deleteLineByLine(qpart):
+        with qpart:
+            for i in range(lineCount - 1, lineCount // 2 - 1, -1):
+                del qpart.lines[i]
+    _measure('delete half line by line', qpart, text, deleteLineByLine)
+    _measure('delete half with slice',
+             qpart, text, lambda qpart: qpart.lines.__delitem__(slice(lineCount // 2, lineCount)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    sys.exit(main())
@@ -1,68 +1,361 @@
 #!/usr/bin/env python
+"""Typing latency harness.
 
+Replays scripted edit sessions against files and measures latency of every key press.
+Latency is measured from sending the key until all pending events are processed,
+so it includes the syntax highlighter, the completer, the bracket highlighter, extra selections and painting.
+
+Time of the subsystems is measured by hooks, installed to the Qutepart classes before the widget is created.
+Time of a subsystem doesn't include time of other subsystems, called by it.
+'other' is time, not attributed to any subsystem. Qt layout and painting.
+
+Sessions:
+    typing   - retype the first lines of the file, as a user does
+    paste    - paste blocks of lines to different places
+    undo     - type a word at the end of a line and undo it
+    indent   - indent and unindent blocks of lines
+    move     - move lines up and down
+
+Qt 4 requires a display. Use i.e. xvfb-run on a headless machine
+
+Usage:
+    typing_performance_test.py [options] FILE...
+"""
+
+import argparse
+import json
 import sys
 import time
+import timeit
+
+sys.path.insert(0, '.')
+sys.path.insert(0, '..')
 
 import sip
 sip.setapi('QString', 2)
 
-from PyQt4.QtCore import QTimer, Qt
-from PyQt4.QtGui import QApplication, QPlainTextEdit
+from PyQt4.QtCore import QTimer, Qt, QT_VERSION_STR
+from PyQt4.QtGui import QApplication, QTextCursor
 from PyQt4.QtTest import QTest
 
 import qutepart
+from qutepart.syntaxhlighter import SyntaxHighlighter
+from qutepart.completer import Completer
+from qutepart.brackethlighter import BracketHighlighter
+
+
+_SESSIONS = ('typing', 'paste', 'undo', 'indent', 'move')
+_PERCENTILES = (50, 95, 99)
+_SETTLE_TIMEOUT = 1.  # max time of processing events after a key press
+
+
+################################################################################
+##                               Subsystem hooks
+################################################################################
+
+class _SubsystemTimer:
+    """Accumulates own time of the hooked methods per subsystem
+    """
+    def __init__(self):
+        self.times = {}
+        self._stack = []  # [startTime, timeOfNestedCalls]
+
+    def reset(self):
+        self.times = {}
+
+    def hook(self, cls, methodName, subsystem):
+        """Replace the method of the class with a measuring wrapper.
+        Must be called before instances are created, because Qt signals are connected to bound methods
+        """
+        method = getattr(cls, methodName)
+        timer = self
+
+        def wrapper(*args, **kwargs):
+            timer._stack.append([timeit.default_timer(), 0.])
+            try:
+                return method(*args, **kwargs)
+            finally:
+                startTime, nestedTime = timer._stack.pop()
+                elapsed = timeit.default_timer() - startTime
+                timer.times[subsystem] = timer.times.get(subsystem, 0.) + elapsed - nestedTime
+                if timer._stack:
+                    timer._stack[-1][1] += elapsed
+
+        wrapper.__name__ = methodName
+        wrapper.__doc__ = method.__doc__
+        setattr(cls, methodName, wrapper)
+
+
+def _installHooks(timer):
+    timer.hook(qutepart.Qutepart, 'keyPressEvent', 'keyPressEvent')
+    timer.hook(qutepart.Qutepart, '_updateExtraSelections', 'extraSelections')
+    timer.hook(SyntaxHighlighter, '_onContentsChange', 'highlighter')
+    # long highlighting and background jobs are continued from the timer
+    timer.hook(SyntaxHighlighter, '_onContinueHighlighting', 'highlighter')
+    timer.hook(SyntaxHighlighter, '_onContinueJob', 'highlighter')
+    timer.hook(Completer, 'eventFilter', 'completer')
+    timer.hook(BracketHighlighter, 'extraSelections', 'bracketHighlighter')
 
 
-app = QApplication(sys.argv)
+################################################################################
+##                               Edit sessions
+################################################################################
+# Session is a generator. It prepares the editor and yields (operation, key).
+# key is a string to type or (Qt.Key, Qt.KeyboardModifiers).
+# Only handling of the yielded keys is measured
 
-q = qutepart.Qutepart()
-q.detectSyntax(sourceFilePath=sys.argv[1])
-print 'Language:', q.language()
+def _moveCursor(qpart, line, column=None, selectToLine=None):
+    cursor = qpart.textCursor()
+    block = qpart.document().findBlockByNumber(line)
+    cursor.setPosition(block.position() + (block.length() - 1 if column is None else column))
+    if selectToLine is not None:
+        endBlock = qpart.document().findBlockByNumber(selectToLine)
+        cursor.setPosition(endBlock.position() + endBlock.length() - 1, QTextCursor.KeepAnchor)
+    qpart.setTextCursor(cursor)
 
-q.showMaximized()
 
-with open(sys.argv[1]) as file_:
-    text = file_.read()
+def _sampleLines(qpart, count, margin=0):
+    """Line numbers, evenly distributed over the document
+    """
+    lineCount = max(1, len(qpart.lines) - margin)
+    step = max(1, lineCount / count)
+    return range(0, lineCount, step)[:count]
 
-clickTimes = {}
 
-def click(key):
-    clockBefore = time.clock()
+def _typingSession(qpart, text, args):
+    qpart.text = ''
+    for line in text.splitlines()[:args.lines]:
+        indentWidth = len(line) - len(line.lstrip())
+        while qpart.textCursor().positionInBlock() > indentWidth:
+            yield 'backspace', (Qt.Key_Backspace, Qt.NoModifier)
+        for i in range(indentWidth - qpart.textCursor().positionInBlock()):
+            yield 'type', (Qt.Key_Space, Qt.NoModifier)
+
+        for char in line[indentWidth:]:
+            yield 'type', char
+        yield 'enter', (Qt.Key_Enter, Qt.NoModifier)
+
+
+def _pasteSession(qpart, text, args):
+    qpart.text = text
+    lines = text.splitlines()
+    for line in _sampleLines(qpart, args.operations):
+        QApplication.clipboard().setText('\n'.join(lines[line:line + 10]) + '\n')
+        _moveCursor(qpart, line, column=0)
+        yield 'paste', (Qt.Key_V, Qt.ControlModifier)
+
+
+def _undoSession(qpart, text, args):
+    qpart.text = text
+    for line in _sampleLines(qpart, args.operations):
+        _moveCursor(qpart, line)
+        for char in ' foo(bar)':
+            yield 'type', char
+        yield 'undo', (Qt.Key_Z, Qt.ControlModifier)
+
+
+def _indentSession(qpart, text, args):
+    qpart.text = text
+    for line in _sampleLines(qpart, args.operations, margin=10):
+        _moveCursor(qpart, line, column=0, selectToLine=min(line + 10, len(qpart.lines) - 1))
+        yield 'indent', (Qt.Key_Tab, Qt.NoModifier)
+        yield 'unindent', (Qt.Key_Tab, Qt.ShiftModifier)
+
+
+def _moveSession(qpart, text, args):
+    qpart.text = text
+    for line in _sampleLines(qpart, args.operations, margin=5):
+        _moveCursor(qpart, line, column=0)
+        for i in range(3):
+            yield 'moveLine', (Qt.Key_Down, Qt.AltModifier)
+        for i in range(3):
+            yield 'moveLine', (Qt.Key_Up, Qt.AltModifier)
+
+
+_SESSION_FUNCTIONS = {'typing': _typingSession,
+                      'paste': _pasteSession,
+                      'undo': _undoSession,
+                      'indent': _indentSession,
+                      'move': _moveSession}
+
+
+################################################################################
+##                               Measuring
+################################################################################
+
+def _processPendingEvents(app):
+    """Process events until the queue is empty.
+    Timeout is used, because on Windows hasPendingEvents() always returns True
+    """
+    timeBefore = timeit.default_timer()
+    app.processEvents()
+    while app.hasPendingEvents() and timeit.default_timer() - timeBefore < _SETTLE_TIMEOUT:
+        app.processEvents()
 
+
+def _press(app, qpart, key):
+    """Send the key and return latency in seconds
+    """
+    timeBefore = timeit.default_timer()
     if isinstance(key, basestring):
-        QTest.keyClicks(q, key)
+        QTest.keyClicks(qpart, key)
     else:
-        QTest.keyClick(q, key)
-    while app.hasPendingEvents():
-        app.processEvents()
+        QTest.keyClick(qpart, key[0], key[1])
+    _processPendingEvents(app)
+    return timeit.default_timer() - timeBefore
 
-    clockAfter = time.clock()
-    ms = int((clockAfter - clockBefore) * 1000)
-    clickTimes[ms] = clickTimes.get(ms, 0) + 1
 
-def doTest():
-    clockBefore = time.clock()
-    for line in text.splitlines():
-        indentWidth = len(line) - len(line.lstrip())
-        while q.textCursor().positionInBlock() > indentWidth:
-            click(Qt.Key_Backspace)
-        for i in range(indentWidth - q.textCursor().positionInBlock()):
-            click(Qt.Key_Space)
-
-        line = line[indentWidth:]
-        for char in line:
-            click(char)
-        click(Qt.Key_Enter)
-
-    clockAfter = time.clock()
-    typingTime = clockAfter - clockBefore
-    print 'Typed {} chars in {} sec. {} ms per character'.format(len(text), typingTime, typingTime * 1000 / len(text))
-    print 'Time per click: count of clicks'
-    clickTimeKeys = sorted(clickTimes.keys())
-    for ckt in clickTimeKeys:
-        print '       %5dms:            %4d' % (ckt, clickTimes[ckt])
-
-    app.quit()
-
-QTimer.singleShot(0, doTest)
-app.exec_()
+def _runSession(app, qpart, timer, sessionName, text, args):
+    """Returns list of samples (operation, latency, {subsystem: seconds})
+    """
+    samples = []
+    for operation, key in _SESSION_FUNCTIONS[sessionName](qpart, text, args):
+        _processPendingEvents(app)  # finish preparation, made by the session
+        timer.reset()
+        latency = _press(app, qpart, key)
+        times = timer.times
+        times['other'] = max(0., latency - sum(times.values()))
+        samples.append((operation, latency, times))
+    return samples
+
+
+def _percentile(sortedValues, percent):
+    """Nearest rank percentile
+    """
+    index = max(0, int(round(percent / 100. * len(sortedValues))) - 1)
+    return sortedValues[min(index, len(sortedValues) - 1)]
+
+
+def _latencyStats(latencies):
+    latencies = sorted(latencies)
+    stats = {'count': len(latencies),
+             'mean': sum(latencies) / len(latencies),
+             'max': latencies[-1]}
+    for percent in _PERCENTILES:
+        stats['p%d' % percent] = _percentile(latencies, percent)
+    return stats
+
+
+def _report(samples):
+    """Make report dictionary from the samples
+    """
+    report = {'total': _latencyStats([latency for operation, latency, times in samples]),
+              'operations': {},
+              'subsystems': {}}
+
+    operations = {}
+    for operation, latency, times in samples:
+        operations.setdefault(operation, []).append(latency)
+    for operation, latencies in operations.items():
+        report['operations'][operation] = _latencyStats(latencies)
+
+    totalTime = sum([latency for operation, latency, times in samples])
+    subsystems = {}
+    for operation, latency, times in samples:
+        for subsystem, seconds in times.items():
+            subsystems.setdefault(subsystem, []).append(seconds)
+    for subsystem, values in subsystems.items():
+        values += [0.] * (len(samples) - len(values))  # subsystem was not called for some keys
+        stats = _latencyStats(values)
+        stats['share'] = sum(values) / totalTime if totalTime else 0.
+        report['subsystems'][subsystem] = stats
+
+    return report
+
+
+def _printStats(name, stats, share=None):
+    print '    %-20s %6d %8.2f %8.2f %8.2f %8.2f %8.2f %s' % \
+            ((name, stats['count']) + \
+             tuple([stats[key] * 1000 for key in ('mean', 'p50', 'p95', 'p99', 'max')]) + \
+             ('%5.1f%%' % (share * 100) if share is not None else '',))
+
+
+def _printReport(title, report):
+    print title
+    print '    %-20s %6s %8s %8s %8s %8s %8s' % ('ms', 'count', 'mean', 'p50', 'p95', 'p99', 'max')
+    _printStats('all keys', report['total'])
+    for operation, stats in sorted(report['operations'].items()):
+        _printStats(operation, stats)
+    print '  subsystems:'
+    for subsystem, stats in sorted(report['subsystems'].items(), key=lambda item: item[1]['share'], reverse=True):
+        _printStats(subsystem, stats, stats['share'])
+    print
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', metavar='FILE', help='Source file')
+    parser.add_argument('-l', '--language', help='Language. Detected by file name, if not set')
+    parser.add_argument('-s', '--sessions', default=','.join(_SESSIONS),
+                        help='Comma separated list of sessions: %s' % ','.join(_SESSIONS))
+    parser.add_argument('--lines', type=int, default=100, help='Count of lines to type in the typing session')
+    parser.add_argument('--operations', type=int, default=20, help='Count of operations in other sessions')
+    parser.add_argument('--no-completion', action='store_true', help='Disable autocompletion')
+    parser.add_argument('--json', metavar='FILE', help='Save reports as JSON')
+    args = parser.parse_args()
+
+    sessionNames = [name for name in args.sessions.split(',') if name]
+    for name in sessionNames:
+        if not name in _SESSIONS:
+            parser.error('Unknown session %s' % name)
+
+    app = QApplication(sys.argv)
+
+    timer = _SubsystemTimer()
+    _installHooks(timer)
+
+    results = {'meta': {'qutepart': '.'.join([str(part) for part in qutepart.VERSION]),
+                        'parser': 'C' if qutepart.binaryParserAvailable else 'Python',
+                        'qt': QT_VERSION_STR,
+                        'date': time.strftime('%Y-%m-%d %H:%M:%S')},
+               'files': {}}
+
+    def run():
+        try:
+            allSamples = []
+            for path in args.files:
+                with open(path, 'rb') as file_:
+                    text = file_.read().decode('utf8', 'replace')
+
+                qpart = qutepart.Qutepart()
+                qpart.completionEnabled = not args.no_completion
+                qpart.resize(800, 600)
+                qpart.show()
+                QTest.qWaitForWindowShown(qpart)
+
+                if args.language:
+                    qpart.detectSyntax(language=args.language)
+                else:
+                    qpart.detectSyntax(sourceFilePath=path, firstLine=text.split('\n', 1)[0])
+                print '%s. Language: %s' % (path, qpart.language())
+                print
+
+                results['files'][path] = {'language': qpart.language(), 'sessions': {}}
+                for sessionName in sessionNames:
+                    samples = _runSession(app, qpart, timer, sessionName, text, args)
+                    if not samples:
+                        continue
+                    report = _report(samples)
+                    results['files'][path]['sessions'][sessionName] = report
+                    _printReport('Session: %s' % sessionName, report)
+                    allSamples += samples
+
+                qpart.hide()
+
+            if allSamples:
+                results['total'] = _report(allSamples)
+                _printReport('Total', results['total'])
+
+            if args.json:
+                with open(args.json, 'w') as file_:
+                    json.dump(results, file_, indent=1, sort_keys=True)
+        finally:
+            app.quit()
+
+    QTimer.singleShot(0, run)
+    app.exec_()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Geometry of indentation markers, line length edge and whitespace symbols.
+Painted by Qutepart over the text
+"""
+
+from PyQt4.QtCore import QLine, QRect
+
+
+def _cursorToX(line, column):
+    """x position of the column in the QTextLine
+    """
+    result = line.cursorToX(column)
+    return result[0] if isinstance(result, tuple) else result  # PyQt4 returns (x, cursorPos)
+
+
+class BlockMarkers:
+    """Markers of a block. Coordinates are relative to the top left corner of the block.
+
+    * ``indentMarkers`` - list of (column, QLine)
+    * ``edge`` - (column, QLine) or None
+    * ``spaceRects`` - list of QRect for space symbols
+    * ``tabLines`` - list of QLine for tab symbols
+    """
+    def __init__(self, text, userData):
+        self.text = text
+        self.userData = userData  # highlighter sets new user data, when it applies new formats
+        self.indentMarkers = []
+        self.edge = None
+        self.spaceRects = []
+        self.tabLines = []
+
+
+class BlockMarkersCache:
+    """Markers geometry is calculated once from the block layout, not with QTextCursor for every marker,
+    and cached, until text or highlighting of the block is changed.
+    Whole cache is dropped, when settings, which affect markers or layout, i.e. font, width or wrap mode, are changed
+    """
+    _MAX_SIZE = 4096
+
+    def __init__(self, qpart):
+        self._qpart = qpart
+        self._settings = None
+        self._blocks = {}  # block number: BlockMarkers
+
+    def _currentSettings(self):
+        qpart = self._qpart
+        return (qpart._indenter.text(),
+                qpart.indentWidth,
+                qpart.lineLengthEdge,
+                qpart.drawWhiteSpaceTrailing,
+                qpart.drawWhiteSpaceAnyIndentation,
+                qpart.font().key(),
+                qpart.tabStopWidth(),
+                qpart.viewport().width(),
+                qpart.lineWrapMode(),
+                qpart.lineWrapColumnOrWidth(),
+                qpart.wordWrapMode())
+
+    def markers(self, block):
+        """BlockMarkers of the block or None, if the block is not laid out
+        """
+        settings = self._currentSettings()
+        if settings != self._settings:
+            self._settings = settings
+            self._blocks = {}
+
+        blockNumber = block.blockNumber()
+        text = block.text()
+        userData = block.userData()
+        markers = self._blocks.get(blockNumber)
+        if markers is not None and \
+           markers.text == text and \
+           markers.userData is userData:
+            return markers
+
+        layout = block.layout()
+        if layout is None or layout.lineCount() == 0:
+            return None
+
+        markers = self._calculate(layout, text, userData)
+        if len(self._blocks) >= self._MAX_SIZE:
+            self._blocks = {}
+        self._blocks[blockNumber] = markers
+        return markers
+
+    def _effectiveEdgePos(self, text):
+        """Position of edge in a block.
+        Defined by lineLengthEdge, but visible width of \t is more than 1,
+        therefore effective position depends on count and position of \t symbols
+        Return -1 if line is too short to have edge
+        """
+        lineLengthEdge = self._qpart.lineLengthEdge
+        indentWidth = self._qpart.indentWidth
+        if lineLengthEdge is None:
+            return -1
+
+        tabExtraWidth = indentWidth - 1
+        fullWidth = len(text) + (text.count('\t') * tabExtraWidth)
+        if fullWidth <= lineLengthEdge:
+            return -1
+
+        if not '\t' in text:
+            return lineLengthEdge
+
+        currentWidth = 0
+        for pos, char in enumerate(text):
+            if char == '\t':
+                # Qt indents up to indentation level, so visible \t width depends on position
+                currentWidth += (indentWidth - (currentWidth % indentWidth))
+            else:
+                currentWidth += 1
+            if currentWidth > lineLengthEdge:
+                return pos
+        else:  # line too narrow, probably visible \t width is small
+            return -1
+
+    def _calculate(self, layout, text, userData):
+        qpart = self._qpart
+        markers = BlockMarkers(text, userData)
+
+        def verticalLine(column):
+            """Line at the left side of the cursor rectangle before the column
+            """
+            line = layout.lineForTextPosition(column)
+            x = int(round(_cursorToX(line, column)))
+            top = int(round(line.y()))
+            return QLine(x, top, x, top + int(round(line.height())) - 1)
+
+        indentText = qpart._indenter.text()
+        indentWidthChars = len(indentText)
+        if not qpart.drawWhiteSpaceAnyIndentation:
+            column = indentWidthChars
+            rest = text
+            while rest.startswith(indentText) and \
+                  len(rest) > indentWidthChars and \
+                  rest[indentWidthChars].isspace():
+                if column != qpart.lineLengthEdge:
+                    markers.indentMarkers.append((column, verticalLine(column)))
+
+                rest = rest[indentWidthChars:]
+                column += indentWidthChars
+
+        edgePos = self._effectiveEdgePos(text)
+        if edgePos != -1:
+            markers.edge = (edgePos, verticalLine(edgePos))
+
+        if qpart.drawWhiteSpaceTrailing or qpart.drawWhiteSpaceAnyIndentation:
+            lastNonSpaceColumn = len(text.rstrip()) - 1
+            for column, char in enumerate(text):
+                if not char.isspace():
+                    continue
+
+                isIndentation = char == '\t' or column == 0 or text[column - 1].isspace()
+                if not (isIndentation and qpart.drawWhiteSpaceAnyIndentation) and \
+                   not (column > lastNonSpaceColumn and qpart.drawWhiteSpaceTrailing):
+                    continue
+
+                line = layout.lineForTextPosition(column)
+                if line.lineNumber() != layout.lineForTextPosition(column + 1).lineNumber():
+                    continue  # not on the same visual line
+
+                left = int(round(_cursorToX(line, column)))
+                right = int(round(_cursorToX(line, column + 1)))
+                top = int(round(line.y()))
+                middleHeight = (top + top + int(round(line.height())) - 1) / 2
+                if char == ' ':
+                    markers.spaceRects.append(QRect((left + right) / 2, middleHeight, 2, 2))
+                else:
+                    markers.tabLines.append(QLine(left + 3, middleHeight, right - 3, middleHeight))
+
+        return markers
@@ -7,6 +7,8 @@ import time
 from PyQt4.QtCore import Qt
 from PyQt4.QtGui import QTextCursor, QTextEdit
 
+from qutepart.bracketindex import BlockBrackets, START_BRACKETS
+
 
 class _TimeoutException(UserWarning):
     """Operation timeout happened
@@ -18,79 +20,76 @@ class BracketHighlighter:
     """Bracket highliter.
     Calculates list of QTextEdit.ExtraSelection
 
-    Currently, this class might be just a set of functions.
-    Probably, it will contain instance specific selection colors later
+    Brackets of blocks are summarized once (see bracketindex module) and cached with the highlighter block data.
+    If the syntax is known, and the BracketTree of the highlighter is built, the matching bracket is found with the tree.
+    Otherwise, or while the text is being modified atomically, search is limited in time,
+    and it skips blocks, which can't contain the matching bracket, without looking at the text
     """
     _MAX_SEARCH_TIME_SEC = 0.02
 
-    _START_BRACKETS = '({['
-    _END_BRACKETS = ')}]'
-    _ALL_BRACKETS = _START_BRACKETS + _END_BRACKETS
-    _OPOSITE_BRACKET = dict( (bracket, oposite)
-                    for (bracket, oposite) in zip(_START_BRACKETS + _END_BRACKETS, _END_BRACKETS + _START_BRACKETS))
+    def _blockBrackets(self, qpart, block):
+        """BlockBrackets of the block. Cached by the syntax highlighter
+        """
+        if qpart._highlighter is not None:
+            return qpart._highlighter.blockBrackets(block)
+        else:
+            return BlockBrackets(block.text(), None)
 
-    def _iterateDocumentCharsForward(self, block, startColumnIndex):
-        """Traverse document forward. Yield (block, columnIndex, char)
-        Raise _TimeoutException if time is over
+    def _findMatchingBracket(self, bracket, qpart, block, columnIndex):
+        """Find matching bracket for the bracket.
+        Return (block, columnIndex) or (None, None)
+        Raise _TimeoutException, if time is over
         """
-        # Chars in the start line
         endTime = time.time() + self._MAX_SEARCH_TIME_SEC
-        for columnIndex, char in list(enumerate(block.text()))[startColumnIndex:]:
-            yield block, columnIndex, char
-        block = block.next()
-
-        # Next lines
-        while block.isValid():
-            for columnIndex, char in enumerate(block.text()):
-                yield block, columnIndex, char
 
-            if time.time() > endTime:
-                raise _TimeoutException('Time is over')
-
-            block = block.next()
+        tree = qpart._bracketTree()
+        if tree is not None and tree.update(endTime):  # otherwise the tree is still being built in the background
+            found = tree.findMatchingBracket(block.blockNumber(), columnIndex)
+            if found is not None:
+                matchedBlockNumber, matchedColumnIndex = found
+                return qpart.document().findBlockByNumber(matchedBlockNumber), matchedColumnIndex
+            else:
+                return None, None
 
-    def _iterateDocumentCharsBackward(self, block, startColumnIndex):
-        """Traverse document forward. Yield (block, columnIndex, char)
-        Raise _TimeoutException if time is over
-        """
-        # Chars in the start line
-        endTime = time.time() + self._MAX_SEARCH_TIME_SEC
-        for columnIndex, char in reversed(list(enumerate(block.text()[:startColumnIndex]))):
-            yield block, columnIndex, char
-        block = block.previous()
+        forward = bracket in START_BRACKETS
+        depth = 1
 
-        # Next lines
+        # Brackets in the start block
+        summary = self._blockBrackets(qpart, block).pair(bracket)
+        if summary is not None:
+            if forward:
+                brackets = [item for item in summary.brackets if item[0] > columnIndex]
+            else:
+                brackets = [item for item in reversed(summary.brackets) if item[0] < columnIndex]
+            for bracketColumnIndex, delta in brackets:
+                depth += delta if forward else -delta
+                if depth == 0:
+                    return block, bracketColumnIndex
+
+        # Next blocks. A block contains the matching bracket, if the depth becomes 0 somewhere inside it
+        block = block.next() if forward else block.previous()
         while block.isValid():
-            for columnIndex, char in reversed(list(enumerate(block.text()))):
-                yield block, columnIndex, char
-
-            if time.time() > endTime:
+            summary = self._blockBrackets(qpart, block).pair(bracket)
+            if summary is not None:
+                if forward and depth + summary.minPrefixDepth <= 0:
+                    for bracketColumnIndex, delta in summary.brackets:
+                        depth += delta
+                        if depth == 0:
+                            return block, bracketColumnIndex
+                elif not forward and depth - summary.maxSuffixDepth <= 0:
+                    for bracketColumnIndex, delta in reversed(summary.brackets):
+                        depth -= delta
+                        if depth == 0:
+                            return block, bracketColumnIndex
+
+                depth += summary.depthChange if forward else -summary.depthChange
+
+            if time.time() > endTime:  # summaries of the blocks are not cached yet and the document is huge
                 raise _TimeoutException('Time is over')
 
-            block = block.previous()
-
-    def _findMatchingBracket(self, bracket, qpart, block, columnIndex):
-        """Find matching bracket for the bracket.
-        Return (block, columnIndex) or (None, None)
-        Raise _TimeoutException, if time is over
-        """
-        if bracket in self._START_BRACKETS:
-            charsGenerator = self._iterateDocumentCharsForward(block, columnIndex + 1)
-        else:
-            charsGenerator = self._iterateDocumentCharsBackward(block, columnIndex)
+            block = block.next() if forward else block.previous()
 
-        depth = 1
-        oposite = self._OPOSITE_BRACKET[bracket]
-        for block, columnIndex, char in charsGenerator:
-            if qpart.isCode(block, columnIndex):
-                if char == oposite:
-                    depth -= 1
-                    if depth == 0:
-                        return block, columnIndex
-                elif char == bracket:
-                    depth += 1
-        else:
-            return None, None
+        return None, None
 
     def _makeMatchSelection(self, block, columnIndex, matched):
         """Make matched or unmatched QTextEdit.ExtraSelection
@@ -127,15 +126,13 @@ class BracketHighlighter:
     def extraSelections(self, qpart, block, columnIndex):
         """List of QTextEdit.ExtraSelection's, which highlighte brackets
         """
-        blockText = block.text()
+        blockBrackets = self._blockBrackets(qpart, block)
+        blockText = blockBrackets.text
 
         if columnIndex > 0 and \
-           blockText[columnIndex - 1] in self._ALL_BRACKETS and \
-           qpart.isCode(block, columnIndex - 1):
+           blockBrackets.isCodeBracket(columnIndex - 1):
             return self._highlightBracket(blockText[columnIndex - 1], qpart, block, columnIndex - 1)
-        elif columnIndex < len(blockText) and \
-             blockText[columnIndex] in self._ALL_BRACKETS and \
-             qpart.isCode(block, columnIndex):
+        elif blockBrackets.isCodeBracket(columnIndex):
             return self._highlightBracket(blockText[columnIndex], qpart, block, columnIndex)
         else:
             return []
@@ -0,0 +1,431 @@
+"""Summaries of brackets of text blocks.
+
+Brackets of a block are found once and cached with the block data of the highlighter.
+The summary contains columns of code brackets, net depth change of the block, minimal prefix depth and maximal
+suffix depth. Bracket search skips blocks, which can't contain the matching bracket, without looking at the text.
+
+BracketTree aggregates the summaries of all blocks of a document and finds brackets in O(log(n)) time
+"""
+
+import bisect
+import re
+import time
+
+
+START_BRACKETS = '({['
+END_BRACKETS = ')}]'
+ALL_BRACKETS = START_BRACKETS + END_BRACKETS
+OPOSITE_BRACKET = dict( (bracket, oposite)
+                for (bracket, oposite) in zip(START_BRACKETS + END_BRACKETS, END_BRACKETS + START_BRACKETS))
+
+_BRACKET_REG_EXP = re.compile(r'[\(\)\{\}\[\]]')
+_PAIR_KEY = dict([(bracket, (bracket, 1)) for bracket in START_BRACKETS] + \
+                 [(bracket, (OPOSITE_BRACKET[bracket], -1)) for bracket in END_BRACKETS])
+
+
+class BracketPairSummary:
+    """Brackets of one type, i.e. ``(`` and ``)``, in a block.
+
+    Attributes:
+
+    * ``brackets`` - list of ``(column, delta)``, where delta is 1 for start and -1 for end bracket
+    * ``depthChange`` - sum of deltas
+    * ``minPrefixDepth`` - minimal depth, reached while going forward from the start of the block. 0 or negative
+    * ``maxSuffixDepth`` - maximal sum of deltas of brackets from a bracket to the end of the block. 0 or positive
+    """
+    def __init__(self):
+        self.brackets = []
+        self.depthChange = 0
+        self.minPrefixDepth = 0
+        self.maxSuffixDepth = 0
+
+    def _finish(self):
+        depth = 0
+        minDepth = 0
+        for column, delta in self.brackets:
+            depth += delta
+            if depth < minDepth:
+                minDepth = depth
+        self.depthChange = depth
+        self.minPrefixDepth = minDepth
+        # suffix sum = depthChange - prefix sum before the bracket. Maximal, when the prefix sum is minimal
+        self.maxSuffixDepth = depth - minDepth
+
+
+class BlockBrackets:
+    """Code brackets of a block.
+    ``text`` is the text, for which the summary has been built. Summary is not valid, if the block text has changed.
+
+    If ``codeOnly`` is set, only brackets in code are taken, otherwise brackets in comments are ignored,
+    but brackets in strings are taken
+    """
+    def __init__(self, text, textTypeMap, codeOnly=True):
+        self.text = text
+        self._pairs = {}  # start bracket: BracketPairSummary
+
+        mapLength = len(textTypeMap) if textTypeMap is not None else 0
+        for match in _BRACKET_REG_EXP.finditer(text):
+            column = match.start()
+            if column < mapLength:
+                textType = textTypeMap[column]
+                if (codeOnly and textType != ' ') or \
+                   textType in 'cbh':  # not a code or a comment
+                    continue
+
+            key, delta = _PAIR_KEY[match.group()]
+            summary = self._pairs.get(key)
+            if summary is None:
+                summary = self._pairs[key] = BracketPairSummary()
+            summary.brackets.append((column, delta))
+
+        for summary in self._pairs.values():
+            summary._finish()
+
+    def pair(self, bracket):
+        """BracketPairSummary for the bracket type or None, if the block has no such brackets
+        """
+        if bracket in END_BRACKETS:
+            bracket = OPOSITE_BRACKET[bracket]
+        return self._pairs.get(bracket)
+
+    def isCodeBracket(self, column):
+        """Check if character at column is a code bracket
+        """
+        if column >= len(self.text) or not self.text[column] in ALL_BRACKETS:
+            return False
+        summary = self.pair(self.text[column])
+        return summary is not None and \
+               any([bracketColumn == column for bracketColumn, delta in summary.brackets])
+
+
+_TYPE_INDEX = dict([(bracket, START_BRACKETS.index(bracket)) for bracket in START_BRACKETS] + \
+                   [(bracket, START_BRACKETS.index(OPOSITE_BRACKET[bracket])) for bracket in END_BRACKETS])
+_EMPTY_SUMMARY = ((0, 0, 0),) * len(START_BRACKETS)  # (depthChange, minPrefixDepth, maxSuffixDepth) per type
+
+
+def _combine(left, right):
+    """Summary of 2 adjacent ranges
+    """
+    return tuple([(l[0] + r[0], min(l[1], l[0] + r[1]), max(r[2], r[0] + l[2])) \
+                        for l, r in zip(left, right)])
+
+
+class BracketTree:
+    """Bracket summaries of all blocks of a document.
+
+    Blocks are grouped to chunks. Summaries of the chunks are stored in a segment tree,
+    so the matching bracket, the enclosing bracket and the depth at a line are found in O(log(n)) time.
+
+    The owner (SyntaxHighlighter) calls ``onContentsChange()`` before handling the change itself,
+    and ``invalidateBlocks()``, when blocks have been parsed again.
+    Summaries of changed blocks are built lazily with ``blockBrackets`` function, on next query.
+    Building of summaries of a big document takes seconds. Call ``update(endTime)`` in the GUI thread,
+    and query the tree only if it returned True. Otherwise, the query builds all missing summaries at once
+    """
+    _CHUNK_SIZE = 128
+
+    def __init__(self, document, blockBrackets):
+        self._document = document
+        self._blockBrackets = blockBrackets  # function block -> BlockBrackets
+
+        self._blockCount = 0
+        self._chunks = []  # lists of BlockBrackets or None, if not known yet
+        self._chunkStarts = []  # number of the first block of every chunk
+        self._chunkSummaries = []  # summary of every chunk or None, if not known yet
+        self._nodes = None  # segment tree over chunk summaries. Node 1 is the root. None if must be rebuilt
+        self._dirtyChunks = set()  # indexes of chunks, which summaries are not up to date in the tree
+
+        self._replaceBlocks(0, 0, document.blockCount())
+
+    def invalidateBlocks(self, firstBlockNumber, count):
+        """Blocks have been parsed again. Their summaries must be rebuilt
+        """
+        for blockNumber in range(firstBlockNumber, min(firstBlockNumber + count, self._blockCount)):
+            chunkIndex, indexInChunk = self._locate(blockNumber)
+            self._chunks[chunkIndex][indexInChunk] = None
+            self._chunkSummaries[chunkIndex] = None
+            self._dirtyChunks.add(chunkIndex)
+
+    def onContentsChange(self, from_, charsRemoved, charsAdded):
+        """Document has been changed. Count of removed blocks is found from the difference of the block count
+        """
+        document = self._document
+
+        firstBlock = document.findBlock(from_)
+        if not firstBlock.isValid():
+            firstBlock = document.lastBlock()
+        lastBlock = document.findBlock(from_ + charsAdded)
+        if not lastBlock.isValid():  # Qt sometimes reports charsAdded, which is bigger, than the document
+            lastBlock = document.lastBlock()
+
+        firstIndex = firstBlock.blockNumber()
+        addedCount = lastBlock.blockNumber() - firstIndex + 1
+        removedCount = addedCount - (document.blockCount() - self._blockCount)
+
+        if removedCount < 0 or firstIndex + removedCount > self._blockCount:  # must not happen. Rebuild all
+            self._replaceBlocks(0, self._blockCount, document.blockCount())
+        else:
+            self._replaceBlocks(firstIndex, removedCount, addedCount)
+
+    def _replaceBlocks(self, firstIndex, removedCount, addedCount):
+        """Replace removedCount blocks starting from firstIndex with addedCount not yet known blocks
+        """
+        if removedCount == addedCount:  # text of blocks changed, structure is the same
+            self.invalidateBlocks(firstIndex, addedCount)
+            return
+
+        if self._chunks:
+            firstChunk, indexInChunk = self._locate(min(firstIndex, self._blockCount - 1))
+            lastChunk = self._locate(max(firstIndex + removedCount - 1, firstIndex))[0] \
+                            if firstIndex < self._blockCount else firstChunk
+            if firstIndex >= self._blockCount:
+                indexInChunk = len(self._chunks[firstChunk])
+        else:
+            firstChunk, lastChunk, indexInChunk = 0, -1, 0
+
+        leaves = []
+        for chunk in self._chunks[firstChunk:lastChunk + 1]:
+            leaves.extend(chunk)
+        leaves[indexInChunk:indexInChunk + removedCount] = [None] * addedCount
+
+        newChunks = [leaves[start:start + self._CHUNK_SIZE] \
+                        for start in range(0, len(leaves), self._CHUNK_SIZE)]
+        if len(newChunks) != lastChunk + 1 - firstChunk:
+            self._nodes = None  # count of chunks has changed, rebuild the tree
+            self._dirtyChunks = set()
+        else:
+            self._dirtyChunks.update(range(firstChunk, lastChunk + 1))
+
+        self._chunks[firstChunk:lastChunk + 1] = newChunks
+        self._chunkSummaries[firstChunk:lastChunk + 1] = [None] * len(newChunks)
+        self._blockCount += addedCount - removedCount
+
+        self._chunkStarts = []
+        start = 0
+        for chunk in self._chunks:
+            self._chunkStarts.append(start)
+            start += len(chunk)
+
+    def _locate(self, blockNumber):
+        """Get (chunk index, index in the chunk) for the block
+        """
+        chunkIndex = bisect.bisect_right(self._chunkStarts, blockNumber) - 1
+        return chunkIndex, blockNumber - self._chunkStarts[chunkIndex]
+
+    def _leaf(self, chunkIndex, indexInChunk):
+        return self._chunks[chunkIndex][indexInChunk]
+
+    def _updateChunk(self, chunkIndex):
+        """Build missing block summaries and the summary of the chunk
+        """
+        chunk = self._chunks[chunkIndex]
+        block = None
+        summary = _EMPTY_SUMMARY
+        for indexInChunk in range(len(chunk)):
+            if chunk[indexInChunk] is None:
+                if block is None:
+                    block = self._document.findBlockByNumber(self._chunkStarts[chunkIndex] + indexInChunk)
+                chunk[indexInChunk] = self._blockBrackets(block)
+
+            leafSummary = []
+            for bracket in START_BRACKETS:
+                pair = chunk[indexInChunk].pair(bracket)
+                if pair is not None:
+                    leafSummary.append((pair.depthChange, pair.minPrefixDepth, pair.maxSuffixDepth))
+                else:
+                    leafSummary.append((0, 0, 0))
+            summary = _combine(summary, leafSummary)
+
+            if block is not None:
+                block = block.next()
+
+        self._chunkSummaries[chunkIndex] = summary
+
+    def update(self, endTime=None):
+        """Build missing summaries of the blocks and the chunks, until ``time.time()`` reaches ``endTime``.
+        Return True, if the tree is up to date. Then queries are answered in O(log(n)) time.
+        Built summaries are kept, so the next call continues the work
+        """
+        for chunkIndex, summary in enumerate(self._chunkSummaries):
+            if summary is None:
+                if endTime is not None and time.time() >= endTime:
+                    return False
+                self._updateChunk(chunkIndex)
+
+        self._updateNodes()
+        return True
+
+    def _update(self):
+        """Bring the tree up to date. Not limited in time
+        """
+        self.update()
+
+    def _updateNodes(self):
+        """Bring the segment tree up to date with the chunk summaries
+        """
+        if self._nodes is None:
+            self._size = 1
+            while self._size < len(self._chunks):
+                self._size *= 2
+            self._nodes = [_EMPTY_SUMMARY] * (2 * self._size)
+            self._nodes[self._size:self._size + len(self._chunks)] = self._chunkSummaries
+            for node in range(self._size - 1, 0, -1):
+                self._nodes[node] = _combine(self._nodes[2 * node], self._nodes[2 * node + 1])
+        else:
+            for chunkIndex in self._dirtyChunks:
+                node = self._size + chunkIndex
+                self._nodes[node] = self._chunkSummaries[chunkIndex]
+                node //= 2
+                while node:
+                    self._nodes[node] = _combine(self._nodes[2 * node], self._nodes[2 * node + 1])
+                    node //= 2
+
+        self._dirtyChunks = set()
+
+    def _findChunkForward(self, node, nodeStart, nodeSize, firstChunk, typeIndex, depth):
+        """Find the first chunk starting from firstChunk, where the depth becomes 0.
+        Return (chunk index, depth before the chunk) or (None, depth after the node)
+        """
+        if nodeStart + nodeSize <= firstChunk:
+            return None, depth
+
+        depthChange, minPrefixDepth, maxSuffixDepth = self._nodes[node][typeIndex]
+        if nodeStart >= firstChunk and depth + minPrefixDepth > 0:  # whole node is skipped
+            return None, depth + depthChange
+
+        if nodeSize == 1:
+            return nodeStart, depth
+
+        half = nodeSize // 2
+        found, depth = self._findChunkForward(2 * node, nodeStart, half, firstChunk, typeIndex, depth)
+        if found is not None:
+            return found, depth
+        return self._findChunkForward(2 * node + 1, nodeStart + half, half, firstChunk, typeIndex, depth)
+
+    def _findChunkBackward(self, node, nodeStart, nodeSize, lastChunk, typeIndex, depth):
+        """Find the last chunk before or equal to lastChunk, where the depth becomes 0, while going backward.
+        Return (chunk index, depth after the chunk) or (None, depth before the node)
+        """
+        if nodeStart > lastChunk:
+            return None, depth
+
+        depthChange, minPrefixDepth, maxSuffixDepth = self._nodes[node][typeIndex]
+        if nodeStart + nodeSize - 1 <= lastChunk and depth - maxSuffixDepth > 0:  # whole node is skipped
+            return None, depth - depthChange
+
+        if nodeSize == 1:
+            return nodeStart, depth
+
+        half = nodeSize // 2
+        found, depth = self._findChunkBackward(2 * node + 1, nodeStart + half, half, lastChunk, typeIndex, depth)
+        if found is not None:
+            return found, depth
+        return self._findChunkBackward(2 * node, nodeStart, half, lastChunk, typeIndex, depth)
+
+    def _searchForward(self, bracket, blockNumber, column, depth):
+        """Find the bracket, where the depth becomes 0. Search starts after (blockNumber, column).
+        Return (blockNumber, column) or None
+        """
+        self._update()
+        typeIndex = _TYPE_INDEX[bracket]
+        chunkIndex, indexInChunk = self._locate(blockNumber)
+
+        pair = self._leaf(chunkIndex, indexInChunk).pair(bracket)
+        if pair is not None:
+            for bracketColumn, delta in pair.brackets:
+                if bracketColumn > column:
+                    depth += delta
+                    if depth == 0:
+                        return blockNumber, bracketColumn
+
+        while True:
+            for indexInChunk in range(indexInChunk + 1, len(self._chunks[chunkIndex])):
+                pair = self._leaf(chunkIndex, indexInChunk).pair(bracket)
+                if pair is not None:
+                    if depth + pair.minPrefixDepth <= 0:
+                        for bracketColumn, delta in pair.brackets:
+                            depth += delta
+                            if depth == 0:
+                                return self._chunkStarts[chunkIndex] + indexInChunk, bracketColumn
+                    depth += pair.depthChange
+
+            chunkIndex, depth = self._findChunkForward(1, 0, self._size, chunkIndex + 1, typeIndex, depth)
+            if chunkIndex is None:
+                return None
+            indexInChunk = -1
+
+    def _searchBackward(self, bracket, blockNumber, column, depth):
+        """Find the bracket, where the depth becomes 0 while going backward. Search starts before (blockNumber, column).
+        Return (blockNumber, column) or None
+        """
+        self._update()
+        typeIndex = _TYPE_INDEX[bracket]
+        chunkIndex, indexInChunk = self._locate(blockNumber)
+
+        pair = self._leaf(chunkIndex, indexInChunk).pair(bracket)
+        if pair is not None:
+            for bracketColumn, delta in reversed(pair.brackets):
+                if bracketColumn < column:
+                    depth -= delta
+                    if depth == 0:
+                        return blockNumber, bracketColumn
+
+        while True:
+            for indexInChunk in range(indexInChunk - 1, -1, -1):
+                pair = self._leaf(chunkIndex, indexInChunk).pair(bracket)
+                if pair is not None:
+                    if depth - pair.maxSuffixDepth <= 0:
+                        for bracketColumn, delta in reversed(pair.brackets):
+                            depth -= delta
+                            if depth == 0:
+                                return self._chunkStarts[chunkIndex] + indexInChunk, bracketColumn
+                    depth -= pair.depthChange
+
+            if chunkIndex == 0:
+                return None
+            chunkIndex, depth = self._findChunkBackward(1, 0, self._size, chunkIndex - 1, typeIndex, depth)
+            if chunkIndex is None:
+                return None
+            indexInChunk = len(self._chunks[chunkIndex])
+
+    def findMatchingBracket(self, blockNumber, column):
+        """Find bracket, which matches bracket at (blockNumber, column).
+        Return (blockNumber, column) or None
+        """
+        self._update()
+        bracket = self._leaf(*self._locate(blockNumber)).text[column]
+        if bracket in START_BRACKETS:
+            return self._searchForward(bracket, blockNumber, column, 1)
+        else:
+            return self._searchBackward(bracket, blockNumber, column, 1)
+
+    def findEnclosingBracket(self, blockNumber, column, bracket):
+        """Find not closed start bracket of type ``bracket`` before (blockNumber, column).
+        Bracket might be a start or an end bracket, i.e. ``(`` or ``)``.
+        Return (blockNumber, column) or None
+        """
+        if bracket in END_BRACKETS:
+            bracket = OPOSITE_BRACKET[bracket]
+        return self._searchBackward(bracket, blockNumber, column, 1)
+
+    def depthAt(self, blockNumber, bracket):
+        """Count of not closed start brackets of type ``bracket`` before the block.
+        Negative, if there are more end brackets than start brackets
+        """
+        self._update()
+        typeIndex = _TYPE_INDEX[bracket]
+        chunkIndex, indexInChunk = self._locate(blockNumber)
+
+        depth = 0
+        for pair in [self._leaf(chunkIndex, index).pair(bracket) for index in range(indexInChunk)]:
+            if pair is not None:
+                depth += pair.depthChange
+
+        # sum of the chunks before chunkIndex. Go from the leaf to the root, add left siblings
+        node = self._size + chunkIndex
+        while node > 1:
+            if node % 2 == 1:
+                depth += self._nodes[node - 1][typeIndex][0]
+            node //= 2
+
+        return depth
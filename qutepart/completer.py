@@ -2,68 +2,58 @@
 """
 
 import re
-import time
 
 from PyQt4.QtCore import pyqtSignal, QAbstractItemModel, QEvent, QModelIndex, QObject, QSize, Qt, QTimer, Qt
-from PyQt4.QtGui import QCursor, QListView, QStyle
+from PyQt4.QtGui import QApplication, QColor, QCursor, QFontMetrics, QListView, QPalette, QStyle, \
+                        QStyledItemDelegate, QStyleOptionViewItemV4
 
-from qutepart.htmldelegate import HTMLDelegate
-
-class _GlobalUpdateWordSetTimer:
-    """Timer updates word set, when editor is idle. (5 sec. after last change)
-    Timer is global, for avoid situation, when all instances
-    update set simultaneously
-    """
-    _IDLE_TIMEOUT_MS = 1000
-
-    def __init__(self):
-        self._timer = QTimer()
-        self._timer.setSingleShot(True)
-        self._timer.timeout.connect(self._onTimer)
-        self._scheduledMethods = []
-
-    def schedule(self, method):
-        if not method in self._scheduledMethods:
-            self._scheduledMethods.append(method)
-        self._timer.start(self._IDLE_TIMEOUT_MS)
-
-    def cancel(self, method):
-        """Cancel scheduled method
-        Safe method, may be called with not-scheduled method"""
-        if method in self._scheduledMethods:
-            self._scheduledMethods.remove(method)
-
-        if not self._scheduledMethods:
-            self._timer.stop()
-
-    def _onTimer(self):
-        method = self._scheduledMethods.pop()
-        method()
-        if self._scheduledMethods:
-            self._timer.start(self._IDLE_TIMEOUT_MS)
+from qutepart.completionprovider import CompletionProviderRunner
+from qutepart.parentchildindex import ParentChildCache
+from qutepart.wordindex import SortedWords, WordCorpus, WordIndex
 
 
 class _CompletionModel(QAbstractItemModel):
     """QAbstractItemModel implementation for a list of completion variants
 
-    words attribute contains all words
+    words attribute contains words, which are shown. Not more than _MAX_WORD_COUNT
     canCompleteText attribute contains text, which may be inserted with tab
+
+    If localWords is set, words from it (words of the current document) are shown first,
+    then other words (words of other documents and words, added with addWords())
     """
-    def __init__(self, wordSet):
+    _MAX_WORD_COUNT = 256
+    _MAX_SCANNED_WORD_COUNT = 10000  # when looking for local words
+
+    def __init__(self, sortedWords, localWords=None):
         QAbstractItemModel.__init__(self)
 
-        self._wordSet = wordSet
+        self._sortedWords = sortedWords
+        self._localWords = localWords
+        self._extraWords = SortedWords()  # words from the completion providers
+        self._lastSearch = None  # (version, lowercase typed text, start, end)
 
     def setData(self, wordBeforeCursor, wholeWord):
         """Set model information
         """
         self._typedText = wordBeforeCursor
-        self.words = self._makeListOfCompletions(wordBeforeCursor, wholeWord)
-        commonStart = self._commonWordStart(self.words)
+        start, end = self._prefixRange(wordBeforeCursor)
+        extraStart, extraEnd = self._extraWords.prefixRange(wordBeforeCursor)
+        self.words = self._makeListOfCompletions(start, end, extraStart, extraEnd, wordBeforeCursor, wholeWord)
+        commonStart = self._commonWordStart([(self._sortedWords, start, end),
+                                             (self._extraWords, extraStart, extraEnd)],
+                                            wordBeforeCursor, wholeWord)
         self.canCompleteText = commonStart[len(wordBeforeCursor):]
 
         self.layoutChanged.emit()
 
+    def addWords(self, words):
+        """Add words, i.e. received from a completion provider.
+        setData() shall be called after it
+        """
+        newWords = [word for word in set(words) \
+                        if self._sortedWords.index(word) == -1 and self._extraWords.index(word) == -1]
+        self._extraWords.update(newWords, ())
+
     def hasWords(self):
         return len(self.words) > 0
 
@@ -71,23 +61,20 @@ class _CompletionModel(QAbstractItemModel):
         """QAbstractItemModel method implementation
         """
         if role == Qt.DisplayRole:
-            text = self.words[index.row()]
-            typed = text[:len(self._typedText)]
-            canComplete = text[len(self._typedText):len(self._typedText) + len(self.canCompleteText)]
-            rest = text[len(self._typedText) + len(self.canCompleteText):]
-            if canComplete:
-                # NOTE foreground colors are hardcoded, but I can't set background color of selected item (Qt bug?)
-                # might look bad on some color themes
-                return '<html>' \
-                            '%s' \
-                            '<font color="#e80000">%s</font>' \
-                            '%s' \
-                        '</html>' % (typed, canComplete, rest)
-            else:
-                return typed + rest
+            return self.words[index.row()]
         else:
             return None
 
+    def segments(self, row):
+        """Get (typed, canComplete, rest) parts of the word. Used by _CompletionDelegate
+        """
+        text = self.words[row]
+        typedLength = len(self._typedText)
+        canCompleteLength = len(self.canCompleteText)
+        return (text[:typedLength],
+                text[typedLength:typedLength + canCompleteLength],
+                text[typedLength + canCompleteLength:])
+
     def rowCount(self, index = QModelIndex()):
         """QAbstractItemModel method implementation
         """
@@ -98,33 +85,108 @@ class _CompletionModel(QAbstractItemModel):
         """
         return self._typedText
 
-    def _commonWordStart(self, words):
-        """Get common start of all words.
+    def _prefixRange(self, wordBeforeCursor):
+        """Get range of suitable words in the sorted words.
+        If more characters have been typed, search only in the previous range
+        """
+        lowerWord = wordBeforeCursor.lower()
+        version = self._sortedWords.version
+        if self._lastSearch is not None:
+            lastVersion, lastLowerWord, lastStart, lastEnd = self._lastSearch
+            if lastVersion == version and lowerWord.startswith(lastLowerWord):
+                start, end = self._sortedWords.prefixRange(lowerWord, lastStart, lastEnd)
+            else:
+                start, end = self._sortedWords.prefixRange(lowerWord)
+        else:
+            start, end = self._sortedWords.prefixRange(lowerWord)
+
+        self._lastSearch = (version, lowerWord, start, end)
+        return start, end
+
+    def _excludedIndex(self, start, end, wordBeforeCursor, wholeWord):
+        """Index of the word, which is already typed, and shall not be shown. Or -1
+        """
+        if wordBeforeCursor:
+            return self._sortedWords.index(wholeWord, start, end)
+        else:
+            return -1
+
+    def _commonWordStart(self, ranges, wordBeforeCursor, wholeWord):
+        """Get common start of all suitable words.
         i.e. for ['blablaxxx', 'blablayyy', 'blazzz'] common start is 'bla'
+        ranges is list of (sortedWords, start, end).
+        Words are sorted case insensitively, therefore the common start of the lowercase words is found
+        with the first and the last words of the ranges.
+        Then the words are checked to have the same case of the common start, as all suitable words are compared
+        case sensitively. It is done only if the common start is longer than the typed text
         """
-        if not words:
+        boundaryWords = []
+        for sortedWords, start, end in ranges:
+            if wordBeforeCursor:
+                excludedIndex = sortedWords.index(wholeWord, start, end)
+                if excludedIndex == start:
+                    start += 1
+                if excludedIndex == end - 1:
+                    end -= 1
+            if start < end:
+                boundaryWords += [sortedWords[start], sortedWords[end - 1]]
+
+        if not boundaryWords:
             return ''
 
+        firstWord = min(boundaryWords, key=SortedWords.key)
+        lastWord = max(boundaryWords, key=SortedWords.key)
         length = 0
-        firstWord = words[0]
-        otherWords = words[1:]
-        for index, char in enumerate(firstWord):
-            if not all([word[index] == char for word in otherWords]):
+        for firstChar, lastChar in zip(firstWord.lower(), lastWord.lower()):
+            if firstChar != lastChar:
                 break
-            length = index + 1
+            length += 1
+
+        for sortedWords, start, end in ranges:
+            index = start
+            while index < end and length > len(wordBeforeCursor):
+                word = sortedWords[index]
+                if not (wordBeforeCursor and word == wholeWord) and \
+                   word[:length] != firstWord[:length]:  # differs in case
+                    matchingLength = 0
+                    while word[matchingLength] == firstWord[matchingLength]:
+                        matchingLength += 1
+                    length = matchingLength
+                index += 1
 
         return firstWord[:length]
 
-    def _makeListOfCompletions(self, wordBeforeCursor, wholeWord):
-        """Make list of completions, which shall be shown
+    def _makeListOfCompletions(self, start, end, extraStart, extraEnd, wordBeforeCursor, wholeWord):
+        """Make list of completions, which shall be shown.
+        Only the first _MAX_WORD_COUNT words from the ranges are taken
         """
         #krc: Case insensitive, not all programming languages are case-sensitive
-        lc_word_before_cursor = wordBeforeCursor.lower()
-        onlySuitable = [word for word in self._wordSet 
-                        if ((len(lc_word_before_cursor) == 0) or
-                            (word.lower().startswith(lc_word_before_cursor) and 
-                             (word != wholeWord)))]
-        return sorted(onlySuitable)
+        excludedIndex = self._excludedIndex(start, end, wordBeforeCursor, wholeWord)
+        if self._localWords is None:
+            localWords = []
+            otherWords = self._sortedWords[start:min(end, start + self._MAX_WORD_COUNT + 1)]
+            if excludedIndex != -1 and excludedIndex - start < len(otherWords):
+                del otherWords[excludedIndex - start]
+        else:
+            localWords = []
+            otherWords = []
+            for index in xrange(start, min(end, start + self._MAX_SCANNED_WORD_COUNT)):
+                if index == excludedIndex:
+                    continue
+                word = self._sortedWords[index]
+                if word in self._localWords:
+                    localWords.append(word)
+                    if len(localWords) == self._MAX_WORD_COUNT:
+                        break
+                elif len(otherWords) < self._MAX_WORD_COUNT:
+                    otherWords.append(word)
+
+        if extraStart < extraEnd:
+            extraWords = [word for word in self._extraWords[extraStart:min(extraEnd, extraStart + self._MAX_WORD_COUNT + 1)] \
+                            if not (wordBeforeCursor and word == wholeWord)]
+            otherWords = sorted(otherWords + extraWords, key=SortedWords.key)
+
+        return (localWords + otherWords)[:self._MAX_WORD_COUNT]
 
     """Trivial QAbstractItemModel methods implementation
     """
@@ -135,6 +197,98 @@ class _CompletionModel(QAbstractItemModel):
     def parent(self, index):                                return QModelIndex()
 
 
+class _CompletionDelegate(QStyledItemDelegate):
+    """Draws completion list items: typed text, text, which can be completed with Tab, and the rest.
+
+    Text is drawn with QPainter directly. Text widths and row heights are cached and shared by all lists,
+    therefore painting doesn't create text documents and doesn't measure the same text twice
+    """
+    # NOTE foreground colors are hardcoded, but I can't set background color of selected item (Qt bug?)
+    # might look bad on some color themes
+    _CAN_COMPLETE_COLOR = QColor('#e80000')
+    _MARGIN = 1
+    _MAX_CACHED_WIDTH_COUNT = 4096
+
+    _fontMetrics = {}  # font key: QFontMetrics
+    _widths = {}  # (font key, text): width. Cleared, when too big
+    _rowHeights = {}  # font key: height
+
+    @classmethod
+    def textWidth(cls, font, text):
+        """Width of the text in pixels. Cached
+        """
+        fontKey = font.key()
+        key = (fontKey, text)
+        width = cls._widths.get(key)
+        if width is None:
+            if len(cls._widths) >= cls._MAX_CACHED_WIDTH_COUNT:
+                cls._widths.clear()
+            width = cls._metrics(font).width(text)
+            cls._widths[key] = width
+        return width
+
+    @classmethod
+    def _metrics(cls, font):
+        fontKey = font.key()
+        metrics = cls._fontMetrics.get(fontKey)
+        if metrics is None:
+            metrics = QFontMetrics(font)
+            cls._fontMetrics[fontKey] = metrics
+        return metrics
+
+    @staticmethod
+    def _font(option):
+        widget = getattr(option, 'widget', None)  # QStyleOptionViewItem has no widget, QStyleOptionViewItemV4 has
+        return widget.font() if widget is not None else option.font
+
+    def paint(self, painter, option, index):
+        """QStyledItemDelegate.paint implementation
+        """
+        option.state &= ~QStyle.State_HasFocus  # never draw focus rect
+
+        options = QStyleOptionViewItemV4(option)
+        self.initStyleOption(options, index)
+
+        style = QApplication.style() if options.widget is None else options.widget.style()
+
+        options.text = ""
+        style.drawControl(QStyle.CE_ItemViewItem, options, painter)  # background and selection
+
+        if option.state & QStyle.State_Selected:
+            textColor = option.palette.color(QPalette.Active, QPalette.HighlightedText)
+        else:
+            textColor = option.palette.color(QPalette.Text)
+
+        font = self._font(options)
+        metrics = self._metrics(font)
+        textRect = style.subElementRect(QStyle.SE_ItemViewItemText, options)
+        x = textRect.left() + self._MARGIN
+        y = textRect.top() + (textRect.height() - metrics.height()) / 2 + metrics.ascent()
+
+        painter.save()
+        painter.setFont(font)
+        typed, canComplete, rest = index.model().segments(index.row())
+        for text, color in ((typed, textColor), (canComplete, self._CAN_COMPLETE_COLOR), (rest, textColor)):
+            if text:
+                painter.setPen(color)
+                painter.drawText(x, y, text)
+                x += self.textWidth(font, text)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        """QStyledItemDelegate.sizeHint implementation
+        """
+        font = self._font(option)
+        fontKey = font.key()
+        height = self._rowHeights.get(fontKey)
+        if height is None:
+            height = QStyledItemDelegate.sizeHint(self, option, index).height()
+            self._rowHeights[fontKey] = height
+
+        return QSize(self.textWidth(font, index.model().words[index.row()]) + self._MARGIN * 2,
+                     height)
+
+
 class _CompletionList(QListView):
     """Completion list widget
     """
@@ -149,7 +303,7 @@ class _CompletionList(QListView):
 
         self.setAttribute(Qt.WA_DeleteOnClose)
 
-        self.setItemDelegate(HTMLDelegate(self))
+        self.setItemDelegate(_CompletionDelegate(self))
 
         self._qpart = qpart
         self.setFont(qpart.font())
@@ -202,7 +356,7 @@ class _CompletionList(QListView):
 
         FIXME very bad algorithm. Remove all this margins, if you can
         """
-        width = max([self.fontMetrics().width(word) \
+        width = max([_CompletionDelegate.textWidth(self.font(), word) \
                         for word in self.model().words])
         width = width * 1.4  # FIXME bad hack. invent better formula
         width += 30  # margin
@@ -311,16 +465,21 @@ class _CompletionList(QListView):
 
 class Completer(QObject):
     """Object listens Qutepart widget events, computes and shows autocompletion lists
+
+    Words of all documents are collected in the shared corpus.
+    Completion list contains words of the current document first, then words of other documents
+    and words from the completion providers. Providers are queried in background, results are added
+    to the list, when received
     """
-    _globalUpdateWordSetTimer = _GlobalUpdateWordSetTimer()
+    _corpus = WordCorpus()
 
-    _WORD_SET_UPDATE_MAX_TIME_SEC = 0.4
     #krc: Keyword arguments pythonically passed to Completer from outside QutePart
     def __init__(self, qpart, ContentAutoComplete=True, WordList=None, ParentChildDict=None):
         QObject.__init__(self, qpart)
 
         self._qpart = qpart
         self._widget = None
+        self._widgetParentPath = None  # if the widget shows children of a parent
         self._completionOpenedManually = False
 
         self._wordSet = None
@@ -330,51 +489,53 @@ class Completer(QObject):
         #krc: 3) A parent/child dictionary is provided, e.g. table.column
         self._ContentAutoComplete = \
             (ContentAutoComplete and (WordList is None) and (ParentChildDict is None))
+        # words of the document. Updated incrementally, when text is changed
+        if self._ContentAutoComplete:
+            self._wordIndex = WordIndex(qpart.document(), parent=self, corpus=self._corpus)
+        else:
+            self._wordIndex = None
         #krc: Use after-instantiation update mechanism to initialize completer 
         self.updateWordList(WordList)
         self.updateParentChildDict(ParentChildDict)
 
-        qpart.installEventFilter(self)
-        qpart.textChanged.connect(self._onTextChanged)
+        self._providerRunner = CompletionProviderRunner(self)
+        self._providerRunner.resultReady.connect(self._onProviderResult)
 
-        self.destroyed.connect(self.del_)
+        qpart.installEventFilter(self)
 
-    def del_(self):
-        """Object deleted. Cancel timer
+    def addProvider(self, provider):
+        """Add CompletionProvider instance
         """
-        self._globalUpdateWordSetTimer.cancel(self._updateWordSet)
+        self._providerRunner.addProvider(provider)
 
-    def _onTextChanged(self):
-        """Text in the qpart changed. Update word set"""
-        #krc: Block word sets based on document content
-        if (not self._ContentAutoComplete): return
-        self._globalUpdateWordSetTimer.schedule(self._updateWordSet)
-
-    def _updateWordSet(self):
-        """Make a set of words, which shall be completed, from text
+    def removeProvider(self, provider):
+        """Remove CompletionProvider instance
         """
-        #krc: Block word sets based on document content
-        if (not self._ContentAutoComplete): return
-        self._wordSet = set()
+        self._providerRunner.removeProvider(provider)
 
-        start = time.time()
+    def _createModel(self):
+        """Create completion model for the current word set
+        """
+        if self._wordSet is None:  # only the providers
+            return _CompletionModel(SortedWords())
+        elif self._wordSet is self._wordIndex:
+            return _CompletionModel(self._corpus.sortedWords(), self._wordIndex)
+        else:
+            return _CompletionModel(self._wordSet)
 
-        for line in self._qpart.lines:
-            for match in self._wordRegExp.findall(line):
-                self._wordSet.add(match)
-            if time.time() - start > self._WORD_SET_UPDATE_MAX_TIME_SEC:
-                """It is better to have incomplete word set, than to freeze the GUI"""
-                break
+    def _createWidget(self, model):
+        self._widget = _CompletionList(self._qpart, model)
+        self._widget.closeMe.connect(self._closeCompletion)
+        self._widget.itemSelected.connect(self._onCompletionListItemSelected)
+        self._widget.tabPressed.connect(self._onCompletionListTabPressed)
 
     #krc: Dynamic changes to static WordList, ...
     #krc: ...potentially different database entities to autocomplete
     def updateWordList(self, WordList):
         if (WordList is None):
-            self._wordSet = None
+            self._wordSet = self._wordIndex
         else:
-            self._wordSet = set()
-            for word in WordList:
-                self._wordSet.add(word)
+            self._wordSet = SortedWords(set(WordList))
 
     #krc: Dynamic changes to ParentChildDict, ...
     #krc: ...potentially different database entities to autocomplete
@@ -389,15 +550,12 @@ class Completer(QObject):
             self._wordAtEndRegExp = re.compile(self._wordPattern + '$')
             self._wordAtStartRegExp = re.compile('^' + self._wordPattern)
         else:
-            self._parentChildDict = {}
-            for parent, child_list in ParentChildDict.items():
-                child_set = set()
-                for child in child_list:
-                    child_set.add(child)
-                self._parentChildDict[parent] = child_set
-    
+            # children are fetched on first use. See ParentChildCache for supported sources
+            self._parentChildDict = ParentChildCache(ParentChildDict)
+
             #krc: Detect end of 'identifier' OR 'identifier.'
-            self._wordPattern = "\w+[.]?\w*"
+            # multi-level paths are supported: 'schema.table.column'
+            self._wordPattern = "\w+(?:[.]\w*)*"
             self._wordRegExp = re.compile(self._wordPattern)
             self._wordAtEndRegExp = re.compile(self._wordPattern + '$')
             self._wordAtStartRegExp = re.compile('^' + self._wordPattern)
@@ -429,7 +587,8 @@ class Completer(QObject):
         Returns True, if invoked
         """
         if (self._qpart.completionEnabled and 
-            ((self._wordSet is not None) or (self._parentChildDict is not None))):
+            ((self._wordSet is not None) or (self._parentChildDict is not None) or
+             self._providerRunner.hasProviders())):
             wordBeforeCursor = self._wordBeforeCursor()
             wholeWord = wordBeforeCursor + self._wordAfterCursor()
 
@@ -440,53 +599,93 @@ class Completer(QObject):
             #krc: ...as the user types characters after the dot.
             #krc: This is a dynamic word set based on the identifier before the dot.
             if (('.' in wordBeforeCursor) and 
-                (len(wordBeforeCursor.split('.')[0]) >= 2) and 
-                (len(wordBeforeCursor.split('.')[1]) >= 0)):
-                if ((self._parentChildDict is not None) and
-                    (wordBeforeCursor.split('.')[0] in self._parentChildDict)):
-                    child_set = self._parentChildDict[wordBeforeCursor.split('.')[0]]
+                (len(wordBeforeCursor.split('.')[0]) >= 2)):
+                parentPath, typedChild = wordBeforeCursor.rsplit('.', 1)
+                wholeChild = typedChild + wholeWord[len(wordBeforeCursor):].split('.')[0]
+                if self._parentChildDict is not None:
+                    child_set = self._parentChildDict.children(parentPath)
+                else:
+                    child_set = None
+
+                if child_set is not None:
+                    if self._widget is not None and self._widgetParentPath != parentPath:
+                        self._closeCompletion()  # list of other parent is shown
+
                     if self._widget is None:
                         model = _CompletionModel(child_set)
-                        model.setData(wordBeforeCursor.split('.')[1], wholeWord)
+                        model.setData(typedChild, wholeChild)
                         if model.hasWords():
-                            self._widget = _CompletionList(self._qpart, model)
-                            self._widget.closeMe.connect(self._closeCompletion)
-                            self._widget.itemSelected.connect(self._onCompletionListItemSelected)
-                            self._widget.tabPressed.connect(self._onCompletionListTabPressed)
+                            self._createWidget(model)
+                            self._widgetParentPath = parentPath
                             return True
                     else:
-                        self._widget.model().setData(wordBeforeCursor.split('.')[1], wholeWord)
+                        self._widget.model().setData(typedChild, wholeChild)
                         if self._widget.model().hasWords():
                             self._widget.updateGeometry()
                             return True
 
-            elif (wordBeforeCursor and (self._wordSet is not None)):
+            elif (wordBeforeCursor and
+                  ((self._wordSet is not None) or self._providerRunner.hasProviders())):
                 #krc: This implements a static word set based on reserved words, etc.
                 if len(wordBeforeCursor) >= self._qpart.completionThreshold or \
                    self._completionOpenedManually or \
                    requestedByUser:
-                    if self._widget is None:
-                        model = _CompletionModel(self._wordSet)
-                        model.setData(wordBeforeCursor, wholeWord)
-                        if model.hasWords():
-                            self._widget = _CompletionList(self._qpart, model)
-                            self._widget.closeMe.connect(self._closeCompletion)
-                            self._widget.itemSelected.connect(self._onCompletionListItemSelected)
-                            self._widget.tabPressed.connect(self._onCompletionListTabPressed)
-                            return True
-                    else:
-                        self._widget.model().setData(wordBeforeCursor, wholeWord)
-                        if self._widget.model().hasWords():
-                            self._widget.updateGeometry()
-                            return True
+                    shown = self._showWords(wordBeforeCursor, wholeWord)
+                    if not shown:
+                        self._closeCompletion()
+                    cursor = self._qpart.textCursor()
+                    self._providerRunner.query(wordBeforeCursor, wholeWord,
+                                               cursor.block().text(), cursor.blockNumber(), cursor.positionInBlock())
+                    return shown
 
         self._closeCompletion()
         return False
 
+    def _showWords(self, wordBeforeCursor, wholeWord, providerWords=None):
+        """Create or update completion list.
+        Returns True, if there are words to show
+        """
+        if self._widget is not None and self._widgetParentPath is not None:
+            self._closeCompletion()  # list of children is shown
+
+        if self._widget is None:
+            model = self._createModel()
+            if providerWords:
+                model.addWords(providerWords)
+            model.setData(wordBeforeCursor, wholeWord)
+            if model.hasWords():
+                self._createWidget(model)
+                return True
+        else:
+            model = self._widget.model()
+            if providerWords:
+                model.addWords(providerWords)
+            model.setData(wordBeforeCursor, wholeWord)
+            if model.hasWords():
+                self._widget.updateGeometry()
+                return True
+
+        return False
+
+    def _onProviderResult(self, request, words):
+        """Completion provider returned words. Show them, if the word under cursor hasn't changed
+        """
+        if not self._qpart.completionEnabled:
+            return
+
+        wordBeforeCursor = self._wordBeforeCursor()
+        wholeWord = wordBeforeCursor + self._wordAfterCursor()
+        if wordBeforeCursor == request.wordBeforeCursor and \
+           wholeWord == request.wholeWord and \
+           self._qpart.textCursor().blockNumber() == request.line:
+            self._showWords(wordBeforeCursor, wholeWord, words)
+
     def _closeCompletion(self):
         """Close completion, if visible.
         Delete widget
         """
+        self._providerRunner.cancel()
+        self._widgetParentPath = None
         if self._widget is not None:
             self._widget.close()
             self._widget = None
@@ -0,0 +1,180 @@
+"""Completion providers. Sources of completions, which are queried in background threads
+"""
+
+import logging
+import Queue
+import threading
+import time
+
+from PyQt4.QtCore import pyqtSignal, QObject, QTimer
+
+
+logger = logging.getLogger('qutepart')
+
+
+class CompletionRequest:
+    """Request to a completion provider.
+
+    Attributes:
+
+    * ``wordBeforeCursor`` - typed part of the word. Provider returns words, which start with it
+    * ``wholeWord`` - word under cursor, including the part after the cursor
+    * ``lineText`` - text of the current line
+    * ``line``, ``column`` - cursor position
+    * ``startTime`` - ``time.time()`` value, when the request has been created
+    """
+    def __init__(self, wordBeforeCursor, wholeWord, lineText, line, column):
+        self.wordBeforeCursor = wordBeforeCursor
+        self.wholeWord = wholeWord
+        self.lineText = lineText
+        self.line = line
+        self.column = column
+        self.startTime = time.time()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def isCancelled(self):
+        """Request is cancelled, if typed text has changed. Slow providers should check it and stop the work
+        """
+        return self._cancelled
+
+
+class CompletionProvider:
+    """Base class for completion sources. I.e. a database schema, a ctags file or a language server.
+
+    ``complete()`` is called in a worker thread. Typing never waits for a provider.
+    Results, which are received later than ``latencyBudget`` seconds after the key press, are dropped.
+    Not more than one request per provider is executed at the same time. If text is typed while a request
+    is being executed, the request is cancelled and only the latest one is executed after it.
+
+    A request, which is executed longer than ``timeout`` seconds, is cancelled and an error is logged.
+    A thread can't be killed, so new requests to the provider are not started until ``complete()`` returns,
+    but other providers are not blocked.
+    """
+    latencyBudget = 0.5
+    timeout = 10.
+
+    def complete(self, request):
+        """Return iterable of words, which start with ``request.wordBeforeCursor``. Case insensitive.
+        Called in a worker thread, must not access the widget.
+        """
+        raise NotImplementedError()
+
+
+def _runProvider(provider, request, results):
+    """Executed in a worker thread. Puts (provider, request, list of words or None) to the results queue.
+    Must not access Qt objects, the runner might be already deleted
+    """
+    words = None
+    if not request.isCancelled():
+        try:
+            words = list(provider.complete(request))
+        except Exception as ex:  # broken provider must not break the editor
+            logger.error('Completion provider %s failed: %s' % (provider.__class__.__name__, ex))
+
+    results.put((provider, request, words))
+
+
+class CompletionProviderRunner(QObject):
+    """Executes requests to the providers in worker threads and delivers results to the GUI thread.
+
+    Every running request has own daemon thread, so a stalled provider doesn't block other providers.
+    Workers put results to a queue, which is polled by a timer in the GUI thread, while requests are running.
+    """
+    resultReady = pyqtSignal(object, object)  # request, list of words
+
+    _POLL_INTERVAL_MS = 10
+
+    def __init__(self, parent=None):
+        QObject.__init__(self, parent)
+        self._providers = []
+        self._runningRequests = {}  # provider: request
+        self._pendingRequests = {}  # provider: request. Started, when the running request is finished
+        self._timedOutRequests = set()
+        self._results = Queue.Queue()  # filled by the worker threads
+
+        self._pollTimer = QTimer(self)
+        self._pollTimer.setInterval(self._POLL_INTERVAL_MS)
+        self._pollTimer.timeout.connect(self._onPollTimer)
+
+    def addProvider(self, provider):
+        if not provider in self._providers:
+            self._providers.append(provider)
+
+    def removeProvider(self, provider):
+        if provider in self._providers:
+            self._providers.remove(provider)
+            if provider in self._runningRequests:
+                self._runningRequests[provider].cancel()
+            self._pendingRequests.pop(provider, None)
+
+    def hasProviders(self):
+        return bool(self._providers)
+
+    def query(self, wordBeforeCursor, wholeWord, lineText, line, column):
+        """Cancel previous requests and query all providers
+        """
+        self.cancel()
+        for provider in self._providers:
+            request = CompletionRequest(wordBeforeCursor, wholeWord, lineText, line, column)
+            if provider in self._runningRequests:
+                self._pendingRequests[provider] = request
+            else:
+                self._start(provider, request)
+
+    def cancel(self):
+        """Cancel all requests
+        """
+        for request in self._runningRequests.values():
+            request.cancel()
+        self._pendingRequests = {}
+
+    def _start(self, provider, request):
+        self._runningRequests[provider] = request
+        thread = threading.Thread(target=_runProvider, args=(provider, request, self._results))
+        thread.daemon = True  # a stalled provider must not block exit
+        thread.start()
+
+        if not self._pollTimer.isActive():
+            self._pollTimer.start()
+
+    def _onPollTimer(self):
+        """Deliver results of the finished requests and cancel timed out requests
+        """
+        while True:
+            try:
+                provider, request, words = self._results.get_nowait()
+            except Queue.Empty:
+                break
+            self._onFinished(provider, request, words)
+
+        now = time.time()
+        for provider, request in self._runningRequests.items():
+            if now - request.startTime > provider.timeout and \
+               not request in self._timedOutRequests:
+                self._timedOutRequests.add(request)
+                request.cancel()
+                logger.error('Completion provider %s has not returned in %s seconds. Request is cancelled' % \
+                                (provider.__class__.__name__, provider.timeout))
+
+        if not self._runningRequests:
+            self._pollTimer.stop()
+
+    def _onFinished(self, provider, request, words):
+        """Request has been executed. Deliver result, if it is still actual, and start pending request
+        """
+        if self._runningRequests.get(provider) is request:
+            del self._runningRequests[provider]
+        self._timedOutRequests.discard(request)
+
+        if words is not None and \
+           not request.isCancelled() and \
+           time.time() - request.startTime <= provider.latencyBudget:
+            self.resultReady.emit(request, words)
+
+        if provider in self._pendingRequests and not provider in self._runningRequests:
+            pendingRequest = self._pendingRequests.pop(provider)
+            if time.time() - pendingRequest.startTime < provider.latencyBudget:  # otherwise result will be dropped
+                self._start(provider, pendingRequest)
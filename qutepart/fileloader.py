@@ -0,0 +1,140 @@
+"""Progressive loading of big files to Qutepart
+"""
+
+import codecs
+import mmap
+import os
+
+from PyQt4.QtCore import pyqtSignal, QObject, QTimer
+from PyQt4.QtGui import QTextCursor
+
+
+class FileLoader(QObject):
+    """Loads a file to the document by chunks. Chunks are appended from the event loop,
+    therefore the first screen of the file is shown immediately, and the UI is not frozen.
+    Syntax highlighting is done behind the loading front.
+
+    File is memory mapped and decoded incrementally. Editor is read-only, while the file is being loaded.
+    Loading is not an undoable action, undo history is cleared.
+
+    ``errors`` is the error handling scheme of the decoder, as for ``unicode()``. If the file can't be decoded
+    with the default ``'strict'`` scheme, loading is stopped, the loaded part is removed from the document,
+    so it can't be saved damaged, and ``error`` is emitted before ``finished(False)``.
+
+    Use ``Qutepart.loadFile()`` to create and start the loader::
+
+        loader = qpart.loadFile('big.log', 'utf8')
+        loader.progress.connect(lambda loaded, total: statusBar.showMessage('%d%%' % (loaded * 100 / total)))
+        loader.finished.connect(onLoaded)
+        loader.error.connect(lambda message: QMessageBox.critical(window, 'Failed to load', message))
+
+    Signals:
+
+    * ``progress(loadedBytes, totalBytes)``
+    * ``error(message)`` the file can't be decoded
+    * ``finished(completely)`` loading has been finished. ``completely`` is False, if cancelled or failed
+    """
+    progress = pyqtSignal(int, int)
+    error = pyqtSignal(unicode)
+    finished = pyqtSignal(bool)
+
+    _FIRST_CHUNK_SIZE = 64 * 1024  # the first screen is shown as soon as possible
+    _CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, qpart, filePath, encoding='utf8', errors='strict'):
+        QObject.__init__(self, qpart)
+        self._qpart = qpart
+        self._filePath = filePath
+        self._encoding = encoding
+
+        self._file = open(filePath, 'rb')
+        self._size = os.path.getsize(filePath)
+        if self._size > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = ''  # empty file can't be mapped
+
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+        self._position = 0
+        self._pendingText = u''  # \r at the end of a chunk is kept until the next one, it might be a part of \r\n
+        self._wasReadOnly = qpart.isReadOnly()
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._loadChunk)
+
+    def start(self):
+        """Clear the document and start loading. The first chunk is loaded, when control returns to the event loop,
+        so signals might be connected after this call
+        """
+        self._qpart.setPlainText('')
+        self._qpart.document().setUndoRedoEnabled(False)
+        self._qpart.setReadOnly(True)
+        self._timer.start()
+
+    def isRunning(self):
+        return self._file is not None
+
+    def cancel(self):
+        """Stop loading. Already loaded part of the file is kept in the document
+        """
+        if self.isRunning():
+            self._finish(False)
+
+    def _loadChunk(self):
+        size = self._FIRST_CHUNK_SIZE if self._position == 0 else self._CHUNK_SIZE
+        data = self._map[self._position:self._position + size]
+        isLast = self._position + len(data) >= self._size
+
+        try:
+            text = self._pendingText + self._decoder.decode(data, isLast)
+        except UnicodeDecodeError as ex:
+            # the decoder keeps an incomplete character from the previous chunk and decodes it with this one
+            bufferedCount = max(0, len(ex.object) - len(data))
+            self._fail(u'Failed to decode %s as %s at byte %d: %s' % \
+                            (self._filePath, self._encoding, self._position - bufferedCount + ex.start, ex.reason))
+            return
+
+        self._position += len(data)
+        if not isLast and text.endswith(u'\r'):
+            text, self._pendingText = text[:-1], u'\r'
+        else:
+            self._pendingText = u''
+
+        if text:
+            document = self._qpart.document()
+            cursor = QTextCursor(document)
+            cursor.movePosition(QTextCursor.End)
+            isFirst = document.isEmpty()
+            cursor.insertText(text)
+            if isFirst:  # text cursor has been moved by the insertion
+                self._qpart.moveCursor(QTextCursor.Start)
+
+        self.progress.emit(self._position, self._size)
+
+        if not self.isRunning():  # cancelled by a progress handler
+            return
+        if isLast:
+            self._finish(True)
+        else:
+            self._timer.start()
+
+    def _fail(self, message):
+        """Remove the loaded part of the file, report the error and finish
+        """
+        self._qpart.setPlainText('')
+        self.error.emit(message)
+        if self.isRunning():  # not cancelled by an error handler
+            self._finish(False)
+
+    def _finish(self, completely):
+        self._timer.stop()
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+        self._file = None
+
+        self._qpart.document().setUndoRedoEnabled(True)
+        self._qpart.document().setModified(False)
+        self._qpart.setReadOnly(self._wasReadOnly)
+        self.finished.emit(completely)
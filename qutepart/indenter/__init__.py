@@ -91,6 +91,37 @@ class Indenter:
         if indent is not None and indent != currentIndent:
             self._qpart.replaceText(block.position(), spaceAtStartLen, indent)
 
+    def autoIndentBlocks(self, startBlock, endBlock):
+        """Indent blocks from startBlock to endBlock inclusive as one atomic modification.
+
+        If the smart indenter supports it, all indents are computed in one pass before the text is modified,
+        then only the changed indents are replaced. Otherwise blocks are indented one by one
+        """
+        indents = None
+        if self._smartIndenter.SUPPORTS_BATCH_INDENT:
+            indents = self._smartIndenter.computeIndents(startBlock, endBlock)
+
+        if indents is None:
+            stopBlock = endBlock.next()
+            with self._qpart:
+                block = startBlock
+                while block != stopBlock:
+                    self.autoIndentBlock(block, '')
+                    block = block.next()
+            return
+
+        with self._qpart:
+            cursor = QTextCursor(startBlock)
+            block = startBlock
+            for indent in indents:
+                text = block.text()
+                currentIndentLength = len(text) - len(text.lstrip())
+                if indent is not None and indent != text[:currentIndentLength]:
+                    cursor.setPosition(block.position())
+                    cursor.setPosition(block.position() + currentIndentLength, QTextCursor.KeepAnchor)
+                    cursor.insertText(indent)
+                block = block.next()
+
     def onChangeSelectedBlocksIndent(self, increase, withSpace=False):
         """Tab or Space pressed and few blocks are selected, or Shift+Tab pressed
         Insert or remove text from the beginning of blocks
@@ -200,14 +231,7 @@ class Indenter:
         endBlock = self._qpart.document().findBlock(cursor.selectionEnd())
 
         if startBlock != endBlock:  # indent multiply lines
-            stopBlock = endBlock.next()
-
-            block = startBlock
-
-            with self._qpart:
-                while block != stopBlock:
-                    self.autoIndentBlock(block, '')
-                    block = block.next()
+            self.autoIndentBlocks(startBlock, endBlock)
         else:  # indent 1 line
             self.autoIndentBlock(startBlock, '')
 
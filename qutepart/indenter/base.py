@@ -1,7 +1,12 @@
+import time
+
 # maximum number of lines we look backwards/forward to find out the indentation
 # level (the bigger the number, the longer might be the delay)
 MAX_SEARCH_OFFSET_LINES = 128
 
+# maximum time of building of the bracket tree of a big document before a search. Text is searched, if time is over
+MAX_BRACKET_TREE_UPDATE_TIME_SEC = 0.02
+
 
 class IndentAlgNone:
     """No any indentation
@@ -17,9 +22,14 @@ class IndentAlgBase(IndentAlgNone):
     """Base class for indenters
     """
     TRIGGER_CHARACTERS = ""  # indenter is called, when user types Enter of one of trigger chars
+    # Indent depends on previous blocks only through _blockIndent(), _blockText() and _blockTextTypes(),
+    # therefore many blocks might be indented with computeIndents() in one pass
+    SUPPORTS_BATCH_INDENT = False
+
     def __init__(self, qpart, indenter):
         self._qpart = qpart
         self._indenter = indenter
+        self._indentOverrides = None  # block number: new indent. Set by computeIndents()
 
     def indentBlock(self, block):
         """Indent the block
@@ -38,6 +48,29 @@ class IndentAlgBase(IndentAlgNone):
         else:  # be smart
             return self.computeSmartIndent(block, char)
 
+    def computeIndents(self, startBlock, endBlock):
+        """Compute indents for blocks from startBlock to endBlock inclusive in one forward pass.
+        Text is not modified. Already computed indents of previous blocks are used instead of the actual ones,
+        so the result is the same as if blocks were indented one by one.
+        Return list of indents. Item is None, if indentation of the block shall not be modified.
+        Return None, if indents can't be computed without modifying the text. Then blocks are indented one by one
+        """
+        indents = []
+        self._indentOverrides = {}
+        try:
+            block = startBlock
+            stopBlock = endBlock.next()
+            while block != stopBlock:
+                indent = self.computeIndent(block, '')
+                if indent is not None:
+                    self._indentOverrides[block.blockNumber()] = indent
+                indents.append(indent)
+                block = block.next()
+        finally:
+            self._indentOverrides = None
+
+        return indents
+
     def computeSmartIndent(self, block, char):
         """Compute smart indent.
         Block is current block.
@@ -106,17 +139,17 @@ class IndentAlgBase(IndentAlgNone):
             block = block.previous()
             count += 1
 
-    @classmethod
-    def iterateCharsBackwardFrom(cls, block, column):
+    def iterateCharsBackwardFrom(self, block, column):
         if column is not None:
-            text = block.text()[:column]
+            text = self._blockText(block)[:column]
             for index, char in enumerate(reversed(text)):
                 yield block, len(text) - index - 1, char
             block = block.previous()
 
-        for block in cls.iterateBlocksBackFrom(block):
-            for index, char in enumerate(reversed(block.text())):
-                yield block, len(block.text()) - index - 1, char
+        for block in self.iterateBlocksBackFrom(block):
+            text = self._blockText(block)
+            for index, char in enumerate(reversed(text)):
+                yield block, len(text) - index - 1, char
 
     def findBracketBackward(self, block, column, bracket):
         """Search for a needle and return (block, column)
@@ -134,16 +167,37 @@ class IndentAlgBase(IndentAlgNone):
         else:
             raise AssertionError('Invalid bracket "%s"' % bracket)
 
+        tree = self._qpart._bracketTree(codeOnly=False)
+        if tree is not None and \
+           tree.update(time.time() + MAX_BRACKET_TREE_UPDATE_TIME_SEC):
+            # the tree knows depth of every line. Search is not limited with MAX_SEARCH_OFFSET_LINES
+            # The tree knows the actual text, columns are shifted by computed indents
+            if column is None:
+                column = len(block.text())
+            else:
+                column = max(0, column - self._indentShift(block))
+            found = tree.findEnclosingBracket(block.blockNumber(), column, opening)
+            if found is None:
+                raise ValueError('Not found')
+            foundBlockNumber, foundColumn = found
+            foundBlock = self._qpart.document().findBlockByNumber(foundBlockNumber)
+            return foundBlock, foundColumn + self._indentShift(foundBlock)
+
         depth = 1
+        textTypesBlock = None
         for foundBlock, foundColumn, char in self.iterateCharsBackwardFrom(block, column):
-            if not self._qpart.isComment(foundBlock.blockNumber(), foundColumn):
-                if char == opening:
-                    depth = depth - 1
-                elif char == closing:
-                    depth = depth + 1
-
-                if depth == 0:
-                    return foundBlock, foundColumn
+            if char == opening or char == closing:
+                if textTypesBlock is None or foundBlock != textTypesBlock:  # get text types once per block
+                    textTypesBlock = foundBlock
+                    textTypes = self._blockTextTypes(foundBlock)
+                if not textTypes[foundColumn] in 'cbh':  # not a comment
+                    if char == opening:
+                        depth = depth - 1
+                    else:
+                        depth = depth + 1
+
+                    if depth == 0:
+                        return foundBlock, foundColumn
         else:
             raise ValueError('Not found')
 
@@ -175,13 +229,42 @@ class IndentAlgBase(IndentAlgNone):
     def _lineIndent(cls, text):
         return text[:cls._firstNonSpaceColumn(text)]
 
-    @classmethod
-    def _blockIndent(cls, block):
+    def _blockIndent(self, block):
         if block.isValid():
-            return cls._lineIndent(block.text())
+            return self._lineIndent(self._blockText(block))
         else:
             return ''
 
+    def _blockText(self, block):
+        """Text of the block. If indent of the block has been computed by computeIndents(), it is used
+        instead of the actual one. Indenters, which support batch indentation, read text of blocks with this method
+        """
+        text = block.text()
+        if self._indentOverrides and block.blockNumber() in self._indentOverrides:
+            return self._indentOverrides[block.blockNumber()] + text.lstrip()
+        else:
+            return text
+
+    def _indentShift(self, block):
+        """Difference between columns of _blockText() and columns of the actual text of the block
+        """
+        if self._indentOverrides and block.blockNumber() in self._indentOverrides:
+            return len(self._indentOverrides[block.blockNumber()]) - self._firstNonSpaceColumn(block.text())
+        else:
+            return 0
+
+    def _blockTextTypes(self, block):
+        """Text types of _blockText(). Characters of computed indent are code
+        """
+        textTypes = self._qpart.textTypes(block)
+        shift = self._indentShift(block)
+        if shift > 0:
+            return ' ' * shift + textTypes
+        elif shift < 0:
+            return textTypes[-shift:]
+        else:
+            return textTypes
+
     @classmethod
     def _prevBlockIndent(cls, block):
         prevBlock = block.previous()
@@ -191,9 +274,8 @@ class IndentAlgBase(IndentAlgNone):
 
         return cls._lineIndent(prevBlock.text())
 
-    @classmethod
-    def _prevNonEmptyBlockIndent(cls, block):
-        return cls._blockIndent(cls._prevNonEmptyBlock(block))
+    def _prevNonEmptyBlockIndent(self, block):
+        return self._blockIndent(self._prevNonEmptyBlock(block))
 
     @staticmethod
     def _prevNonEmptyBlock(block):
@@ -221,21 +303,21 @@ class IndentAlgBase(IndentAlgNone):
         """Returns the last non-whitespace column in the given line.
         If there are only whitespaces in the line, the return value is -1.
         """
-        text = block.text()
-        index = len(block.text()) - 1
+        text = self._blockText(block)
+        textTypes = self._blockTextTypes(block)
+        index = len(text) - 1
         while index >= 0 and \
               (text[index].isspace() or \
-               self._qpart.isComment(block.blockNumber(), index)):
+               textTypes[index] in 'cbh'):
             index -= 1
 
         return index
 
-    @staticmethod
-    def _nextNonSpaceColumn(block, column):
+    def _nextNonSpaceColumn(self, block, column):
         """Returns the column with a non-whitespace characters
         starting at the given cursor position and searching forwards.
         """
-        textAfter = block.text()[column:]
+        textAfter = self._blockText(block)[column:]
         if textAfter.strip():
             spaceLen = len(textAfter) - len(textAfter.lstrip())
             return column + spaceLen
@@ -247,5 +329,7 @@ class IndentAlgNormal(IndentAlgBase):
     """Class automatically computes indentation for lines
     This is basic indenter, which knows nothing about programming languages
     """
+    SUPPORTS_BATCH_INDENT = True
+
     def computeSmartIndent(self, block, char):
         return self._prevNonEmptyBlockIndent(block)
@@ -30,16 +30,18 @@ MODE = "C"
 
 class IndentAlgCStyle(IndentAlgBase):
     TRIGGER_CHARACTERS = "{})/:;#"
+    SUPPORTS_BATCH_INDENT = True
 
-    @staticmethod
-    def _prevNonEmptyBlock(block):
+    def _prevNonEmptyBlock(self, block):
         """Reimplemented base indenter level. Skips comments
         """
         block = block.previous()
-        while block.isValid() and \
-              (len(block.text().strip()) == 0 or \
-               block.text().startswith('//') or \
-               block.text().startswith('#')):
+        while block.isValid():
+            text = self._blockText(block)
+            if text.strip() and \
+               not text.startswith('//') and \
+               not text.startswith('#'):
+                break
             block = block.previous()
 
         return block
@@ -49,15 +51,15 @@ class IndentAlgCStyle(IndentAlgBase):
         Raise ValueError, if not found
         """
         if column is not None:
-            index = block.text()[:column].rfind(needle)
+            index = self._blockText(block)[:column].rfind(needle)
         else:
-            index = block.text().rfind(needle)
+            index = self._blockText(block).rfind(needle)
 
         if index != -1:
             return block, index
 
         for block in self.iterateBlocksBackFrom(block.previous()):
-            column = block.text().rfind(needle)
+            column = self._blockText(block).rfind(needle)
             if column != -1:
                 return block, column
 
@@ -82,7 +84,7 @@ class IndentAlgCStyle(IndentAlgBase):
               and c == d) { <- check for ')', and find '(', then return its indentation
         Returns input params, if no success, otherwise block and column of '('
         """
-        text = block.text()[:column - 1].rstrip()
+        text = self._blockText(block)[:column - 1].rstrip()
         if not text.endswith(')'):
             raise ValueError()
         return self.findBracketBackward(block, len(text) - 1, '(')
@@ -92,11 +94,11 @@ class IndentAlgCStyle(IndentAlgBase):
         Try to find a previous default, case or switch and return its indentation or
         None if not found.
         """
-        if not re.match(r'^\s*(default\s*|case\b.*):', block.text()):
+        if not re.match(r'^\s*(default\s*|case\b.*):', self._blockText(block)):
             return None
 
         for block in self.iterateBlocksBackFrom(block.previous()):
-            text = block.text()
+            text = self._blockText(block)
             if re.match(r"^\s*(default\s*|case\b.*):", text):
                 dbg("trySwitchStatement: success in line %d" % block.blockNumber())
                 return self._lineIndent(text)
@@ -117,7 +119,7 @@ class IndentAlgCStyle(IndentAlgBase):
         if CFG_ACCESS_MODIFIERS < 0:
             return None
 
-        if not re.match(r'^\s*((public|protected|private)\s*(slots|Q_SLOTS)?|(signals|Q_SIGNALS)\s*):\s*$', block.text()):
+        if not re.match(r'^\s*((public|protected|private)\s*(slots|Q_SLOTS)?|(signals|Q_SIGNALS)\s*):\s*$', self._blockText(block)):
             return None
 
         try:
@@ -143,23 +145,23 @@ class IndentAlgCStyle(IndentAlgBase):
         if not prevNonEmptyBlock.isValid():
             return None
 
-        prevNonEmptyBlockText = prevNonEmptyBlock.text()
+        prevNonEmptyBlockText = self._blockText(prevNonEmptyBlock)
 
         if prevNonEmptyBlockText.endswith('*/'):
             try:
-                foundBlock, notUsedColumn = self.findTextBackward(prevNonEmptyBlock, prevNonEmptyBlock.length(), '/*')
+                foundBlock, notUsedColumn = self.findTextBackward(prevNonEmptyBlock, len(prevNonEmptyBlockText), '/*')
             except ValueError:
                 foundBlock = None
 
             if foundBlock is not None:
                 dbg("tryCComment: success (1) in line %d" % foundBlock.blockNumber())
-                return self._lineIndent(foundBlock.text())
+                return self._lineIndent(self._blockText(foundBlock))
 
         if prevNonEmptyBlock != block.previous():
             # inbetween was an empty line, so do not copy the "*" character
             return None
 
-        blockTextStripped = block.text().strip()
+        blockTextStripped = self._blockText(block).strip()
         prevBlockTextStripped = prevNonEmptyBlockText.strip()
 
         if prevBlockTextStripped.startswith('/*') and not '*/' in prevBlockTextStripped:
@@ -239,10 +241,10 @@ class IndentAlgCStyle(IndentAlgBase):
 
     def tryBrace(self, block):
         def _isNamespace(block):
-            if not block.text().strip():
+            if not self._blockText(block).strip():
                 block = block.previous()
 
-            return re.match(r'^\s*namespace\b', block.text()) is not None
+            return re.match(r'^\s*namespace\b', self._blockText(block)) is not None
 
         currentBlock = self._prevNonEmptyBlock(block)
         if not currentBlock.isValid():
@@ -250,9 +252,9 @@ class IndentAlgCStyle(IndentAlgBase):
 
         indentation = None
 
-        if currentBlock.text().rstrip().endswith('{'):
+        if self._blockText(currentBlock).rstrip().endswith('{'):
             try:
-                foundBlock, notUsedColumn = self.tryParenthesisBeforeBrace(currentBlock, len(currentBlock.text().rstrip()))
+                foundBlock, notUsedColumn = self.tryParenthesisBeforeBrace(currentBlock, len(self._blockText(currentBlock).rstrip()))
             except ValueError:  # not found
                 indentation = self._blockIndent(currentBlock)
                 if CFG_INDENT_NAMESPACE or not _isNamespace(block):
@@ -279,16 +281,16 @@ class IndentAlgCStyle(IndentAlgBase):
 
         # if line ends with ')', find the '(' and check this line then.
 
-        if currentBlock.text().rstrip().endswith(')'):
+        if self._blockText(currentBlock).rstrip().endswith(')'):
             try:
-                foundBlock, foundColumn = self.findBracketBackward(currentBlock, len(currentBlock.text()), '(')
+                foundBlock, foundColumn = self.findBracketBackward(currentBlock, len(self._blockText(currentBlock)), '(')
             except ValueError:
                 pass
             else:
                 currentBlock = foundBlock
 
         # found non-empty line
-        currentBlockText = currentBlock.text()
+        currentBlockText = self._blockText(currentBlock)
         if re.match(r'^\s*(if\b|for|do\b|while|switch|[}]?\s*else|((private|public|protected|case|default|signals|Q_SIGNALS).*:))', currentBlockText) is None:
             return None
 
@@ -336,7 +338,7 @@ class IndentAlgCStyle(IndentAlgBase):
             return None
 
         # found non-empty line
-        currentText = currentBlock.text()
+        currentText = self._blockText(currentBlock)
         if currentText.rstrip().endswith(';') and \
            re.search(r'^\s*(if\b|[}]?\s*else|do\b|while\b|for)', currentText) is None:
             # idea: we had something like:
@@ -349,11 +351,11 @@ class IndentAlgCStyle(IndentAlgBase):
                 return None
 
             for block in self.iterateBlocksBackFrom(currentBlock.previous()):
-                if block.text().strip(): # not empty
+                if self._blockText(block).strip(): # not empty
                     indentation = self._blockIndent(block)
 
                     if len(indentation) < len(currentIndentation):
-                        if re.search(r'^\s*(if\b|[}]?\s*else|do\b|while\b|for)[^{]*$', block.text()) is not None:
+                        if re.search(r'^\s*(if\b|[}]?\s*else|do\b|while\b|for)[^{]*$', self._blockText(block)) is not None:
                             dbg("tryCondition: success in line %d" % block.blockNumber())
                             return indentation
                         break
@@ -371,7 +373,7 @@ class IndentAlgCStyle(IndentAlgBase):
 
         indentation = None
 
-        currentBlockText = currentBlock.text()
+        currentBlockText = self._blockText(currentBlock)
         if currentBlockText.endswith('('):
             # increase indent level
             dbg("tryStatement: success 1 in line %d" % block.blockNumber())
@@ -420,7 +422,7 @@ class IndentAlgCStyle(IndentAlgBase):
                         else:
                             # go to previous line
                             currentBlock = currentBlock.previous()
-                            currentBlockText = currentBlock.text()
+                            currentBlockText = self._blockText(currentBlock)
                     else:
                         break
 
@@ -437,7 +439,7 @@ class IndentAlgCStyle(IndentAlgBase):
                     indentation = currentIndentation
                 else:
                     indentWidth = foundColumn + 1
-                    text = foundBlock.text()
+                    text = self._blockText(foundBlock)
                     while indentWidth < len(text) and text[indentWidth].isspace():
                         indentWidth += 1
                     indentation = self._makeIndentFromWidth(indentWidth)
@@ -451,7 +453,7 @@ class IndentAlgCStyle(IndentAlgBase):
                     if alignOnAnchor:
                         if not match.group(2) in ('"', "'"):
                             foundColumn += 1
-                        foundBlockText = foundBlock.text()
+                        foundBlockText = self._blockText(foundBlock)
                         while foundColumn < len(foundBlockText) and \
                               foundBlockText[foundColumn].isspace():
                             foundColumn += 1
@@ -553,7 +555,7 @@ class IndentAlgCStyle(IndentAlgBase):
         if indent is None:
             indent = self.tryBrace(block)
         if indent is None:
-            indent = self.tryCKeywords(block, block.text().lstrip().startswith('{'))
+            indent = self.tryCKeywords(block, self._blockText(block).lstrip().startswith('{'))
         if indent is None:
             indent = self.tryCondition(block)
         if indent is None:
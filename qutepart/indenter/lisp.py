@@ -4,6 +4,7 @@ from qutepart.indenter.base import IndentAlgBase
 
 class IndentAlgLisp(IndentAlgBase):
     TRIGGER_CHARACTERS = ";"
+    SUPPORTS_BATCH_INDENT = True
 
     def computeSmartIndent(self, block, ch):
         """special rules: ;;; -> indent 0
@@ -4,6 +4,8 @@ from qutepart.indenter.base import IndentAlgBase
 class IndentAlgPython(IndentAlgBase):
     """Indenter for Python language.
     """
+    SUPPORTS_BATCH_INDENT = True
+
     def computeSmartIndent(self, block, char):
         prevIndent = self._prevNonEmptyBlockIndent(block)
 
@@ -1,5 +1,6 @@
 from qutepart.indenter.base import IndentAlgBase
 
+import bisect
 import re
 
 # Indent after lines that match this regexp
@@ -10,10 +11,14 @@ rxUnindent = re.compile(r'^\s*((end|when|else|elsif|rescue|ensure)\b|[\]\}])(.*)
 
 
 class Statement:
-    def __init__(self, qpart, startBlock, endBlock):
-        self._qpart = qpart
+    def __init__(self, indenter, startBlock, endBlock):
+        self._indenter = indenter  # IndentAlgRuby. Reads text of blocks
         self.startBlock = startBlock
         self.endBlock = endBlock
+        self._content = None
+        self._blocks = None  # blocks of the statement. Filled together with the content
+        self._blockEnds = None  # offset of the end of every block in the content
+        self._textTypes = None  # text types of every block. Filled lazily
 
     # Convert to string for debugging
     def __str__(self):
@@ -21,56 +26,97 @@ class Statement:
 
     def offsetToCursor(self, offset):
         # Return (block, column)
-        # TODO Provide helper function for this when API is converted to using cursors:
-        block = self.startBlock
-        while block != self.endBlock.next() and \
-              len(block.text()) < offset:
-            offset -= len(block.text())
-            block = block.next()
-
-        return block, offset
+        self.content()  # fill the offset table
+        if not self._blocks:
+            return self.startBlock, offset
+        index = bisect.bisect_left(self._blockEnds, offset)
+        if index == len(self._blocks):  # after the end of the statement
+            return self.endBlock.next(), offset - self._blockEnds[-1]
+        blockStart = self._blockEnds[index - 1] if index > 0 else 0
+        return self._blocks[index], offset - blockStart
+
+    def _textType(self, offset):
+        # Text type at the given offset in a statement. Text types are got once per block
+        self.content()  # fill the offset table
+        index = bisect.bisect_left(self._blockEnds, offset)
+        if index >= len(self._blocks):  # after the end of the statement. Not parsed text is code
+            return ' '
+
+        if self._textTypes[index] is None:
+            self._textTypes[index] = self._indenter._blockTextTypes(self._blocks[index])
+        textTypes = self._textTypes[index]
+
+        column = offset - (self._blockEnds[index - 1] if index > 0 else 0)
+        return textTypes[column] if column < len(textTypes) else ' '
 
     def isCode(self, offset):
         # Return document.isCode at the given offset in a statement
-        block, column = self.offsetToCursor(offset)
-        return self._qpart.isCode(block.blockNumber(), column)
+        return self._textType(offset) == ' '
 
     def isComment(self, offset):
         # Return document.isComment at the given offset in a statement
-        block, column = self.offsetToCursor(offset)
-        return self._qpart.isComment(block.blockNumber(), column)
+        return self._textType(offset) in 'cbh'
 
     def indent(self):
         # Return the indent at the beginning of the statement
-        return IndentAlgRuby._blockIndent(self.startBlock)
+        return self._indenter._blockIndent(self.startBlock)
 
     def content(self):
-        # Return the content of the statement from the document
-        cnt = ""
-        block = self.startBlock
-        while block != self.endBlock.next():
-            text = block.text()
-            if text.endswith('\\'):
-                cnt += text[:-1]
-                cnt += ' '
-            else:
-                cnt += text
-            block = block.next()
-        return cnt
+        # Return the content of the statement from the document. Built once
+        if self._content is None:
+            parts = []
+            self._blocks = []
+            self._blockEnds = []
+            length = 0
+            block = self.startBlock
+            while block != self.endBlock.next():
+                text = self._indenter._blockText(block)
+                if text.endswith('\\'):
+                    text = text[:-1] + ' '
+                parts.append(text)
+                length += len(text)
+                self._blocks.append(block)
+                self._blockEnds.append(length)
+                block = block.next()
+            self._content = ''.join(parts)
+            self._textTypes = [None] * len(self._blocks)
+        return self._content
 
 
 class IndentAlgRuby(IndentAlgBase):
     """Indenter for Ruby
     """
     TRIGGER_CHARACTERS = "cdefhilnrsuw}]"
+    SUPPORTS_BATCH_INDENT = True
+
+    def __init__(self, qpart, indenter):
+        IndentAlgBase.__init__(self, qpart, indenter)
+        # Results of the analysis of blocks. Text is not modified, while an indent is being computed,
+        # so the same statements and anchors are not searched again. Dictionaries are
+        # {function name: {key: result}}, set only while computeSmartIndent() is executed
+        self._cache = None
+
+    def _cached(self, name, key, function, *args):
+        if self._cache is None:
+            return function(*args)
+
+        functionCache = self._cache.setdefault(name, {})
+        if not key in functionCache:
+            functionCache[key] = function(*args)
+        return functionCache[key]
 
     def _isCommentBlock(self, block):
-        text = block.text()
+        return self._cached('isCommentBlock', block.blockNumber(), self._isCommentBlockImpl, block)
+
+    def _isCommentBlockImpl(self, block):
+        text = self._blockText(block)
         firstColumn = self._firstNonSpaceColumn(text)
         return firstColumn == len(text) or self._isComment(block, firstColumn)
 
     def _isComment(self, block, column):
-        return self._qpart.isComment(block.blockNumber(), column)
+        if column >= 0:  # negative column is counted from the end of the line
+            column = max(0, column - self._indentShift(block))
+        return self._qpart.isComment(block, column)
 
     def _prevNonCommentBlock(self, block):
         """Return the closest non-empty line, ignoring comments
@@ -118,6 +164,9 @@ class IndentAlgRuby(IndentAlgBase):
         """Find the last open bracket before the current line.
         Return (block, column, char) or (None, None, None)
         """
+        return self._cached('lastAnchor', (block.blockNumber(), column), self._lastAnchorImpl, block, column)
+
+    def _lastAnchorImpl(self, block, column):
         currentPos = -1
         currentBlock = None
         currentColumn = None
@@ -138,13 +187,16 @@ class IndentAlgRuby(IndentAlgBase):
         return currentBlock, currentColumn, currentChar
 
     def isStmtContinuing(self, block):
+        return self._cached('isStmtContinuing', block.blockNumber(), self._isStmtContinuingImpl, block)
+
+    def _isStmtContinuingImpl(self, block):
         #Is there an open parenthesis?
 
-        foundBlock, foundColumn, foundChar = self.lastAnchor(block, block.length())
+        foundBlock, foundColumn, foundChar = self.lastAnchor(block, len(self._blockText(block)))
         if foundBlock is not None:
             return True
 
-        stmt = Statement(self._qpart, block, block)
+        stmt = Statement(self, block, block)
         rx = re.compile(r'(\+|\-|\*|\/|\=|&&|\|\||\band\b|\bor\b|,)\s*')
         return self.testAtEnd(stmt, rx)
 
@@ -152,6 +204,9 @@ class IndentAlgRuby(IndentAlgBase):
         """Return the first line that is not preceded by a "continuing" line.
         Return currBlock if currBlock <= 0
         """
+        return self._cached('findStmtStart', block.blockNumber(), self._findStmtStartImpl, block)
+
+    def _findStmtStartImpl(self, block):
         prevBlock = self._prevNonCommentBlock(block)
         while prevBlock.isValid() and \
               (((prevBlock == block.previous()) and self._isBlockContinuing(prevBlock)) or \
@@ -178,7 +233,7 @@ class IndentAlgRuby(IndentAlgBase):
         """
         stmtEnd = self._prevNonCommentBlock(block)
         stmtStart = self.findStmtStart(stmtEnd)
-        return Statement(self._qpart, stmtStart, stmtEnd)
+        return Statement(self, stmtStart, stmtEnd)
 
     def isBlockStart(self, stmt):
         if rxIndent.search(stmt.content()):
@@ -194,7 +249,7 @@ class IndentAlgRuby(IndentAlgBase):
 
     def findBlockStart(self, block):
         nested = 0
-        stmt = Statement(self._qpart, block, block)
+        stmt = Statement(self, block, block)
         while True:
             if not stmt.startBlock.isValid():
                 return stmt
@@ -212,6 +267,13 @@ class IndentAlgRuby(IndentAlgBase):
         """indent gets three arguments: line, indentWidth in spaces,
         typed character indent
         """
+        self._cache = {}
+        try:
+            return self._computeSmartIndent(block, ch)
+        finally:
+            self._cache = None
+
+    def _computeSmartIndent(self, block, ch):
         if not self._isValidTrigger(block, ch):
             return None
 
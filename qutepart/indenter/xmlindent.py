@@ -6,18 +6,35 @@ class IndentAlgXml(IndentAlgBase):
     """Indenter for XML files
     """
     TRIGGER_CHARACTERS = "/>"
+    SUPPORTS_BATCH_INDENT = True
+
+    def computeIndents(self, startBlock, endBlock):
+        """Lines with few tags are split while aligning. Return None, if the blocks contain such lines,
+        because the text is modified
+        """
+        block = startBlock
+        while block != endBlock.next():
+            if len(self._splitTags(block.text())) > 1:
+                return None
+            block = block.next()
+
+        return IndentAlgBase.computeIndents(self, startBlock, endBlock)
+
+    @staticmethod
+    def _splitTags(lineText):
+        return re.split(r'>\s*<', lineText)
 
     def computeSmartIndent(self, block, char):
         """Compute indent for the block
         """
         lineText = block.text()
-        prevLineText = self._prevNonEmptyBlock(block).text()
+        prevLineText = self._blockText(self._prevNonEmptyBlock(block))
 
         alignOnly = char == ''
 
         if alignOnly:
             # XML might be all in one line, in which case we want to break that up.
-            tokens = re.split(r'>\s*<', lineText)
+            tokens = self._splitTags(lineText)
 
             if len(tokens) > 1:
 
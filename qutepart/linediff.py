@@ -0,0 +1,91 @@
+"""Line diff for updating the document text. Patience diff, which runs in about linear time
+"""
+
+import bisect
+
+
+def _longestIncreasingSubsequence(pairs):
+    """Longest subsequence of (oldIndex, newIndex) pairs, sorted by oldIndex, in which newIndex increases.
+    Patience sorting, O(n log n)
+    """
+    tails = []  # newIndex of the last pair of the best found subsequence of length i + 1
+    tailPairIndexes = []
+    previous = []  # index of the previous pair in the subsequence for every pair
+    for pairIndex, (oldIndex, newIndex) in enumerate(pairs):
+        length = bisect.bisect_left(tails, newIndex)
+        if length == len(tails):
+            tails.append(newIndex)
+            tailPairIndexes.append(pairIndex)
+        else:
+            tails[length] = newIndex
+            tailPairIndexes[length] = pairIndex
+        previous.append(tailPairIndexes[length - 1] if length > 0 else None)
+
+    result = []
+    pairIndex = tailPairIndexes[-1] if tailPairIndexes else None
+    while pairIndex is not None:
+        result.append(pairs[pairIndex])
+        pairIndex = previous[pairIndex]
+    result.reverse()
+    return result
+
+
+def _uniqueCommonLines(oldLines, oldStart, oldEnd, newLines, newStart, newEnd):
+    """Pairs (oldIndex, newIndex) of lines, which occur exactly once in both ranges. Sorted by oldIndex
+    """
+    newCounts = {}  # line: index or None, if not unique
+    for index in xrange(newStart, newEnd):
+        line = newLines[index]
+        newCounts[line] = None if line in newCounts else index
+
+    oldCounts = {}
+    for index in xrange(oldStart, oldEnd):
+        line = oldLines[index]
+        if newCounts.get(line) is not None:
+            oldCounts[line] = None if line in oldCounts else index
+
+    return sorted([(oldIndex, newCounts[line]) for line, oldIndex in oldCounts.iteritems() \
+                        if oldIndex is not None])
+
+
+def diffLines(oldLines, newLines):
+    """Get list of changes, which convert oldLines to newLines. Change is ``(oldStart, oldEnd, newStart, newEnd)``,
+    ``oldLines[oldStart:oldEnd]`` is replaced with ``newLines[newStart:newEnd]``. Changes are sorted and don't overlap.
+
+    Lines, which are unique in both versions, are used as anchors, ranges between them are diffed recursively.
+    A range without unique common lines is replaced as a whole, so the time is about linear,
+    but the result is not always minimal
+    """
+    changes = []
+    ranges = [(0, len(oldLines), 0, len(newLines))]  # stack. Ranges are popped in order of lines
+    while ranges:
+        oldStart, oldEnd, newStart, newEnd = ranges.pop()
+
+        while oldStart < oldEnd and newStart < newEnd and \
+              oldLines[oldStart] == newLines[newStart]:
+            oldStart += 1
+            newStart += 1
+        while oldStart < oldEnd and newStart < newEnd and \
+              oldLines[oldEnd - 1] == newLines[newEnd - 1]:
+            oldEnd -= 1
+            newEnd -= 1
+
+        if oldStart == oldEnd and newStart == newEnd:
+            continue
+
+        anchors = []
+        if oldStart < oldEnd and newStart < newEnd:
+            anchors = _longestIncreasingSubsequence(_uniqueCommonLines(oldLines, oldStart, oldEnd,
+                                                                        newLines, newStart, newEnd))
+        if not anchors:
+            changes.append((oldStart, oldEnd, newStart, newEnd))
+            continue
+
+        gaps = []
+        for oldIndex, newIndex in anchors:
+            gaps.append((oldStart, oldIndex, newStart, newIndex))
+            oldStart, newStart = oldIndex + 1, newIndex + 1
+        gaps.append((oldStart, oldEnd, newStart, newEnd))
+        ranges.extend(reversed(gaps))
+
+    return changes
@@ -53,19 +53,33 @@ class Lines:
             raise IndexError('Invalid block index', index)
         return index
 
+    def _textsRange(self, first, last):
+        """Texts of blocks [first, last]. Blocks are walked once, block is not searched for every index
+        """
+        texts = []
+        block = self._doc.findBlockByNumber(first)
+        for blockIndex in range(first, last + 1):
+            texts.append(block.text())
+            block = block.next()
+        return texts
+
     def __getitem__(self, index):
         """Get item by index
         """
-        def _getTextByIndex(blockIndex):
-            return self._doc.findBlockByNumber(blockIndex).text()
-
         if isinstance(index, int):
             index = self._checkAndConvertIndex(index)
-            return _getTextByIndex(index)
+            return self._doc.findBlockByNumber(index).text()
         elif isinstance(index, slice):
-            start, stop, step = index.indices(self._doc.blockCount())
-            return [_getTextByIndex(blockIndex) \
-                        for blockIndex in range(start, stop, step)]
+            blockIndexes = range(*index.indices(self._doc.blockCount()))
+            if not blockIndexes:
+                return []
+
+            first = min(blockIndexes[0], blockIndexes[-1])
+            texts = self._textsRange(first, max(blockIndexes[0], blockIndexes[-1]))
+            if index.step in (None, 1):
+                return texts
+            else:
+                return [texts[blockIndex - first] for blockIndex in blockIndexes]
 
     @_atomicModification
     def __setitem__(self, index, value):
@@ -80,20 +94,17 @@ class Lines:
             index = self._checkAndConvertIndex(index)
             _setBlockText(index, value)
         elif isinstance(index, slice):
-            """List of indexes is reversed for make sure
-            not processed indexes are not shifted during document modification
-            """
             start, stop, step = index.indices(self._doc.blockCount())
-            if step > 0:
-                start, stop, step = stop - 1, start - 1, step * -1
-
             blockIndexes = list(range(start, stop, step))
 
             if len(blockIndexes) != len(value):
                 raise ValueError('Attempt to replace %d lines with %d lines' % (len(blockIndexes), len(value)))
 
-            for blockIndex, text in zip(blockIndexes, value[::-1]):
-                _setBlockText(blockIndex, text)
+            if step == 1:  # one edit for all the lines
+                if blockIndexes:
+                    self._qpart._replaceLines(QTextCursor(self._doc), start, stop, list(value))
+            else:
+                self.replaceMany(dict(zip(blockIndexes, value)))
 
     @_atomicModification
     def __delitem__(self, index):
@@ -118,16 +129,41 @@ class Lines:
             index = self._checkAndConvertIndex(index)
             _removeBlock(index)
         elif isinstance(index, slice):
+            start, stop, step = index.indices(self._doc.blockCount())
+            if step == 1:  # one edit for all the lines
+                if start < stop:
+                    self._qpart._replaceLines(QTextCursor(self._doc), start, stop, [])
+                return
+
             """List of indexes is reversed for make sure
             not processed indexes are not shifted during document modification
             """
-            start, stop, step = index.indices(self._doc.blockCount())
             if step > 0:
                 start, stop, step = stop - 1, start - 1, step * -1
 
             for blockIndex in range(start, stop, step):
                 _removeBlock(blockIndex)
 
+    @_atomicModification
+    def replaceMany(self, lines):
+        """Replace many lines at once. ``lines`` is a dictionary {index: text}.
+        Every run of consecutive lines is replaced with one edit, blocks are not searched for every line
+        """
+        newTexts = {}
+        for index, text in lines.items():
+            newTexts[self._checkAndConvertIndex(index)] = text
+
+        runs = []  # [first index, list of texts]
+        for index in sorted(newTexts):
+            if runs and runs[-1][0] + len(runs[-1][1]) == index:
+                runs[-1][1].append(newTexts[index])
+            else:
+                runs.append([index, [newTexts[index]]])
+
+        cursor = QTextCursor(self._doc)
+        for first, texts in reversed(runs):  # from the end, not processed indexes are not shifted
+            self._qpart._replaceLines(cursor, first, first + len(texts), texts)
+
     class _Iterator:
         """Blocks iterator. Returns text
         """
@@ -0,0 +1,120 @@
+"""Sources of children for parent.child completion. I.e. tables of a database schema and columns of a table
+"""
+
+import collections
+import mmap
+import os
+
+from qutepart.wordindex import SortedWords
+
+
+class MappedParentChildIndex:
+    """Parent: children index, stored in a file.
+
+    The file is memory mapped, children of a parent are found with binary search.
+    Memory usage doesn't depend on the index size.
+    File contains UTF-8 lines ``parent<TAB>child``, sorted by parent. Use ``write()`` to create it::
+
+        MappedParentChildIndex.write('schema.idx', {'schema': ['users', 'orders'], 'schema.users': ['id', 'name']})
+        index = MappedParentChildIndex('schema.idx')
+        index.children('schema.users')  # [u'id', u'name']
+    """
+    def __init__(self, filePath):
+        self._file = open(filePath, 'rb')
+        if os.path.getsize(filePath) > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = ''  # empty file can't be mapped
+
+    @staticmethod
+    def write(filePath, parentChildDict):
+        """Write index file for the dictionary parent: list of children
+        """
+        lines = []
+        for parent, children in parentChildDict.items():
+            encodedParent = parent.encode('utf8') if isinstance(parent, unicode) else parent
+            for child in children:
+                encodedChild = child.encode('utf8') if isinstance(child, unicode) else child
+                lines.append('%s\t%s\n' % (encodedParent, encodedChild))
+        lines.sort()
+
+        with open(filePath, 'wb') as file_:
+            file_.writelines(lines)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def _lineStart(self, position):
+        return self._map.rfind('\n', 0, position) + 1
+
+    def _nextLineStart(self, lineStart):
+        lineEnd = self._map.find('\n', lineStart)
+        return len(self._map) if lineEnd == -1 else lineEnd + 1
+
+    def _parentAt(self, lineStart):
+        return self._map[lineStart:self._map.find('\t', lineStart)]
+
+    def children(self, parent):
+        """List of children of the parent
+        """
+        key = parent.encode('utf8') if isinstance(parent, unicode) else parent
+
+        # find the first line with parent >= key
+        low = 0
+        high = len(self._map)
+        while low < high:
+            lineStart = self._lineStart((low + high) // 2)
+            if self._parentAt(lineStart) < key:
+                low = self._nextLineStart(lineStart)
+            else:
+                high = lineStart
+
+        children = []
+        lineStart = low
+        prefix = key + '\t'
+        while lineStart < len(self._map) and self._map[lineStart:lineStart + len(prefix)] == prefix:
+            nextLineStart = self._nextLineStart(lineStart)
+            children.append(self._map[lineStart + len(prefix):nextLineStart].rstrip('\n').decode('utf8'))
+            lineStart = nextLineStart
+
+        return children
+
+
+class ParentChildCache:
+    """Children of parents for the completer. Children are fetched from the source on first use,
+    sorted for search by prefix, and kept in the LRU cache.
+
+    Parent is a dotted path, i.e. ``schema.table``. Source is one of
+
+    * dictionary parent: list of children
+    * function, which returns list of children for the parent
+    * object with ``children(parent)`` method, i.e. ``MappedParentChildIndex``
+    """
+    _MAX_CACHED_PARENT_COUNT = 256
+
+    def __init__(self, source):
+        self._source = source
+        self._cache = collections.OrderedDict()  # parent: SortedWords. The last used is the last
+
+    def _fetch(self, parent):
+        if hasattr(self._source, 'children'):
+            return self._source.children(parent)
+        elif callable(self._source):
+            return self._source(parent)
+        else:
+            return self._source.get(parent)
+
+    def children(self, parent):
+        """SortedWords with children of the parent, or None, if the parent is unknown
+        """
+        sortedWords = self._cache.pop(parent, None)
+        if sortedWords is None:
+            sortedWords = SortedWords(set(self._fetch(parent) or ()))  # unknown parents are cached too
+
+        self._cache[parent] = sortedWords
+        if len(self._cache) > self._MAX_CACHED_PARENT_COUNT:
+            self._cache.popitem(last=False)
+
+        return sortedWords if len(sortedWords) else None
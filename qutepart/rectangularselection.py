@@ -27,6 +27,9 @@ class RectangularSelection:
     def _reset(self):
         """Cursor moved while Alt is not pressed, or text modified.
         Reset rectangular selection"""
+        if self._qpart._postponeIfAtomicModification(self._reset):
+            return
+
         if self._start is not None:
             self._start = None
             self._qpart._updateExtraSelections()
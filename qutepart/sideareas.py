@@ -1,24 +1,90 @@
 """Line numbers and bookmarks areas
 """
 
-from PyQt4.QtCore import QPoint, Qt, pyqtSignal
+from PyQt4.QtCore import QEvent, QPoint, QSize, Qt, pyqtSignal
 from PyQt4.QtGui import QPainter, QPalette, \
-                        QPixmap, \
-                        QTextBlock, QWidget
+                        QPixmap, QStaticText, \
+                        QTextBlock, QTransform, QWidget
 
 import qutepart
 from qutepart.bookmarks import Bookmarks
 
 
+class VisibleBlocks:
+    """Geometry of the visible blocks. Walked once and shared by the side areas,
+    until the text is changed, scrolled or resized
+    """
+    def __init__(self, qpart):
+        self._qpart = qpart
+        self._key = None
+        self._blocks = []
+
+    def blocks(self):
+        """List of (block, blockNumber, top, height) for the visible blocks. Coordinates of the viewport
+        """
+        qpart = self._qpart
+        firstBlock = qpart.firstVisibleBlock()
+        key = (qpart.document(),
+               qpart.document().revision(),
+               firstBlock.blockNumber(),
+               qpart.contentOffset().y(),
+               qpart.viewport().width(),
+               qpart.document().documentLayout().documentSize(),  # changed, if blocks are wrapped differently
+               qpart.contentsRect().height())
+        if key != self._key:
+            self._key = key
+            self._blocks = []
+
+            block = firstBlock
+            top = int(qpart.blockBoundingGeometry(block).translated(qpart.contentOffset()).top())
+            bottom = qpart.contentsRect().height()
+            while block.isValid() and top <= bottom:
+                height = int(qpart.blockBoundingRect(block).height())
+                if block.isVisible():
+                    self._blocks.append((block, block.blockNumber(), top, height))
+                top += height
+                block = block.next()
+
+        return self._blocks
+
+
 class LineNumberArea(QWidget):
     """Line number area widget
+
+    Line numbers are drawn with cached QStaticText. Width is recalculated, when count of digits or font is changed
     """
     _LEFT_MARGIN = 5
     _RIGHT_MARGIN = 3
+    _MAX_CACHED_NUMBER_COUNT = 1024
 
     def __init__(self, qpart):
         QWidget.__init__(self, qpart)
         self._qpart = qpart
+        self._widthDigits = None
+        self._width = None
+        self._numberTexts = {}  # number: (QStaticText, width)
+
+    def changeEvent(self, event):
+        """QWidget.changeEvent() implementation. Drop cached texts and width, if font changed
+        """
+        if event.type() == QEvent.FontChange:
+            self._width = None
+            self._numberTexts = {}
+        QWidget.changeEvent(self, event)
+
+    def _numberText(self, number):
+        """Cached (QStaticText, width) for the number
+        """
+        numberText = self._numberTexts.get(number)
+        if numberText is None:
+            if len(self._numberTexts) >= self._MAX_CACHED_NUMBER_COUNT:
+                self._numberTexts = {}
+            staticText = QStaticText(str(number))
+            staticText.setTextFormat(Qt.PlainText)
+            staticText.prepare(QTransform(), self.font())
+            numberText = (staticText, int(staticText.size().width()))
+            self._numberTexts[number] = numberText
+        return numberText
 
     def sizeHint(self, ):
         """QWidget.sizeHint() implementation
@@ -26,45 +92,39 @@ class LineNumberArea(QWidget):
         return QSize(self.width(), 0)
 
     def paintEvent(self, event):
-        """QWidget.paintEvent() implementation
+        """QWidget.paintEvent() implementation.
+        Draw only blocks, which intersect with the event rect, i.e. exposed rows after scrolling
         """
         painter = QPainter(self)
         painter.fillRect(event.rect(), self.palette().color(QPalette.Window))
         painter.setPen(Qt.black)
 
-        block = self._qpart.firstVisibleBlock()
-        blockNumber = block.blockNumber()
-        top = int(self._qpart.blockBoundingGeometry(block).translated(self._qpart.contentOffset()).top())
-        bottom = top + int(self._qpart.blockBoundingRect(block).height())
         singleBlockHeight = self._qpart.cursorRect().height()
+        right = self.width() - self._RIGHT_MARGIN
+        eventTop = event.rect().top()
+        eventBottom = event.rect().bottom()
+
+        for block, blockNumber, top, height in self._qpart._visibleBlocks.blocks():
+            if top > eventBottom:
+                break
+            if top + height < eventTop:
+                continue
 
-        width = None
-        wrapMarkerColor = None
-
-        boundingRect = self._qpart.blockBoundingRect(block)
-        while block.isValid() and top <= event.rect().bottom():
-            if block.isVisible() and bottom >= event.rect().top():
-                number = str(blockNumber + 1)
-                painter.drawText(0, top, self.width() - self._RIGHT_MARGIN, self._qpart.fontMetrics().height(),
-                                 Qt.AlignRight, number)
-                if boundingRect.height() >= singleBlockHeight * 2:  # wrapped block
-                    if width is None:
-                        width = self.width()  # laizy calculation
-                    painter.fillRect(1, top + singleBlockHeight,
-                                     width - 2, boundingRect.height() - singleBlockHeight - 2,
-                                     Qt.darkGreen)
-
-            block = block.next()
-            boundingRect = self._qpart.blockBoundingRect(block)
-            top = bottom
-            bottom = top + int(boundingRect.height())
-            blockNumber += 1
+            staticText, textWidth = self._numberText(blockNumber + 1)
+            painter.drawStaticText(right - textWidth, top, staticText)
+            if height >= singleBlockHeight * 2:  # wrapped block
+                painter.fillRect(1, top + singleBlockHeight,
+                                 right + self._RIGHT_MARGIN - 2, height - singleBlockHeight - 2,
+                                 Qt.darkGreen)
 
     def width(self):
         """Desired width. Includes text and margins
         """
         digits = len(str(max(1, self._qpart.blockCount())))
-        return self._LEFT_MARGIN + self._qpart.fontMetrics().width('9') * digits + self._RIGHT_MARGIN
+        if self._width is None or digits != self._widthDigits:
+            self._widthDigits = digits
+            self._width = self._LEFT_MARGIN + self._qpart.fontMetrics().width('9') * digits + self._RIGHT_MARGIN
+        return self._width
 
 
 class MarkArea(QWidget):
@@ -95,23 +155,17 @@ class MarkArea(QWidget):
         painter = QPainter(self)
         painter.fillRect(event.rect(), self.palette().color(QPalette.Window))
 
-        block = self._qpart.firstVisibleBlock()
-        blockBoundingGeometry = self._qpart.blockBoundingGeometry(block).translated(self._qpart.contentOffset())
-        top = blockBoundingGeometry.top()
-        bottom = top + blockBoundingGeometry.height()
+        eventTop = event.rect().top()
+        eventBottom = event.rect().bottom()
 
-        for block in qutepart.iterateBlocksFrom(block):
-            height = self._qpart.blockBoundingGeometry(block).height()
-            if top > event.rect().bottom():
+        for block, blockNumber, top, height in self._qpart._visibleBlocks.blocks():
+            if top > eventBottom:
                 break
-            if block.isVisible() and \
-               bottom >= event.rect().top() and \
+            if top + height >= eventTop and \
                Bookmarks.isBlockMarked(block):
                 yPos = top + ((height - self._bookmarkPixmap.height()) / 2)  # centered
                 painter.drawPixmap(0, yPos, self._bookmarkPixmap)
 
-            top += height
-
     def width(self):
         """Desired width. Includes text and margins
         """
@@ -1,8 +1,10 @@
 """Source file parser and highlighter
 """
 
+import codecs
 import os.path
 import fnmatch
+import itertools
 import json
 import threading
 import logging
@@ -10,9 +12,12 @@ import re
 
 _logger = logging.getLogger('qutepart')
 
-class TextFormat:
+class TextFormat(object):
     """Text format definition.
 
+    Immutable, hashable and interned value. Equal formats are the same object.
+    Use ``replace()`` to get modified format
+
     Public attributes:
         color          : Font color, #rrggbb or #rgb
         background     : Font background, #rrggbb or #rgb
@@ -24,27 +29,92 @@ class TextFormat:
         spellChecking  : Text will be spell checked
         textType       : 'c' for comments, 's' for strings, ' ' for other.
     """
-    def __init__(self, color = '#000000',
-                       background = '#ffffff',
-                       selectionColor = '#0000ff',
-                       italic = False,
-                       bold = False,
-                       underline = False,
-                       strikeOut = False,
-                       spellChecking = False):
-
-        self.color = color
-        self.background = background
-        self.selectionColor = selectionColor
-        self.italic = italic
-        self.bold = bold
-        self.underline = underline
-        self.strikeOut = strikeOut
-        self.spellChecking = spellChecking
-        self.textType = ' '  # modified later
-
-    def __cmp__(self, other):
-        return cmp(self.__dict__, other.__dict__)
+    __slots__ = ('color', 'background', 'selectionColor', 'italic', 'bold',
+                 'underline', 'strikeOut', 'spellChecking', 'textType')
+
+    _internedLock = threading.Lock()
+    _interned = {}
+
+    def __new__(cls, color = '#000000',
+                     background = '#ffffff',
+                     selectionColor = '#0000ff',
+                     italic = False,
+                     bold = False,
+                     underline = False,
+                     strikeOut = False,
+                     spellChecking = False,
+                     textType = ' '):
+        key = (color, background, selectionColor, italic, bold, underline, strikeOut, spellChecking, textType)
+        with cls._internedLock:
+            if not key in cls._interned:
+                format = object.__new__(cls)
+                for name, value in zip(cls.__slots__, key):
+                    object.__setattr__(format, name, value)
+                cls._interned[key] = format
+
+            return cls._interned[key]
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TextFormat is immutable. Use replace()')
+
+    def __reduce__(self):
+        return (TextFormat, self._key())
+
+    def _key(self):
+        return tuple([getattr(self, name) for name in self.__slots__])
+
+    def __eq__(self, other):
+        return isinstance(other, TextFormat) and \
+               self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return 'TextFormat(%s)' % ', '.join(['%s=%r' % (name, getattr(self, name)) for name in self.__slots__])
+
+    def replace(self, **kwargs):
+        """Get format with some attributes replaced
+        """
+        attributes = dict(zip(self.__slots__, self._key()))
+        attributes.update(kwargs)
+        return TextFormat(**attributes)
+
+
+"""Styles.
+Parsers produce highlighted segments with style IDs, not with formats. Style is a default style name (i.e. 'dsKeyword')
+and TextFormat attributes, overridden by the syntax definition. Format for a style is calculated with a color theme,
+therefore color theme might be changed without reparsing the text.
+Style IDs are global for all syntaxes, because contexts might be included from other syntaxes
+"""
+_stylesLock = threading.Lock()
+_styles = []  # style ID is index in the list
+_styleIds = {}
+
+def registerStyle(defaultStyleName, overriddenAttributes=()):
+    """Get ID of the style. Style is registered, if it is new.
+    overriddenAttributes is a sequence of (TextFormat attribute name, value) tuples
+    """
+    style = (defaultStyleName, tuple(sorted(overriddenAttributes)))
+    with _stylesLock:
+        if not style in _styleIds:
+            _styleIds[style] = len(_styles)
+            _styles.append(style)
+        return _styleIds[style]
+
+def styleName(styleId):
+    """Get default style name (i.e. 'dsKeyword') for the style ID
+    """
+    return _styles[styleId][0]
+
+def styleFormat(styleId, colorTheme):
+    """Get TextFormat for the style ID. Format is calculated with the color theme
+    """
+    defaultStyleName, overriddenAttributes = _styles[styleId]
+    return colorTheme.getFormat(defaultStyleName).replace(**dict(overriddenAttributes))
 
 
 class Syntax:
@@ -97,7 +167,9 @@ class Syntax:
             (lineData, highlightedSegments)
         where
             lineData is data, which shall be saved and used for parsing next line
-            highlightedSegments is list of touples (segmentLength, segmentFormat)
+            highlightedSegments is list of touples (segmentLength, segmentStyleId)
+
+        segmentStyleId is None, if format is not defined. See styleFormat() and styleName()
         """
         #self.parser.parseAndPrintBlockTextualResults(text, prevLineData)
         return self.parser.highlightBlock(text, prevLineData)
@@ -114,6 +186,44 @@ class Syntax:
         """
         return self.parser.parseBlock(text, prevLineData)
 
+    def setProfilingEnabled(self, enabled):
+        """Enable or disable profiling of the parser. Counters are reset, when profiling is enabled.
+        See ``profile()``
+        """
+        self.parser.setProfilingEnabled(enabled)
+
+    def profile(self):
+        """Get profiling report. Returns dictionary::
+
+            {'syntax': name,
+             'contexts': [{'context': name, 'attempts': n, 'matches': n, 'time': seconds}, ...],
+             'rules': [{'context': name, 'index': n, 'rule': shortId, 'attempts': n, 'matches': n, 'time': seconds}, ...]}
+
+        Contexts and rules are sorted by time, the slowest are the first.
+        Context attempts are text positions, where rules were tried. Time of a context includes time of its rules,
+        time of IncludeRules rule includes time of included rules.
+        Rules and contexts of included syntaxes are profiled only if profiling is enabled for their syntaxes.
+        The C parser doesn't provide shortId(), rule class name is used instead
+        """
+        contexts = []
+        rules = []
+        for context in self.parser.contexts.values():
+            attempts, matches, seconds = context.profilingData()
+            contexts.append({'context': context.name, 'attempts': attempts, 'matches': matches, 'time': seconds})
+            for index, rule in enumerate(context.rules):
+                attempts, matches, seconds = rule.profilingData()
+                if hasattr(rule, 'shortId'):
+                    ruleId = rule.shortId()
+                else:
+                    ruleId = rule.__class__.__name__
+                rules.append({'context': context.name, 'index': index, 'rule': ruleId,
+                              'attempts': attempts, 'matches': matches, 'time': seconds})
+
+        sortKey = lambda item: item['time']
+        return {'syntax': self.name,
+                'contexts': sorted(contexts, key=sortKey, reverse=True),
+                'rules': sorted(rules, key=sortKey, reverse=True)}
+
     def _getTextType(self, lineData, column):
         """Get text type (letter)
         """
@@ -147,10 +257,59 @@ class Syntax:
         return self._getTextType(lineData, column) ==  'h'
 
 
+def _iterateLines(textOrFile, encoding):
+    """Iterate lines of text, file object, mmap or other iterable of lines.
+    Input is read lazily, EOL symbols are removed. Empty line after the last EOL is not returned,
+    as ``str.splitlines()`` does. Not unicode input is decoded with incremental decoder,
+    so multibyte encodings, i.e. utf-16, are decoded correctly
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+
+    if isinstance(textOrFile, basestring):
+        pieces = [textOrFile]
+    elif hasattr(textOrFile, 'read'):  # file objects and mmaps
+        pieces = iter(lambda: textOrFile.read(_READ_CHUNK_SIZE), '')
+    else:  # iterable of lines
+        for line in textOrFile:
+            if not isinstance(line, unicode):
+                line = decoder.decode(line)
+            yield line.rstrip(u'\r\n')
+        return
+
+    pending = u''
+    for piece in itertools.chain(pieces, [None]):
+        if piece is None:
+            piece = decoder.decode('', True)
+            isLast = True
+        else:
+            if not isinstance(piece, unicode):
+                piece = decoder.decode(piece)
+            isLast = False
+
+        text = pending + piece
+        start = 0
+        for match in _EOL_REGEXP.finditer(text):
+            if not isLast and match.end() == len(text) and match.group() == u'\r':
+                break  # might be the first half of \r\n, which is split between pieces
+            yield text[start:match.start()]
+            start = match.end()
+        pending = text[start:]
+
+    if pending:
+        yield pending
+
+
+_EOL_REGEXP = re.compile(u'\r\n|\r|\n')
+_READ_CHUNK_SIZE = 64 * 1024
+
+
 class SyntaxManager:
     """SyntaxManager holds references to loaded Syntax'es and allows to find or
     load Syntax by its name or by source file name
     """
+    # Parser freezes for a long time, if line is too long. Same limit as in the SyntaxHighlighter
+    _MAX_HIGHLIGHTED_LINE_LENGTH = 4095
+
     def __init__(self):
         self._loadedSyntaxesLock = threading.RLock()
         self._loadedSyntaxes = {}
@@ -167,7 +326,7 @@ class SyntaxManager:
                 {re.compile(fnmatch.translate(glob)): xmlFileName \
                         for glob, xmlFileName in globToXmlFileName.items()}
 
-    def _getSyntaxByXmlFileName(self, xmlFileName, formatConverterFunction):
+    def _getSyntaxByXmlFileName(self, xmlFileName):
         """Get syntax by its xml file name
         """
         import qutepart.syntax.loader  # delayed import for avoid cross-imports problem
@@ -177,37 +336,37 @@ class SyntaxManager:
                 xmlFilePath = os.path.join(os.path.dirname(__file__), "data", "xml", xmlFileName)
                 syntax = Syntax(self)
                 self._loadedSyntaxes[xmlFileName] = syntax
-                qutepart.syntax.loader.loadSyntax(syntax, xmlFilePath, formatConverterFunction)
+                qutepart.syntax.loader.loadSyntax(syntax, xmlFilePath)
 
             return self._loadedSyntaxes[xmlFileName]
 
-    def _getSyntaxByLanguageName(self, syntaxName, formatConverterFunction):
+    def _getSyntaxByLanguageName(self, syntaxName):
         """Get syntax by its name. Name is defined in the xml file
         """
         xmlFileName = self._syntaxNameToXmlFileName[syntaxName]
-        return self._getSyntaxByXmlFileName(xmlFileName, formatConverterFunction)
+        return self._getSyntaxByXmlFileName(xmlFileName)
 
-    def _getSyntaxBySourceFileName(self, name, formatConverterFunction):
+    def _getSyntaxBySourceFileName(self, name):
         """Get syntax by source name of file, which is going to be highlighted
         """
         for regExp, xmlFileName in self._extensionToXmlFileName.items():
             if regExp.match(name):
-                return self._getSyntaxByXmlFileName(xmlFileName, formatConverterFunction)
+                return self._getSyntaxByXmlFileName(xmlFileName)
         else:
             raise KeyError("No syntax for " + name)
 
-    def _getSyntaxByMimeType(self, mimeType, formatConverterFunction):
+    def _getSyntaxByMimeType(self, mimeType):
         """Get syntax by first line of the file
         """
         xmlFileName = self._mimeTypeToXmlFileName[mimeType]
-        return self._getSyntaxByXmlFileName(xmlFileName, formatConverterFunction)
+        return self._getSyntaxByXmlFileName(xmlFileName)
 
-    def _getSyntaxByFirstLine(self, firstLine, formatConverterFunction):
+    def _getSyntaxByFirstLine(self, firstLine):
         """Get syntax by first line of the file
         """
         for pattern, xmlFileName in self._firstLineToXmlFileName.items():
             if fnmatch.fnmatch(firstLine, pattern):
-                return self._getSyntaxByXmlFileName(xmlFileName, formatConverterFunction)
+                return self._getSyntaxByXmlFileName(xmlFileName)
         else:
             raise KeyError("No syntax for " + firstLine)
 
@@ -223,38 +382,124 @@ class SyntaxManager:
             * languageName
             * sourceFilePath
         First parameter in the list has biggest priority
+
+        formatConverterFunction is not used anymore and is kept for compatibility.
+        Parsers produce style IDs. See styleFormat()
         """
         syntax = None
 
         if syntax is None and xmlFileName is not None:
             try:
-                syntax = self._getSyntaxByXmlFileName(xmlFileName, formatConverterFunction)
+                syntax = self._getSyntaxByXmlFileName(xmlFileName)
             except KeyError:
                 _logger.warning('No xml definition %s' % xmlFileName)
 
         if syntax is None and mimeType is not None:
             try:
-                syntax = self._getSyntaxByMimeType(mimeType, formatConverterFunction)
+                syntax = self._getSyntaxByMimeType(mimeType)
             except KeyError:
                 _logger.warning('No syntax for mime type %s' % mimeType)
 
         if syntax is None and languageName is not None:
             try:
-                syntax = self._getSyntaxByLanguageName(languageName, formatConverterFunction)
+                syntax = self._getSyntaxByLanguageName(languageName)
             except KeyError:
                 _logger.warning('No syntax for language %s' % languageName)
 
         if syntax is None and sourceFilePath is not None:
             baseName = os.path.basename(sourceFilePath)
             try:
-                syntax = self._getSyntaxBySourceFileName(baseName, formatConverterFunction)
+                syntax = self._getSyntaxBySourceFileName(baseName)
             except KeyError:
                 pass
 
         if syntax is None and firstLine is not None:
             try:
-                syntax = self._getSyntaxByFirstLine(firstLine, formatConverterFunction)
+                syntax = self._getSyntaxByFirstLine(firstLine)
             except KeyError:
                 pass
 
         return syntax
+
+    def highlight(self, textOrFile,
+                  xmlFileName=None,
+                  mimeType=None,
+                  language=None,
+                  sourceFilePath=None,
+                  firstLine=None,
+                  encoding='utf8',
+                  colorTheme=None,
+                  syntax=None,
+                  withFormats=False):
+        """Highlight text without Qt.
+
+        ``textOrFile`` is a text, a file object, a mmap or other iterable of lines.
+        Input is read lazily, memory usage doesn't depend on file size.
+        Not unicode input is decoded with ``encoding``.
+        Syntax is detected by the parameters, as in ``getSyntax()``.
+        If ``syntax`` is set, it is used and the other syntax detection parameters are ignored.
+
+        Returns generator, which yields list of ``(start, length, styleName, textType)`` for every line.
+        Empty line after the last EOL is not yielded, as ``str.splitlines()`` does.
+        Neighbour spans always have different style or text type.
+        ``styleName`` is a default style name, i.e. ``'dsKeyword'``, see ``ColorTheme``.
+        ``textType`` is a letter, ``' '`` for code, see ``TextFormat``.
+
+        If ``withFormats`` is True, spans are ``(start, length, styleName, textType, format)``,
+        and neighbour spans also might differ only by format.
+        ``format`` is ``TextFormat`` of the style, calculated with ``colorTheme``. It includes attributes,
+        which are overridden by the syntax definition. Default color theme is used, if ``colorTheme`` is None.
+
+        KeyError is raised, if syntax is not found
+        """
+        if syntax is None:
+            syntax = self.getSyntax(xmlFileName=xmlFileName,
+                                    mimeType=mimeType,
+                                    languageName=language,
+                                    sourceFilePath=sourceFilePath,
+                                    firstLine=firstLine)
+            if syntax is None:
+                raise KeyError("Syntax not found")
+
+        if withFormats and colorTheme is None:
+            import qutepart.syntax.colortheme  # delayed import for avoid cross-imports problem
+            colorTheme = qutepart.syntax.colortheme.ColorTheme(TextFormat)
+
+        return self._highlightLines(syntax, _iterateLines(textOrFile, encoding), colorTheme if withFormats else None)
+
+    def _highlightLines(self, syntax, lines, colorTheme):
+        """Generator of spans. Formats are included, if colorTheme is not None
+        """
+        highlightBlock = syntax.highlightBlock
+        if colorTheme is not None:
+            styles = {None: ('dsNormal', colorTheme.getFormat('dsNormal'))}  # style ID: (style name, format)
+        else:
+            styles = {None: ('dsNormal',)}
+        contextStack = None
+
+        for line in lines:
+            if len(line) >= self._MAX_HIGHLIGHTED_LINE_LENGTH:
+                yield []
+                contextStack = None
+                continue
+
+            lineData, highlightedSegments = highlightBlock(line, contextStack)
+            contextStack, textTypeMap = lineData
+
+            spans = []
+            start = 0
+            for length, styleId in highlightedSegments:
+                if not styleId in styles:
+                    if colorTheme is not None:
+                        styles[styleId] = (styleName(styleId), styleFormat(styleId, colorTheme))
+                    else:
+                        styles[styleId] = (styleName(styleId),)
+                style = styles[styleId]
+                span = (start, length, style[0], textTypeMap[start]) + style[1:]
+                if spans and spans[-1][2:] == span[2:]:  # join with previous span of the same style
+                    spans[-1] = (spans[-1][0], spans[-1][1] + length) + span[2:]
+                else:
+                    spans.append(span)
+                start += length
+
+            yield spans
@@ -20,6 +20,12 @@
 
 #include <stdio.h>
 
+#ifdef _WIN32
+    #include <windows.h>
+#else
+    #include <time.h>
+#endif
+
 // Allow the PCRE's config.h to set options used by pcre.h below.
 #ifdef HAVE_PCRE_CONFIG_H
     #include "config.h"
@@ -182,6 +188,9 @@
         {"tryMatch", (PyCFunction)AbstractRule_tryMatch, METH_VARARGS, \
          "Try to parse a fragment of text" \
         }, \
+        {"profilingData", (PyCFunction)AbstractRule_profilingData, METH_NOARGS, \
+         "Get (attempts, matches, seconds) tuple. Counted, if profiling is enabled for the parser" \
+        }, \
         {NULL}  /* Sentinel */ \
     }; \
  \
@@ -209,6 +218,12 @@ typedef struct {
     PyObject* _contextToSwitch;  // Context*
 } ContextSwitcher;
 
+typedef struct {
+    long attempts;
+    long matches;
+    double time;  // seconds
+} _ProfilingCounters;
+
 typedef struct {
     PyObject_HEAD
     /* Type-specific fields go here. */
@@ -227,7 +242,8 @@ typedef struct {
 #define AbstractRule_HEAD \
     PyObject_HEAD \
     AbstractRuleParams* abstractRuleParams; \
-    void* _tryMatch;  // _tryMatchFunctionType
+    void* _tryMatch;  /* _tryMatchFunctionType */ \
+    _ProfilingCounters profilingCounters;
 
 typedef struct {
     AbstractRule_HEAD
@@ -292,6 +308,7 @@ typedef struct {
     bool dynamic;
     char textType;
     PyObject* textTypePython;
+    _ProfilingCounters profilingCounters;  // attempts are text positions, where rules were tried
 } Context;
 
 typedef struct {
@@ -319,9 +336,44 @@ typedef struct {
     Context* defaultContext;
     ContextStack* defaultContextStack;
     bool debugOutputEnabled;
+    bool profilingEnabled;
 } Parser;
 
 
+/********************************************************************************
+ *                                Profiling
+ ********************************************************************************/
+static double
+_profilingTime(void)
+{
+#ifdef _WIN32
+    LARGE_INTEGER counter;
+    LARGE_INTEGER frequency;
+    QueryPerformanceCounter(&counter);
+    QueryPerformanceFrequency(&frequency);
+    return (double)counter.QuadPart / (double)frequency.QuadPart;
+#else
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return now.tv_sec + now.tv_nsec / 1e9;
+#endif
+}
+
+static void
+_ProfilingCounters_reset(_ProfilingCounters* counters)
+{
+    counters->attempts = 0;
+    counters->matches = 0;
+    counters->time = 0;
+}
+
+static PyObject*
+_ProfilingCounters_toTuple(_ProfilingCounters* counters)
+{
+    return Py_BuildValue("lld", counters->attempts, counters->matches, counters->time);
+}
+
+
 /********************************************************************************
  *                                _RegExpMatchGroups
  ********************************************************************************/
@@ -847,8 +899,20 @@ RuleTryMatchResult_internal_free(RuleTryMatchResult_internal* self)
     _RegExpMatchGroups_release(self->data);
 }
 
+static Context*
+AbstractRule_parentContext(AbstractRuleParams* params)
+{
+    return (Context*)params->parentContext;
+}
+
+static Parser*
+AbstractRule_parentParser(AbstractRuleParams* params)
+{
+    return (Parser*)AbstractRule_parentContext(params)->parser;
+}
+
 static RuleTryMatchResult_internal
-AbstractRule_tryMatch_internal(AbstractRule* self, TextToMatchObject_internal* textToMatchObject)
+AbstractRule_tryMatch_checkColumnAndCall(AbstractRule* self, TextToMatchObject_internal* textToMatchObject)
 {
     // Skip if column doesn't match
     if (self->abstractRuleParams->column != -1 &&
@@ -862,17 +926,26 @@ AbstractRule_tryMatch_internal(AbstractRule* self, TextToMatchObject_internal* t
     return ((_tryMatchFunctionType)self->_tryMatch)((PyObject*)self, textToMatchObject);
 }
 
-
-static Context*
-AbstractRule_parentContext(AbstractRuleParams* params)
+static RuleTryMatchResult_internal
+AbstractRule_tryMatch_internal(AbstractRule* self, TextToMatchObject_internal* textToMatchObject)
 {
-    return (Context*)params->parentContext;
-}
+    if (AbstractRule_parentParser(self->abstractRuleParams)->profilingEnabled)
+    {
+        // time of IncludeRules includes time of included rules
+        double startTime = _profilingTime();
+        RuleTryMatchResult_internal result = AbstractRule_tryMatch_checkColumnAndCall(self, textToMatchObject);
 
-static Parser*
-AbstractRule_parentParser(AbstractRuleParams* params)
-{
-    return (Parser*)AbstractRule_parentContext(params)->parser;
+        self->profilingCounters.time += _profilingTime() - startTime;
+        self->profilingCounters.attempts++;
+        if (NULL != result.rule)
+            self->profilingCounters.matches++;
+
+        return result;
+    }
+    else
+    {
+        return AbstractRule_tryMatch_checkColumnAndCall(self, textToMatchObject);
+    }
 }
 
 
@@ -994,6 +1067,12 @@ AbstractRule_tryMatch(AbstractRule* self, PyObject *args, PyObject *kwds)
     return retVal;
 }
 
+static PyObject*
+AbstractRule_profilingData(AbstractRule* self)
+{
+    return _ProfilingCounters_toTuple(&self->profilingCounters);
+}
+
 /********************************************************************************
  *                                DetectChar
  ********************************************************************************/
@@ -2728,9 +2807,28 @@ Context_setRules(Context *self, PyObject *args)
 }
 
 
+static PyObject*
+Context_profilingData(Context *self)
+{
+    return _ProfilingCounters_toTuple(&self->profilingCounters);
+}
+
+static void
+Context_resetProfilingData(Context *self)
+{
+    int i;
+
+    _ProfilingCounters_reset(&self->profilingCounters);
+    for (i = 0; i < self->rulesSize; i++)
+        _ProfilingCounters_reset(&self->rulesC[i]->profilingCounters);
+}
+
+
 static PyMethodDef Context_methods[] = {
     {"setValues", (PyCFunction)Context_setValues, METH_VARARGS,  "Initialize context object with values"},
     {"setRules", (PyCFunction)Context_setRules, METH_VARARGS,  "Set list of rules"},
+    {"profilingData", (PyCFunction)Context_profilingData, METH_NOARGS,
+            "Get (attempts, matches, seconds) tuple. Counted, if profiling is enabled for the parser"},
     {NULL}  /* Sentinel */
 };
 
@@ -2767,6 +2865,8 @@ Context_parseBlock(Context* self,
     int startColumnIndex = currentColumnIndex;
     int wholeLineLen;
     int countOfNotMatchedSymbols = 0;
+    bool profilingEnabled = ((Parser*)self->parser)->profilingEnabled;
+    double startTime = profilingEnabled ? _profilingTime() : 0;
 
     TextToMatchObject_internal textToMatchObject =
                     TextToMatchObject_internal_make(currentColumnIndex,
@@ -2795,6 +2895,13 @@ Context_parseBlock(Context* self,
                 break;
         }
 
+        if (profilingEnabled)
+        {
+            self->profilingCounters.attempts++;
+            if (NULL != result.rule)
+                self->profilingCounters.matches++;
+        }
+
         if (NULL != result.rule)  // if something matched
         {
             PyObject* format;
@@ -2883,6 +2990,9 @@ Context_parseBlock(Context* self,
 
     TextToMatchObject_internal_free(&textToMatchObject);
 
+    if (profilingEnabled)
+        self->profilingCounters.time += _profilingTime() - startTime;
+
     return currentColumnIndex - startColumnIndex;
 }
 
@@ -3128,8 +3238,34 @@ Parser_highlightBlock(Parser *self, PyObject *args)
     return Parser_parseBlock_internal(self, args, true);
 }
 
+static PyObject*
+Parser_setProfilingEnabled(Parser *self, PyObject *args)
+{
+    PyObject* enabled = NULL;
+    PyObject* key;
+    PyObject* context;
+    Py_ssize_t pos = 0;
+
+    if (! PyArg_ParseTuple(args, "|O", &enabled))
+        return NULL;
+
+    BOOL_CHECK(enabled, NULL);
+
+    self->profilingEnabled = Py_True == enabled;
+
+    if (self->profilingEnabled && NULL != self->contexts)
+    {
+        while (PyDict_Next(self->contexts, &pos, &key, &context))
+            Context_resetProfilingData((Context*)context);
+    }
+
+    Py_RETURN_NONE;
+}
+
 static PyMethodDef Parser_methods[] = {
     {"setContexts", (PyCFunction)Parser_setConexts, METH_VARARGS,  "Set list of parser contexts"},
+    {"setProfilingEnabled", (PyCFunction)Parser_setProfilingEnabled, METH_VARARGS,
+            "Enable or disable profiling. Counters are reset, when profiling is enabled"},
     {"parseBlock", (PyCFunction)Parser_parseBlock, METH_VARARGS,  "Parse line of text and return line data"},
     {"highlightBlock", (PyCFunction)Parser_highlightBlock, METH_VARARGS,
             "Parse line of text and return line data and highlighted segments"},
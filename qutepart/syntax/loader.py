@@ -1,14 +1,13 @@
 """This module is a set of functions, which load Parser from Kate XML files
 """
 
-import copy
 import sys
 import xml.etree.ElementTree
 import re
 import logging
 
 from qutepart.syntax.colortheme import ColorTheme
-from qutepart.syntax import TextFormat
+from qutepart.syntax import TextFormat, registerStyle
 
 _logger = logging.getLogger('qutepart')
 
@@ -99,7 +98,7 @@ def _safeGetRequiredAttribute(xmlElement, name, default):
         return default
 
 
-def _getContext(contextName, parser, formatConverterFunction, defaultValue):
+def _getContext(contextName, parser, defaultValue):
     if not contextName:
         return defaultValue
     if contextName in parser.contexts:
@@ -107,21 +106,21 @@ def _getContext(contextName, parser, formatConverterFunction, defaultValue):
     elif contextName.startswith('##') and \
          parser.syntax.manager is not None:  # might be None, if loader is used by regenerate-definitions-db.py
         syntaxName = contextName[2:]
-        parser = parser.syntax.manager.getSyntax(formatConverterFunction, languageName = syntaxName).parser
+        parser = parser.syntax.manager.getSyntax(languageName = syntaxName).parser
         return parser.defaultContext
     elif (not contextName.startswith('##')) and \
          '##' in contextName and \
          contextName.count('##') == 1 and \
          parser.syntax.manager is not None:  # might be None, if loader is used by regenerate-definitions-db.py
         name, syntaxName = contextName.split('##')
-        parser = parser.syntax.manager.getSyntax(formatConverterFunction, languageName = syntaxName).parser
+        parser = parser.syntax.manager.getSyntax(languageName = syntaxName).parser
         return parser.contexts[name]
     else:
         _logger.warning('Invalid context name %s', repr(contextName))
         return parser.defaultContext
 
 
-def _makeContextSwitcher(contextOperation, parser, formatConverterFunction):
+def _makeContextSwitcher(contextOperation, parser):
     popsCount = 0
     contextToSwitch = None
 
@@ -134,7 +133,7 @@ def _makeContextSwitcher(contextOperation, parser, formatConverterFunction):
         if popsCount:
             _logger.warning("Invalid context operation '%s'", contextOperation)
     else:
-        contextToSwitch = _getContext(rest, parser, formatConverterFunction, None)
+        contextToSwitch = _getContext(rest, parser, None)
 
     if popsCount > 0 or contextToSwitch != None:
         return _parserModule.ContextSwitcher(popsCount, contextToSwitch, contextOperation)
@@ -146,47 +145,42 @@ def _makeContextSwitcher(contextOperation, parser, formatConverterFunction):
 ##                               Rules
 ################################################################################
 
-def _loadIncludeRules(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadIncludeRules(parentContext, xmlElement, attributeToStyleMap):
     contextName = _safeGetRequiredAttribute(xmlElement, "context", None)
 
-    context = _getContext(contextName, parentContext.parser, formatConverterFunction, parentContext.parser.defaultContext)
+    context = _getContext(contextName, parentContext.parser, parentContext.parser.defaultContext)
 
     abstractRuleParams = _loadAbstractRuleParams(parentContext,
                                                  xmlElement,
-                                                 attributeToFormatMap,
-                                                 formatConverterFunction)
+                                                 attributeToStyleMap)
     return _parserModule.IncludeRules(abstractRuleParams, context)
 
 def _simpleLoader(classObject):
-    def _load(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
+    def _load(parentContext, xmlElement, attributeToStyleMap):
         abstractRuleParams = _loadAbstractRuleParams(parentContext,
                                                      xmlElement,
-                                                     attributeToFormatMap,
-                                                     formatConverterFunction)
+                                                     attributeToStyleMap)
         return classObject(abstractRuleParams)
     return _load
 
-def _loadChildRules(context, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadChildRules(context, xmlElement, attributeToStyleMap):
     """Extract rules from Context or Rule xml element
     """
     rules = []
     for ruleElement in xmlElement.getchildren():
         if not ruleElement.tag in _ruleClassDict:
             raise ValueError("Not supported rule '%s'" % ruleElement.tag)
-        rule = _ruleClassDict[ruleElement.tag](context, ruleElement, attributeToFormatMap, formatConverterFunction)
+        rule = _ruleClassDict[ruleElement.tag](context, ruleElement, attributeToStyleMap)
         rules.append(rule)
     return rules
 
-def _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap):
     # attribute
     attribute = xmlElement.attrib.get("attribute", None)
     if attribute is not None:
         attribute = attribute.lower()  # not case sensitive
         try:
-            format = attributeToFormatMap[attribute]
-            textType = format.textType if format is not None else ' '
-            if formatConverterFunction is not None and format is not None:
-                format = formatConverterFunction(format)
+            format, textType = attributeToStyleMap[attribute]
         except KeyError:
             _logger.warning('Unknown rule attribute %s', attribute)
             format = parentContext.format
@@ -197,7 +191,7 @@ def _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, for
 
     # context
     contextText = xmlElement.attrib.get("context", '#stay')
-    context = _makeContextSwitcher(contextText, parentContext.parser, formatConverterFunction)
+    context = _makeContextSwitcher(contextText, parentContext.parser)
 
     lookAhead = _parseBoolAttribute(xmlElement.attrib.get("lookAhead", "false"))
     firstNonSpace = _parseBoolAttribute(xmlElement.attrib.get("firstNonSpace", "false"))
@@ -214,8 +208,8 @@ def _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, for
 
     return _parserModule.AbstractRuleParams(parentContext, format, textType, attribute, context, lookAhead, firstNonSpace, dynamic, column)
 
-def _loadDetectChar(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+def _loadDetectChar(parentContext, xmlElement, attributeToStyleMap):
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
 
     char = _safeGetRequiredAttribute(xmlElement, "char", None)
     if char is not None:
@@ -235,7 +229,7 @@ def _loadDetectChar(parentContext, xmlElement, attributeToFormatMap, formatConve
 
     return _parserModule.DetectChar(abstractRuleParams, unicode(char), index)
 
-def _loadDetect2Chars(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadDetect2Chars(parentContext, xmlElement, attributeToStyleMap):
     char = _safeGetRequiredAttribute(xmlElement, 'char', None)
     char1 = _safeGetRequiredAttribute(xmlElement, 'char1', None)
     if char is None or char1 is None:
@@ -243,30 +237,30 @@ def _loadDetect2Chars(parentContext, xmlElement, attributeToFormatMap, formatCon
     else:
         string = _processEscapeSequences(char) + _processEscapeSequences(char1)
 
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
     return _parserModule.Detect2Chars(abstractRuleParams, string)
 
-def _loadAnyChar(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadAnyChar(parentContext, xmlElement, attributeToStyleMap):
     string = _safeGetRequiredAttribute(xmlElement, 'String', '')
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
     return _parserModule.AnyChar(abstractRuleParams, string)
 
-def _loadStringDetect(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadStringDetect(parentContext, xmlElement, attributeToStyleMap):
     string = _safeGetRequiredAttribute(xmlElement, 'String', None)
 
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
     return _parserModule.StringDetect(abstractRuleParams,
                                       string)
 
-def _loadWordDetect(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadWordDetect(parentContext, xmlElement, attributeToStyleMap):
     word = _safeGetRequiredAttribute(xmlElement, "String", "")
     insensitive = _parseBoolAttribute(xmlElement.attrib.get("insensitive", "false"))
 
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
 
     return _parserModule.WordDetect(abstractRuleParams, word, insensitive)
 
-def _loadKeyword(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadKeyword(parentContext, xmlElement, attributeToStyleMap):
     string = _safeGetRequiredAttribute(xmlElement, 'String', None)
     try:
         words = parentContext.parser.lists[string]
@@ -277,10 +271,10 @@ def _loadKeyword(parentContext, xmlElement, attributeToFormatMap, formatConverte
 
     insensitive = _parseBoolAttribute(xmlElement.attrib.get("insensitive", "false"))
 
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
     return _parserModule.keyword(abstractRuleParams, words, insensitive)
 
-def _loadRegExpr(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadRegExpr(parentContext, xmlElement, attributeToStyleMap):
     def _processCraracterCodes(text):
         """QRegExp use \0ddd notation for character codes, where d in octal digit
         i.e. \0377 is character with code 255 in the unicode table
@@ -305,29 +299,29 @@ def _loadRegExpr(parentContext, xmlElement, attributeToFormatMap, formatConverte
         wordStart = False
         lineStart = False
 
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
     return _parserModule.RegExpr(abstractRuleParams,
                                  string, insensitive, wordStart, lineStart)
 
 def _loadAbstractNumberRule(rule, parentContext, xmlElement):
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
     return _parserModule.NumberRule(abstractRuleParams, childRules)
 
-def _loadInt(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
-    childRules = _loadChildRules(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+def _loadInt(parentContext, xmlElement, attributeToStyleMap):
+    childRules = _loadChildRules(parentContext, xmlElement, attributeToStyleMap)
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
     return _parserModule.Int(abstractRuleParams, childRules)
 
-def _loadFloat(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
-    childRules = _loadChildRules(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+def _loadFloat(parentContext, xmlElement, attributeToStyleMap):
+    childRules = _loadChildRules(parentContext, xmlElement, attributeToStyleMap)
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
     return _parserModule.Float(abstractRuleParams, childRules)
 
-def _loadRangeDetect(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadRangeDetect(parentContext, xmlElement, attributeToStyleMap):
     char = _safeGetRequiredAttribute(xmlElement, "char", 'char is not set')
     char1 = _safeGetRequiredAttribute(xmlElement, "char1", 'char1 is not set')
 
-    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToFormatMap, formatConverterFunction)
+    abstractRuleParams = _loadAbstractRuleParams(parentContext, xmlElement, attributeToStyleMap)
     return _parserModule.RangeDetect(abstractRuleParams, char, char1)
 
 
@@ -358,7 +352,7 @@ _ruleClassDict = \
 ################################################################################
 
 
-def _loadContexts(highlightingElement, parser, attributeToFormatMap, formatConverterFunction):
+def _loadContexts(highlightingElement, parser, attributeToStyleMap):
     contextsElement = highlightingElement.find('contexts')
 
     xmlElementList = contextsElement.findall('context')
@@ -380,10 +374,10 @@ def _loadContexts(highlightingElement, parser, attributeToFormatMap, formatConve
 
     # parse contexts stage 2: load contexts
     for xmlElement, context in zip(xmlElementList, contextList):
-        _loadContext(context, xmlElement, attributeToFormatMap, formatConverterFunction)
+        _loadContext(context, xmlElement, attributeToStyleMap)
 
 
-def _loadContext(context, xmlElement, attributeToFormatMap, formatConverterFunction):
+def _loadContext(context, xmlElement, attributeToStyleMap):
     """Construct context from XML element
     Contexts are at first constructed, and only then loaded, because when loading context,
     _makeContextSwitcher must have references to all defined contexts
@@ -391,25 +385,21 @@ def _loadContext(context, xmlElement, attributeToFormatMap, formatConverterFunct
     attribute = _safeGetRequiredAttribute(xmlElement, 'attribute', '<not set>').lower()
     if attribute != '<not set>':  # there are no attributes for internal contexts, used by rules. See perl.xml
         try:
-            format = attributeToFormatMap[attribute]
+            format, textType = attributeToStyleMap[attribute]
         except KeyError:
             _logger.warning('Unknown context attribute %s', attribute)
-            format = TextFormat()
+            format, textType = registerStyle('dsNormal'), ' '
     else:
-        format = None
-
-    textType = format.textType if format is not None else ' '
-    if formatConverterFunction is not None and format is not None:
-        format = formatConverterFunction(format)
+        format, textType = None, ' '
 
     lineEndContextText = xmlElement.attrib.get('lineEndContext', '#stay')
-    lineEndContext = _makeContextSwitcher(lineEndContextText,  context.parser, formatConverterFunction)
+    lineEndContext = _makeContextSwitcher(lineEndContextText,  context.parser)
     lineBeginContextText = xmlElement.attrib.get('lineEndContext', '#stay')
-    lineBeginContext = _makeContextSwitcher(lineBeginContextText, context.parser, formatConverterFunction)
+    lineBeginContext = _makeContextSwitcher(lineBeginContextText, context.parser)
 
     if _parseBoolAttribute(xmlElement.attrib.get('fallthrough', 'false')):
         fallthroughContextText = _safeGetRequiredAttribute(xmlElement, 'fallthroughContext', '#stay')
-        fallthroughContext = _makeContextSwitcher(fallthroughContextText, context.parser, formatConverterFunction)
+        fallthroughContext = _makeContextSwitcher(fallthroughContextText, context.parser)
     else:
         fallthroughContext = None
 
@@ -418,7 +408,7 @@ def _loadContext(context, xmlElement, attributeToFormatMap, formatConverterFunct
     context.setValues(attribute, format, lineEndContext, lineBeginContext, fallthroughContext, dynamic, textType)
 
     # load rules
-    rules = _loadChildRules(context, xmlElement, attributeToFormatMap, formatConverterFunction)
+    rules = _loadChildRules(context, xmlElement, attributeToStyleMap)
     context.setRules(rules)
 
 ################################################################################
@@ -441,10 +431,11 @@ def _textTypeForDefStyleName(attribute, defStyleName):
     else:
         return ' '
 
-def _makeFormat(defaultTheme, defaultStyleName, textType, item=None):
-    format = copy.copy(defaultTheme.format[defaultStyleName])
-
-    format.textType = textType
+def _makeStyle(defaultStyleName, item=None):
+    """Register style for the default style name and attributes of itemData element.
+    Return style ID
+    """
+    overriddenAttributes = []
 
     if item is not None:
         caseInsensitiveAttributes = {}
@@ -452,25 +443,27 @@ def _makeFormat(defaultTheme, defaultStyleName, textType, item=None):
             caseInsensitiveAttributes[key.lower()] = value.lower()
 
         if 'color' in caseInsensitiveAttributes:
-            format.color = caseInsensitiveAttributes['color']
+            overriddenAttributes.append(('color', caseInsensitiveAttributes['color']))
         if 'selColor' in caseInsensitiveAttributes:
-            format.selectionColor = caseInsensitiveAttributes['selColor']
+            overriddenAttributes.append(('selectionColor', caseInsensitiveAttributes['selColor']))
         if 'italic' in caseInsensitiveAttributes:
-            format.italic = _parseBoolAttribute(caseInsensitiveAttributes['italic'])
+            overriddenAttributes.append(('italic', _parseBoolAttribute(caseInsensitiveAttributes['italic'])))
         if 'bold' in caseInsensitiveAttributes:
-            format.bold = _parseBoolAttribute(caseInsensitiveAttributes['bold'])
+            overriddenAttributes.append(('bold', _parseBoolAttribute(caseInsensitiveAttributes['bold'])))
         if 'underline' in caseInsensitiveAttributes:
-            format.underline = _parseBoolAttribute(caseInsensitiveAttributes['underline'])
+            overriddenAttributes.append(('underline', _parseBoolAttribute(caseInsensitiveAttributes['underline'])))
         if 'strikeout' in caseInsensitiveAttributes:
-            format.strikeOut = _parseBoolAttribute(caseInsensitiveAttributes['strikeout'])
+            overriddenAttributes.append(('strikeOut', _parseBoolAttribute(caseInsensitiveAttributes['strikeout'])))
         if 'spellChecking' in caseInsensitiveAttributes:
-            format.spellChecking = _parseBoolAttribute(caseInsensitiveAttributes['spellChecking'])
+            overriddenAttributes.append(('spellChecking', _parseBoolAttribute(caseInsensitiveAttributes['spellChecking'])))
 
-    return format
+    return registerStyle(defaultStyleName, overriddenAttributes)
 
-def _loadAttributeToFormatMap(highlightingElement):
+def _loadAttributeToStyleMap(highlightingElement):
+    """Load map attribute: (style ID, text type)
+    """
     defaultTheme = ColorTheme(TextFormat)
-    attributeToFormatMap = {}
+    attributeToStyleMap = {}
 
     itemDatasElement = highlightingElement.find('itemDatas')
     for item in itemDatasElement.findall('itemData'):
@@ -481,22 +474,18 @@ def _loadAttributeToFormatMap(highlightingElement):
             _logger.warning("Unknown default style '%s'", defaultStyleName)
             defaultStyleName = 'dsNormal'
 
-        format = _makeFormat(defaultTheme,
-                             defaultStyleName,
-                             _textTypeForDefStyleName(attribute, defaultStyleName),
-                             item)
-
-        attributeToFormatMap[attribute] = format
+        attributeToStyleMap[attribute] = (_makeStyle(defaultStyleName, item),
+                                          _textTypeForDefStyleName(attribute, defaultStyleName))
 
     # HACK not documented, but 'normal' attribute is used by some parsers without declaration
-    if not 'normal' in attributeToFormatMap:
-        attributeToFormatMap['normal'] = _makeFormat(defaultTheme, 'dsNormal',
-                                                     _textTypeForDefStyleName('normal', 'dsNormal'))
-    if not 'string' in attributeToFormatMap:
-        attributeToFormatMap['string'] = _makeFormat(defaultTheme, 'dsString',
-                                                     _textTypeForDefStyleName('string', 'dsString'))
+    if not 'normal' in attributeToStyleMap:
+        attributeToStyleMap['normal'] = (_makeStyle('dsNormal'),
+                                         _textTypeForDefStyleName('normal', 'dsNormal'))
+    if not 'string' in attributeToStyleMap:
+        attributeToStyleMap['string'] = (_makeStyle('dsString'),
+                                         _textTypeForDefStyleName('string', 'dsString'))
 
-    return attributeToFormatMap
+    return attributeToStyleMap
 
 def _loadLists(root, highlightingElement):
     lists = {}  # list name: list
@@ -533,7 +522,7 @@ def _loadSyntaxDescription(root, syntax):
     syntax.indenter = root.attrib.get('indenter', None)
 
 
-def loadSyntax(syntax, filePath, formatConverterFunction = None):
+def loadSyntax(syntax, filePath):
     with open(filePath, 'r') as definitionFile:
         try:
             root = xml.etree.ElementTree.parse(definitionFile).getroot()
@@ -581,9 +570,9 @@ def loadSyntax(syntax, filePath, formatConverterFunction = None):
     debugOutputEnabled = _logger.isEnabledFor(logging.DEBUG)  # for cParser
     parser = _parserModule.Parser(syntax, deliminatorSetAsString, lists, keywordsCaseSensitive, debugOutputEnabled)
     syntax._setParser(parser)
-    attributeToFormatMap = _loadAttributeToFormatMap(highlightingElement)
+    attributeToStyleMap = _loadAttributeToStyleMap(highlightingElement)
 
     # parse contexts
-    _loadContexts(highlightingElement, syntax.parser, attributeToFormatMap, formatConverterFunction)
+    _loadContexts(highlightingElement, syntax.parser, attributeToStyleMap)
 
     return syntax
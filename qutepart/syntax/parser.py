@@ -17,9 +17,15 @@ import os.path
 import sys
 import re
 import logging
+import time
 
 _logger = logging.getLogger('qutepart')
 
+if sys.platform == 'win32':
+    _profilingTime = time.clock  # more precise on Windows
+else:
+    _profilingTime = time.time
+
 _numSeqReplacer = re.compile('%\d+')
 
 
@@ -144,7 +150,7 @@ class AbstractRule:
     """Base class for rule classes
     Public attributes:
         parentContext
-        format              May be None
+        format              Style ID. May be None
         textType            May be None
         attribute           May be None
         context
@@ -166,6 +172,7 @@ class AbstractRule:
         self.firstNonSpace = params.firstNonSpace
         self.dynamic = params.dynamic
         self.column = params.column
+        self.resetProfilingData()
 
     def __str__(self):
         """Serialize.
@@ -182,6 +189,38 @@ class AbstractRule:
         """
         raise NotImplementedError(str(self.__class__))
 
+    def profilingData(self):
+        """Get (attempts, matches, seconds) tuple. Counted, if profiling is enabled for the parser
+        """
+        return self._profilingAttempts, self._profilingMatches, self._profilingTime
+
+    def resetProfilingData(self):
+        self._profilingAttempts = 0
+        self._profilingMatches = 0
+        self._profilingTime = 0.
+
+    def setProfilingEnabled(self, enabled):
+        """Select profiled or plain tryMatch(). Called by the parser, when profiling is toggled,
+        so the plain method is not slowed down by profiling
+        """
+        if enabled:
+            self.tryMatch = self._profiledTryMatch
+        elif 'tryMatch' in vars(self):
+            del self.tryMatch
+
+    def _profiledTryMatch(self, textToMatchObject):
+        """tryMatch(), which counts attempts, matches and time.
+        Time of IncludeRules includes time of included rules
+        """
+        startTime = _profilingTime()
+        ruleTryMatchResult = self.__class__.tryMatch(self, textToMatchObject)
+        self._profilingTime += _profilingTime() - startTime
+        self._profilingAttempts += 1
+        if ruleTryMatchResult is not None:
+            self._profilingMatches += 1
+
+        return ruleTryMatchResult
+
     def tryMatch(self, textToMatchObject):
         """Try to find themselves in the text.
         Returns (contextStack, count, matchedRule) or (contextStack, None, None) if doesn't match
@@ -784,6 +823,7 @@ class Context:
 
     Public attributes:
         attribute
+        format       Style ID. May be None
         lineEndContext
         lineBeginContext
         fallthroughContext
@@ -795,6 +835,7 @@ class Context:
         # Will be initialized later, after all context has been created
         self.parser = parser
         self.name = name
+        self.resetProfilingData()
 
     def setValues(self, attribute, format, lineEndContext, lineBeginContext, fallthroughContext, dynamic, textType):
         self.attribute = attribute
@@ -808,6 +849,19 @@ class Context:
     def setRules(self, rules):
         self.rules = rules
 
+    def profilingData(self):
+        """Get (attempts, matches, seconds) tuple. Counted, if profiling is enabled for the parser.
+        Attempts are text positions, where rules were tried
+        """
+        return self._profilingAttempts, self._profilingMatches, self._profilingTime
+
+    def resetProfilingData(self):
+        self._profilingAttempts = 0
+        self._profilingMatches = 0
+        self._profilingTime = 0.
+        for rule in getattr(self, 'rules', []):
+            rule.resetProfilingData()
+
     def __str__(self):
         """Serialize.
         For debug logs
@@ -824,6 +878,36 @@ class Context:
             res += unicode(rule)
         return res
 
+    def setProfilingEnabled(self, enabled):
+        """Select profiled or plain parseBlock() of the context and tryMatch() of the rules.
+        Called by the parser, when profiling is toggled
+        """
+        if enabled:
+            self.parseBlock = self._profiledParseBlock
+        elif 'parseBlock' in vars(self):
+            del self.parseBlock
+
+        for rule in self.rules:
+            rule.setProfilingEnabled(enabled)
+
+    def _profiledParseBlock(self, contextStack, currentColumnIndex, text):
+        """parseBlock(), which counts attempts, matches and time.
+        The first rule is tried on every attempt, and only one rule matches, therefore attempts and matches
+        are found from the counters of own rules
+        """
+        rules = self.rules
+        attemptsBefore = rules[0]._profilingAttempts if rules else 0
+        matchesBefore = sum([rule._profilingMatches for rule in rules])
+
+        startTime = _profilingTime()
+        result = Context.parseBlock(self, contextStack, currentColumnIndex, text)
+        self._profilingTime += _profilingTime() - startTime
+
+        if rules:
+            self._profilingAttempts += rules[0]._profilingAttempts - attemptsBefore
+        self._profilingMatches += sum([rule._profilingMatches for rule in rules]) - matchesBefore
+        return result
+
     def parseBlock(self, contextStack, currentColumnIndex, text):
         """Parse block
         Exits, when reached end of the text, or when context is switched
@@ -893,8 +977,6 @@ class Parser:
 
         syntax                  Syntax instance
 
-        attributeToFormatMap    Map "attribute" : TextFormat
-
         deliminatorSet          Set of deliminator characters
         lists                   Keyword lists as dictionary "list name" : "list value"
         keywordsCaseSensitive   If true, keywords are not case sensitive
@@ -908,6 +990,16 @@ class Parser:
         self.lists = lists
         self.keywordsCaseSensitive = keywordsCaseSensitive
         # debugOutputEnabled is used only by cParser
+        self.profilingEnabled = False
+
+    def setProfilingEnabled(self, enabled):
+        """Enable or disable profiling. Counters are reset, when profiling is enabled
+        """
+        self.profilingEnabled = enabled
+        for context in self.contexts.values():
+            if enabled:
+                context.resetProfilingData()
+            context.setProfilingEnabled(enabled)
 
     def setContexts(self, contexts, defaultContext):
         self.contexts = contexts
@@ -921,7 +1013,7 @@ class Parser:
         res = u'Parser\n'
         for name, value in vars(self).iteritems():
             if not name.startswith('_') and \
-               not name in ('defaultContext', 'deliminatorSet', 'contexts', 'lists', 'syntax') and \
+               not name in ('defaultContext', 'deliminatorSet', 'contexts', 'lists', 'syntax', 'profilingEnabled') and \
                not value is None:
                 res += '\t%s: %s\n' % (name, value)
 
@@ -3,12 +3,15 @@ Uses syntax module for doing the job
 """
 
 import time
+import weakref
 
 from PyQt4.QtCore import Qt, QObject, QTimer
 from PyQt4.QtGui import QBrush, QColor, QFont, \
                         QTextBlockUserData, QTextCharFormat, QTextDocument, QTextLayout
 
 import qutepart.syntax
+import qutepart.syntax.colortheme
+from qutepart.bracketindex import BlockBrackets, BracketTree
 
 """PyQt does not define proper comparison for QTextLayout.FormatRange
 Define it to check correctly, if formats has changed.
@@ -25,9 +28,13 @@ QTextLayout.FormatRange.__cmp__ = _cmpFormatRanges
 
 
 class _TextBlockUserData(QTextBlockUserData):
-    def __init__(self, data):
+    def __init__(self, data, generation, segments):
         QTextBlockUserData.__init__(self)
         self.data = data
+        self.generation = generation
+        self.segments = segments  # for applying new color theme without parsing
+        self.codeBrackets = None  # BlockBrackets. Built on first request
+        self.notCommentBrackets = None  # BlockBrackets, which include brackets in strings
 
 
 class GlobalTimer:
@@ -83,7 +90,12 @@ class SyntaxHighlighter(QObject):
 
     _globalTimer = GlobalTimer()
 
-    def __init__(self, syntax, object):
+    # Every highlighter instance has own generation number. Block data of other generations is stale
+    _lastGeneration = 0
+    # Generation of the highlighter, which is attached to the document now. QTextDocument: generation
+    _attachedGenerations = weakref.WeakKeyDictionary()
+
+    def __init__(self, syntax, object, colorTheme=None):
         if isinstance(object, QTextDocument):
             document = object
         elif isinstance(object, QTextEdit):
@@ -95,11 +107,24 @@ class SyntaxHighlighter(QObject):
         QObject.__init__(self, document)
         self._syntax = syntax
         self._document = document
+        self._colorTheme = colorTheme or self.defaultColorTheme()
+        self._qtFormats = {}  # style ID: QTextCharFormat. Filled lazily
+
+        SyntaxHighlighter._lastGeneration += 1
+        self._generation = SyntaxHighlighter._lastGeneration
+        self._attachedGenerations[document] = self._generation
 
         # can't store references to block, Qt crashes if block removed
         self._pendingBlockNumber = None
         self._pendingAtLeastUntilBlockNumber = None
 
+        # background job, which processes all blocks, i.e. removes formats
+        self._jobFunction = None
+        self._jobBlockNumber = None
+        self._jobFromStart = False
+
+        self._bracketTrees = {}  # codeOnly: BracketTree. Created on first request
+
         document.contentsChange.connect(self._onContentsChange)
 
         charsAdded = document.lastBlock().position() + document.lastBlock().length()
@@ -107,21 +132,55 @@ class SyntaxHighlighter(QObject):
 
         document.destroyed.connect(self._onDocumentDestroyed)
 
-    def del_(self):
+    def del_(self, clearFormats=True, firstVisibleBlock=None):
+        """Detach highlighter from the document.
+
+        Complexity doesn't depend on the document size. Block data of this highlighter becomes stale
+        and is ignored. If ``clearFormats`` is set, formats are removed from the blocks
+        starting from ``firstVisibleBlock``, and the rest of the document is cleaned later in the background.
+        Don't clear formats, if new highlighter is attached to the document. It overwrites them anyway
+        """
         self._document.contentsChange.disconnect(self._onContentsChange)
         self._globalTimer.unScheduleCallback(self._onContinueHighlighting)
-        block = self._document.firstBlock()
-        while block.isValid():
-            block.layout().setAdditionalFormats([])
-            block.setUserData(None)
-            self._document.markContentsDirty(block.position(), block.length())
-            block = block.next()
+        self._globalTimer.unScheduleCallback(self._onContinueBracketTreesUpdate)
+        self._pendingBlockNumber = None
+        self._pendingAtLeastUntilBlockNumber = None
+        self._bracketTrees = {}
+        if self._attachedGenerations.get(self._document) == self._generation:
+            del self._attachedGenerations[self._document]
+
+        if clearFormats:
+            self._startJob(self._cleanBlock, firstVisibleBlock)
+        else:
+            self._stopJob()
+
+    @staticmethod
+    def defaultColorTheme():
+        """Color theme, which is used if other is not set
+        """
+        return _defaultColorTheme
+
+    def colorTheme(self):
+        """Return own color theme
+        """
+        return self._colorTheme
+
+    def setColorTheme(self, colorTheme, firstVisibleBlock=None):
+        """Change color theme. Text is not parsed again.
+        New formats are applied to the blocks starting from ``firstVisibleBlock``,
+        and to the rest of the document later, in the background
+        """
+        self._colorTheme = colorTheme
+        self._qtFormats = {}
+        self._startJob(self._reapplyBlockFormats, firstVisibleBlock)
 
     def _onDocumentDestroyed(self):
         """After C++ object was deleted, timer callback might crash the application
         Unschedule it
         """
         self._globalTimer.unScheduleCallback(self._onContinueHighlighting)
+        self._globalTimer.unScheduleCallback(self._onContinueJob)
+        self._globalTimer.unScheduleCallback(self._onContinueBracketTreesUpdate)
 
     def syntax(self):
         """Return own syntax
@@ -136,30 +195,86 @@ class SyntaxHighlighter(QObject):
     def isCode(self, block, column):
         """Check if character at column is a a code
         """
-        dataObject = block.userData()
-        data = dataObject.data if dataObject is not None else None
-        return self._syntax.isCode(data, column)
+        return self._syntax.isCode(self._lineData(block), column)
 
     def isComment(self, block, column):
         """Check if character at column is a comment
         """
-        dataObject = block.userData()
-        data = dataObject.data if dataObject is not None else None
-        return self._syntax.isComment(data, column)
+        return self._syntax.isComment(self._lineData(block), column)
 
     def isBlockComment(self, block, column):
         """Check if character at column is a block comment
         """
-        dataObject = block.userData()
-        data = dataObject.data if dataObject is not None else None
-        return self._syntax.isBlockComment(data, column)
+        return self._syntax.isBlockComment(self._lineData(block), column)
 
     def isHereDoc(self, block, column):
         """Check if character at column is a here document
         """
+        return self._syntax.isHereDoc(self._lineData(block), column)
+
+    def textTypes(self, block):
+        """Text types of all characters of the block as a string of the block text length.
+        Characters, which are not parsed yet, are code
+        """
+        length = block.length() - 1
+        lineData = self._lineData(block)
+        if lineData is None:
+            return ' ' * length
+
+        textTypeMap = lineData[1]
+        if not isinstance(textTypeMap, basestring):  # Python parser returns a list
+            textTypeMap = ''.join(textTypeMap)
+        return textTypeMap[:length].ljust(length)
+
+    def blockBrackets(self, block, codeOnly=True):
+        """Brackets of the block as BlockBrackets instance.
+        If codeOnly is False, brackets in strings are included. Brackets in comments are never included.
+        Built on first request and cached with the block data
+        """
+        text = block.text()
         dataObject = block.userData()
-        data = dataObject.data if dataObject is not None else None
-        return self._syntax.isHereDoc(data, column)
+        if dataObject is not None and \
+           dataObject.generation == self._generation:
+            brackets = dataObject.codeBrackets if codeOnly else dataObject.notCommentBrackets
+            if brackets is None or \
+               brackets.text != text:  # block has been changed, but not parsed yet
+                textTypeMap = dataObject.data[1] if dataObject.data is not None else None
+                brackets = BlockBrackets(text, textTypeMap, codeOnly)
+                if codeOnly:
+                    dataObject.codeBrackets = brackets
+                else:
+                    dataObject.notCommentBrackets = brackets
+            return brackets
+        else:
+            return BlockBrackets(text, None, codeOnly)
+
+    def bracketTree(self, codeOnly=True):
+        """BracketTree of the document. Created on first request and updated, while the document is being edited.
+        Missing summaries are built in the background in time-limited steps, after highlighting has been finished.
+        Use ``update(endTime)`` of the tree before queries
+        """
+        if not codeOnly in self._bracketTrees:
+            self._bracketTrees[codeOnly] = BracketTree(self._document,
+                                                       lambda block: self.blockBrackets(block, codeOnly))
+            self._scheduleBracketTreesUpdate()
+        return self._bracketTrees[codeOnly]
+
+    def _scheduleBracketTreesUpdate(self):
+        """Build the trees in the background. Highlighting goes first, the trees need the parsed blocks.
+        Scheduled again, when highlighting has been finished
+        """
+        if self._bracketTrees and not self.isInProgress():
+            self._globalTimer.scheduleCallback(self._onContinueBracketTreesUpdate)
+
+    def _onContinueBracketTreesUpdate(self):
+        if self.isInProgress():
+            return
+
+        endTime = time.time() + self._MAX_PARSING_TIME_SMALL_CHANGE_SEC
+        for tree in self._bracketTrees.values():
+            if not tree.update(endTime):
+                self._globalTimer.scheduleCallback(self._onContinueBracketTreesUpdate)
+                return
 
     @staticmethod
     def formatConverterFunction(format):
@@ -176,10 +291,10 @@ class SyntaxHighlighter(QObject):
 
         return qtFormat
 
-    @staticmethod
-    def _lineData(block):
+    def _lineData(self, block):
         dataObject = block.userData()
-        if dataObject is not None:
+        if dataObject is not None and \
+           dataObject.generation == self._generation:
             return dataObject.data
         else:
             return None
@@ -189,6 +304,9 @@ class SyntaxHighlighter(QObject):
         return time.time() <= SyntaxHighlighter._lastChangeTime + 1
 
     def _onContentsChange(self, from_, charsRemoved, charsAdded, zeroTimeout=False):
+        for tree in self._bracketTrees.values():  # must know new block numbers before blocks are parsed
+            tree.onContentsChange(from_, charsRemoved, charsAdded)
+
         firstBlock = self._document.findBlock(from_)
         untilBlock = self._document.findBlock(from_ + charsAdded)
 
@@ -223,17 +341,30 @@ class SyntaxHighlighter(QObject):
                              self._MAX_PARSING_TIME_SMALL_CHANGE_SEC)
 
     def _highlighBlocks(self, fromBlock, atLeastUntilBlock, timeout):
+        if self._bracketTrees:
+            fromBlockNumber = fromBlock.blockNumber()
+            parsedCount = self._parseBlocks(fromBlock, atLeastUntilBlock, timeout)
+            for tree in self._bracketTrees.values():
+                tree.invalidateBlocks(fromBlockNumber, parsedCount)
+            self._scheduleBracketTreesUpdate()
+        else:
+            self._parseBlocks(fromBlock, atLeastUntilBlock, timeout)
+
+    def _parseBlocks(self, fromBlock, atLeastUntilBlock, timeout):
+        """Parse and highlight blocks. Return count of parsed blocks
+        """
         endTime = time.time() + timeout
 
         block = fromBlock
         lineData = self._lineData(block.previous())
+        parsedCount = 0
 
         while block.isValid() and block != atLeastUntilBlock:
             if time.time() >= endTime:  # time is over, schedule parsing later and release event loop
                 self._pendingBlockNumber = block.blockNumber()
                 self._pendingAtLeastUntilBlockNumber = atLeastUntilBlock.blockNumber()
                 self._globalTimer.scheduleCallback(self._onContinueHighlighting)
-                return
+                return parsedCount
 
             contextStack = lineData[0] if lineData is not None else None
             if block.length() < 4096:
@@ -243,10 +374,8 @@ class SyntaxHighlighter(QObject):
                 invalid parsing results are still better, than freeze
                 """
                 lineData, highlightedSegments = None, []
-            if lineData is not None:
-                block.setUserData(_TextBlockUserData(lineData))
-            else:
-                block.setUserData(None)
+            block.setUserData(_TextBlockUserData(lineData, self._generation, highlightedSegments))
+            parsedCount += 1
 
             self._applyHighlightedSegments(block, highlightedSegments)
             block = block.next()
@@ -258,13 +387,11 @@ class SyntaxHighlighter(QObject):
                 self._pendingBlockNumber = block.blockNumber()
                 self._pendingAtLeastUntilBlockNumber = atLeastUntilBlock.blockNumber()
                 self._globalTimer.scheduleCallback(self._onContinueHighlighting)
-                return
+                return parsedCount
             contextStack = lineData[0] if lineData is not None else None
             lineData, highlightedSegments = self._syntax.highlightBlock(block.text(), contextStack)
-            if lineData is not None:
-                block.setUserData(_TextBlockUserData(lineData))
-            else:
-                block.setUserData(None)
+            block.setUserData(_TextBlockUserData(lineData, self._generation, highlightedSegments))
+            parsedCount += 1
 
             self._applyHighlightedSegments(block, highlightedSegments)
             if prevLineData == lineData:
@@ -276,20 +403,113 @@ class SyntaxHighlighter(QObject):
         # sucessfully finished, reset pending tasks
         self._pendingBlockNumber = None
         self._pendingAtLeastUntilBlockNumber = None
+        return parsedCount
 
     def _applyHighlightedSegments(self, block, highlightedSegments):
+        """Set formats of the block. Returns True, if formats have been changed
+        """
         ranges = []
         currentPos = 0
 
-        for length, format in highlightedSegments:
-            if format is not None:  # might be in incorrect syntax file
-                range = QTextLayout.FormatRange()
-                range.format = format
-                range.start = currentPos
-                range.length = length
-                ranges.append(range)
+        for length, styleId in highlightedSegments:
+            if styleId is not None:  # might be in incorrect syntax file
+                format = self._qtFormat(styleId)
+                if format is not None:
+                    range = QTextLayout.FormatRange()
+                    range.format = format
+                    range.start = currentPos
+                    range.length = length
+                    ranges.append(range)
             currentPos += length
 
         if block.layout().additionalFormats() != ranges:
             block.layout().setAdditionalFormats(ranges)
             self._document.markContentsDirty(block.position(), block.length())
+            return True
+        return False
+
+    def _qtFormat(self, styleId):
+        """Get QTextCharFormat for the style ID with the current color theme
+        """
+        if not styleId in self._qtFormats:
+            format = qutepart.syntax.styleFormat(styleId, self._colorTheme)
+            if format == self._colorTheme.getFormat('dsNormal'):
+                self._qtFormats[styleId] = None  # Do not apply, palette is used. Performance optimization
+            else:
+                self._qtFormats[styleId] = self.formatConverterFunction(format)
+        return self._qtFormats[styleId]
+
+    def _startJob(self, blockFunction, firstVisibleBlock):
+        """Apply blockFunction to all blocks of the document.
+        Blocks are processed from firstVisibleBlock to the end of the document, and then from the start of the document.
+        If processing takes long time, the rest of blocks is processed later, in the background
+        """
+        self._stopJob()
+        if firstVisibleBlock is None or \
+           not firstVisibleBlock.isValid():
+            firstVisibleBlock = self._document.firstBlock()
+        self._jobFunction = blockFunction
+        self._jobFromStart = firstVisibleBlock.blockNumber() != 0
+        self._runJob(firstVisibleBlock, self._MAX_PARSING_TIME_SMALL_CHANGE_SEC)
+
+    def _stopJob(self):
+        self._globalTimer.unScheduleCallback(self._onContinueJob)
+        self._jobFunction = None
+        self._jobBlockNumber = None
+
+    def _onContinueJob(self):
+        self._runJob(self._document.findBlockByNumber(self._jobBlockNumber),
+                     self._MAX_PARSING_TIME_SMALL_CHANGE_SEC)
+
+    def _runJob(self, fromBlock, timeout):
+        endTime = time.time() + timeout
+
+        block = fromBlock
+        while True:
+            while block.isValid():
+                if time.time() >= endTime:  # time is over, continue later and release event loop
+                    self._jobBlockNumber = block.blockNumber()
+                    self._globalTimer.scheduleCallback(self._onContinueJob)
+                    return
+
+                self._jobFunction(block)
+                block = block.next()
+
+            if self._jobFromStart:
+                self._jobFromStart = False
+                block = self._document.firstBlock()
+            else:
+                break
+
+        self._jobFunction = None
+        self._jobBlockNumber = None
+
+    def _cleanBlock(self, block):
+        """Remove formats and stale data from the block.
+        Data of any detached highlighter is removed, i.e. formats of the previous highlighter, which this one
+        hasn't overwritten yet. Blocks, which are already updated by the attached highlighter, are not touched
+        """
+        dataObject = block.userData()
+        if dataObject is not None and \
+           dataObject.generation != self._attachedGenerations.get(self._document):
+            block.setUserData(None)
+            if block.layout().additionalFormats():
+                block.layout().setAdditionalFormats([])
+                self._document.markContentsDirty(block.position(), block.length())
+
+    def _reapplyBlockFormats(self, block):
+        """Apply formats of the current color theme to already highlighted block.
+        If formats have been changed, new user data is set, because bold or italic fonts change geometry of the text,
+        which is cached for the block by Qutepart
+        """
+        dataObject = block.userData()
+        if dataObject is not None and \
+           dataObject.generation == self._generation:
+            if self._applyHighlightedSegments(block, dataObject.segments):
+                newDataObject = _TextBlockUserData(dataObject.data, dataObject.generation, dataObject.segments)
+                newDataObject.codeBrackets = dataObject.codeBrackets
+                newDataObject.notCommentBrackets = dataObject.notCommentBrackets
+                block.setUserData(newDataObject)
+
+
+_defaultColorTheme = qutepart.syntax.colortheme.ColorTheme(qutepart.syntax.TextFormat)
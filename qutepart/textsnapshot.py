@@ -0,0 +1,241 @@
+"""Text of a document, stored as chunks of lines. Updated incrementally, when the text is changed.
+Snapshots of the text are cheap and immutable
+"""
+
+import bisect
+import itertools
+import re
+
+from PyQt4.QtCore import QObject
+
+
+# QTextDocument.toPlainText() replaces these characters, QTextBlock.text() doesn't
+_PLAIN_TEXT_RE = re.compile(u'[\xa0\u2028\u2029\ufdd0\ufdd1]')
+_PLAIN_TEXT_TRANSLATION = {0xa0: u' ', 0x2028: u'\n', 0x2029: u'\n', 0xfdd0: u'\n', 0xfdd1: u'\n'}
+
+# str.splitlines() splits text by these characters
+_LINE_BREAK_RE = re.compile(u'[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
+
+def _plainText(text):
+    """Block text as QTextDocument.toPlainText() returns it
+    """
+    if _PLAIN_TEXT_RE.search(text) is not None:
+        return text.translate(_PLAIN_TEXT_TRANSLATION)
+    return text
+
+
+def _iterateBlocksFrom(block):
+    while block.isValid():
+        yield block
+        block = block.next()
+
+
+class TextSnapshot(object):
+    """Immutable text of a document at some moment. List-like object of lines::
+
+        snapshot = qpart.textSnapshot()
+        len(snapshot)  # count of lines
+        snapshot[10]  # text of the line
+        snapshot[10:20]  # list of lines
+        snapshot.text  # whole text, separated with \\n
+
+    Snapshot doesn't access the document, therefore it might be passed to other threads.
+    Lines are stored in chunks, which are shared with the newer snapshots, if they haven't been changed
+    """
+    def __init__(self, chunks, chunkStarts, lineCount):
+        self._chunks = chunks  # tuple of tuples of lines
+        self._chunkStarts = chunkStarts  # number of the first line of every chunk
+        self._lineCount = lineCount
+        self._text = None  # joined on first request
+
+    @staticmethod
+    def fromDocument(document, chunkSize=512):
+        """Create snapshot of the document. Walks all the blocks. Use TextStore to get snapshots cheaply
+        """
+        lines = [_plainText(block.text()) for block in _iterateBlocksFrom(document.firstBlock())]
+        chunks = tuple([tuple(lines[start:start + chunkSize]) \
+                            for start in range(0, len(lines), chunkSize)])
+        return TextSnapshot(chunks, tuple(range(0, len(lines), chunkSize)), len(lines))
+
+    def __len__(self):
+        return self._lineCount
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            for line in chunk:
+                yield line
+
+    def _locate(self, index):
+        """Get (chunk index, index in the chunk) for the line
+        """
+        chunkIndex = bisect.bisect_right(self._chunkStarts, index) - 1
+        return chunkIndex, index - self._chunkStarts[chunkIndex]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._lineCount)
+            if step != 1:
+                return [self[lineIndex] for lineIndex in range(start, stop, step)]
+
+            lines = []
+            if start < stop:
+                chunkIndex, indexInChunk = self._locate(start)
+                while len(lines) < stop - start:
+                    chunk = self._chunks[chunkIndex]
+                    lines.extend(chunk[indexInChunk:indexInChunk + stop - start - len(lines)])
+                    chunkIndex += 1
+                    indexInChunk = 0
+            return lines
+        else:
+            if index < 0:
+                index += self._lineCount
+            if index < 0 or index >= self._lineCount:
+                raise IndexError('Invalid line index', index)
+            chunkIndex, indexInChunk = self._locate(index)
+            return self._chunks[chunkIndex][indexInChunk]
+
+    @property
+    def text(self):
+        """Text, separated with ``\\n``. The same as ``QTextDocument.toPlainText()`` returns
+        """
+        if self._text is None:
+            self._text = u'\n'.join(itertools.chain.from_iterable(self._chunks))
+        return self._text
+
+    def _chunksForSaving(self):
+        """Chunks of lines as ``text.splitlines()`` returns them,
+        or None, if lines contain characters, which are line breaks for splitlines()
+        """
+        for chunk in self._chunks:
+            if _LINE_BREAK_RE.search(u''.join(chunk)) is not None:
+                return None
+
+        chunks = list(self._chunks)
+        if chunks and chunks[-1][-1] == u'':  # splitlines() doesn't return empty line after the last EOL
+            chunks[-1] = chunks[-1][:-1]
+        return [chunk for chunk in chunks if chunk]
+
+    def textForSaving(self, eol=u'\n'):
+        """Text, separated with ``eol``. The same as ``eol.join(text.splitlines())``
+        """
+        chunks = self._chunksForSaving()
+        if chunks is None:
+            return eol.join(self.text.splitlines())
+        return eol.join([eol.join(chunk) for chunk in chunks])
+
+    def writeForSaving(self, file_, eol=u'\n', encoding=None):
+        """Write ``textForSaving(eol)`` to the file chunk by chunk, without building the whole text.
+        Text is encoded, if ``encoding`` is set
+        """
+        chunks = self._chunksForSaving()
+        if chunks is None:
+            pieces = [self.textForSaving(eol)]
+        else:
+            pieces = (eol.join(chunk) for chunk in chunks)
+
+        for index, piece in enumerate(pieces):
+            if index:
+                piece = eol + piece
+            if encoding is not None:
+                piece = piece.encode(encoding)
+            file_.write(piece)
+
+
+class TextStore(QObject):
+    """Lines of a QTextDocument, stored in chunks of immutable tuples.
+
+    When text is changed, only the chunks with the changed blocks are replaced.
+    ``snapshot()`` is cheap, it doesn't copy the lines, and it returns the same snapshot, until text is changed.
+
+    Note that QTextDocument emits ``contentsChange`` at the end of an edit block, therefore the store is
+    not up to date within ``with qpart:`` block. Use ``TextSnapshot.fromDocument()`` there
+    """
+    _CHUNK_SIZE = 512
+
+    def __init__(self, document, parent=None):
+        QObject.__init__(self, parent)
+        self._document = document
+
+        self._chunks = []  # tuples of lines
+        self._chunkStarts = []  # number of the first line of every chunk
+        self._lineCount = 0
+        self._snapshot = None  # created on request, reset when text is changed
+
+        self._replaceBlocks(0, 0, document.begin(), document.blockCount())
+        document.contentsChange.connect(self._onContentsChange)
+
+    def del_(self):
+        """Detach the store from the document
+        """
+        self._document.contentsChange.disconnect(self._onContentsChange)
+
+    def snapshot(self):
+        """Get TextSnapshot of the current text
+        """
+        if self._snapshot is None:
+            self._snapshot = TextSnapshot(tuple(self._chunks), tuple(self._chunkStarts), self._lineCount)
+        return self._snapshot
+
+    def _locate(self, index):
+        """Get (chunk index, index in the chunk) for the line
+        """
+        chunkIndex = bisect.bisect_right(self._chunkStarts, index) - 1
+        return chunkIndex, index - self._chunkStarts[chunkIndex]
+
+    def _replaceBlocks(self, firstIndex, removedCount, block, addedCount):
+        """Remove removedCount lines starting from firstIndex,
+        and insert addedCount lines starting from block
+        """
+        newLines = []
+        for i in range(addedCount):
+            newLines.append(_plainText(block.text()))
+            block = block.next()
+
+        if self._chunks:
+            firstChunk, indexInChunk = self._locate(min(firstIndex, self._lineCount - 1))
+            lastChunk = self._locate(max(firstIndex + removedCount - 1, firstIndex))[0] \
+                            if firstIndex < self._lineCount else firstChunk
+            if firstIndex >= self._lineCount:
+                indexInChunk = len(self._chunks[firstChunk])
+        else:
+            firstChunk, lastChunk, indexInChunk = 0, -1, 0
+
+        lines = []
+        for chunk in self._chunks[firstChunk:lastChunk + 1]:
+            lines.extend(chunk)
+        lines[indexInChunk:indexInChunk + removedCount] = newLines
+
+        self._chunks[firstChunk:lastChunk + 1] = [tuple(lines[start:start + self._CHUNK_SIZE]) \
+                                                     for start in range(0, len(lines), self._CHUNK_SIZE)]
+        self._lineCount += addedCount - removedCount
+
+        self._chunkStarts = []
+        start = 0
+        for chunk in self._chunks:
+            self._chunkStarts.append(start)
+            start += len(chunk)
+
+        self._snapshot = None
+
+    def _onContentsChange(self, from_, charsRemoved, charsAdded):
+        """Document has been changed. Read the changed blocks.
+        Count of removed blocks is found from the difference of the block count
+        """
+        document = self._document
+
+        firstBlock = document.findBlock(from_)
+        if not firstBlock.isValid():
+            firstBlock = document.lastBlock()
+        lastBlock = document.findBlock(from_ + charsAdded)
+        if not lastBlock.isValid():  # Qt sometimes reports charsAdded, which is bigger, than the document
+            lastBlock = document.lastBlock()
+
+        firstIndex = firstBlock.blockNumber()
+        addedCount = lastBlock.blockNumber() - firstIndex + 1
+        removedCount = addedCount - (document.blockCount() - self._lineCount)
+
+        if removedCount < 0 or firstIndex + removedCount > self._lineCount:  # must not happen. Rebuild all
+            self._replaceBlocks(0, self._lineCount, document.begin(), document.blockCount())
+        else:
+            self._replaceBlocks(firstIndex, removedCount, firstBlock, addedCount)
@@ -0,0 +1,316 @@
+"""Index of words of a document. Updated incrementally, when the text is changed
+"""
+
+import bisect
+import re
+import weakref
+
+from PyQt4.QtCore import QObject
+
+
+class SortedWords:
+    """Words, sorted case insensitively. Supports fast search of words by prefix::
+
+        words = SortedWords(['foo', 'Bar', 'foobar'])
+        start, end = words.prefixRange('fo')
+        words[start:end]  # ['foo', 'foobar']
+
+    ``version`` is incremented, when the words are changed. Ranges, got for older version, are not valid
+    """
+    _MAX_CHAR = u'\uffff'
+    _MAX_INCREMENTAL_UPDATE = 64  # bigger updates are merged with one sort() call
+
+    def __init__(self, words=()):
+        self._items = sorted([(word.lower(), word) for word in words])
+        self.version = 0
+
+    @staticmethod
+    def key(word):
+        """Sort key of a word
+        """
+        return (word.lower(), word)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [item[1] for item in self._items[index]]
+        else:
+            return self._items[index][1]
+
+    def __iter__(self):
+        for lowerWord, word in self._items:
+            yield word
+
+    def add(self, word):
+        bisect.insort(self._items, (word.lower(), word))
+        self.version += 1
+
+    def remove(self, word):
+        item = (word.lower(), word)
+        index = bisect.bisect_left(self._items, item)
+        if index < len(self._items) and self._items[index] == item:
+            del self._items[index]
+            self.version += 1
+
+    def update(self, addedWords, removedWords):
+        """Add and remove many words
+        """
+        if len(addedWords) + len(removedWords) <= self._MAX_INCREMENTAL_UPDATE:
+            for word in removedWords:
+                self.remove(word)
+            for word in addedWords:
+                self.add(word)
+        else:
+            if removedWords:
+                removedItems = set([(word.lower(), word) for word in removedWords])
+                self._items = [item for item in self._items if not item in removedItems]
+            self._items.extend(sorted([(word.lower(), word) for word in addedWords]))
+            self._items.sort()  # merges 2 sorted sequences in linear time
+            self.version += 1
+
+    def index(self, word, start=0, end=None):
+        """Index of the word or -1
+        """
+        if end is None:
+            end = len(self._items)
+        item = (word.lower(), word)
+        index = bisect.bisect_left(self._items, item, start, end)
+        if index < end and self._items[index] == item:
+            return index
+        return -1
+
+    def prefixRange(self, prefix, start=0, end=None):
+        """Get (start, end) range of words, which start with prefix (case insensitive).
+        Search might be limited with start and end. i.e. with range of a shorter prefix
+        """
+        if end is None:
+            end = len(self._items)
+        lowerPrefix = prefix.lower()
+        start = bisect.bisect_left(self._items, (lowerPrefix,), start, end)
+        end = bisect.bisect_left(self._items, (lowerPrefix + self._MAX_CHAR,), start, end)
+        return start, end
+
+
+class WordCorpus:
+    """Words of many documents. Shared by WordIndex instances.
+
+    Counter of a word is count of documents, which contain it.
+    The corpus interns the words, so every unique word is stored once, regardless of count of documents with it.
+    Indexes register themselves and retract their words, when they are deleted.
+    """
+    def __init__(self):
+        self._words = {}  # word: [word, count of documents]
+        self._sortedWords = None  # built on first request, then updated incrementally
+        self._indexReferences = set()  # weak references to the registered WordIndex instances
+
+    def __contains__(self, word):
+        return word in self._words
+
+    def __iter__(self):
+        return iter(self._words)
+
+    def __len__(self):
+        return len(self._words)
+
+    def count(self, word):
+        """Count of documents, which contain the word
+        """
+        entry = self._words.get(word)
+        return entry[1] if entry is not None else 0
+
+    def sortedWords(self):
+        """Words as SortedWords instance. The instance is kept up to date
+        """
+        if self._sortedWords is None:
+            self._sortedWords = SortedWords(self._words)
+        return self._sortedWords
+
+    def intern(self, word):
+        """Get the instance of the word, which is stored in the corpus, or the word itself
+        """
+        entry = self._words.get(word)
+        return entry[0] if entry is not None else word
+
+    def register(self, index, counts):
+        """Register the index. Words, which are keys of ``counts``, are retracted, when the index is deleted
+        """
+        def onIndexDeleted(reference):
+            if reference in self._indexReferences:
+                self._indexReferences.remove(reference)
+                self.update((), counts.keys())
+
+        reference = weakref.ref(index, onIndexDeleted)
+        self._indexReferences.add(reference)
+        return reference
+
+    def unregister(self, reference):
+        """Unregister the index. Words of the index must be retracted with ``update()`` before
+        """
+        self._indexReferences.discard(reference)
+
+    def update(self, addedWords, removedWords):
+        """Words appeared in a document, or disappeared from it
+        """
+        words = self._words
+        newWords = []
+        for word in addedWords:
+            entry = words.get(word)
+            if entry is None:
+                words[word] = [word, 1]
+                newWords.append(word)
+            else:
+                entry[1] += 1
+
+        deletedWords = []
+        for word in removedWords:
+            entry = words[word]
+            entry[1] -= 1
+            if not entry[1]:
+                del words[word]
+                deletedWords.append(word)
+
+        if self._sortedWords is not None and (newWords or deletedWords):
+            self._sortedWords.update(newWords, deletedWords)
+
+
+class WordIndex(QObject):
+    """Set of words of a QTextDocument.
+
+    Words are stored per block. When text is changed, only the changed blocks are tokenized again.
+    Reference counter of a word is count of blocks, which contain it.
+    A word is removed from the index, when the last block with it has been changed or removed.
+
+    If ``corpus`` is set, words of the document are added to the WordCorpus and retracted from it,
+    when they disappear from the document, or when the index is deleted or ``del_()`` is called.
+
+    Used by the completer. Other features, which need words of the document, might use it too::
+
+        index = WordIndex(qpart.document())
+        'foo' in index  # is word in the document
+        index.count('foo')  # count of lines with the word
+        index.blockNumbers('foo')  # lines with the word
+        index.sortedWords()  # SortedWords instance for search by prefix
+    """
+    def __init__(self, document, wordPattern=r'\w+', parent=None, corpus=None):
+        QObject.__init__(self, parent)
+        self._document = document
+        self._wordRegExp = re.compile(wordPattern)
+
+        self._blockWords = []  # set of words for every block
+        self._counts = {}  # word: count of blocks
+        self._sortedWords = None  # built on first request, then updated incrementally
+
+        self._corpus = corpus
+        if corpus is not None:
+            self._corpusReference = corpus.register(self, self._counts)
+
+        self._replaceBlocks(0, 0, document.begin(), document.blockCount())
+        document.contentsChange.connect(self._onContentsChange)
+
+    def del_(self):
+        """Detach the index from the document and retract the words from the corpus
+        """
+        self._document.contentsChange.disconnect(self._onContentsChange)
+        if self._corpus is not None:
+            self._corpus.unregister(self._corpusReference)
+            self._corpus.update((), self._counts.keys())
+            self._corpus = None
+
+    def __contains__(self, word):
+        return word in self._counts
+
+    def __iter__(self):
+        return iter(self._counts)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def count(self, word):
+        """Count of blocks, which contain the word
+        """
+        return self._counts.get(word, 0)
+
+    def blockNumbers(self, word):
+        """List of numbers of blocks, which contain the word
+        """
+        if not word in self._counts:
+            return []
+        return [index for index, words in enumerate(self._blockWords) if word in words]
+
+    def sortedWords(self):
+        """Words as SortedWords instance. Built on first call and kept up to date, while the document is being edited
+        """
+        if self._sortedWords is None:
+            self._sortedWords = SortedWords(self._counts)
+        return self._sortedWords
+
+    def _replaceBlocks(self, firstIndex, removedCount, block, addedCount):
+        """Remove removedCount blocks from the index starting from firstIndex,
+        and insert addedCount blocks starting from block
+        """
+        counts = self._counts
+
+        disappearedWords = set()
+        for words in self._blockWords[firstIndex:firstIndex + removedCount]:
+            for word in words:
+                count = counts[word] - 1
+                if count:
+                    counts[word] = count
+                else:
+                    del counts[word]
+                    disappearedWords.add(word)
+
+        findall = self._wordRegExp.findall
+        intern = self._corpus.intern if self._corpus is not None else None
+        appearedWords = set()
+        newBlockWords = []
+        for i in range(addedCount):
+            words = set(findall(block.text()))
+            if intern is not None:  # share word instances with other documents
+                words = frozenset([intern(word) for word in words])
+            else:
+                words = frozenset(words)
+
+            for word in words:
+                count = counts.get(word, 0)
+                counts[word] = count + 1
+                if not count:
+                    if word in disappearedWords:
+                        disappearedWords.remove(word)
+                    else:
+                        appearedWords.add(word)
+
+            newBlockWords.append(words)
+            block = block.next()
+
+        self._blockWords[firstIndex:firstIndex + removedCount] = newBlockWords
+
+        if appearedWords or disappearedWords:
+            if self._sortedWords is not None:
+                self._sortedWords.update(appearedWords, disappearedWords)
+            if self._corpus is not None:
+                self._corpus.update(appearedWords, disappearedWords)
+
+    def _onContentsChange(self, from_, charsRemoved, charsAdded):
+        """Document has been changed. Tokenize the changed blocks.
+        Count of removed blocks is found from the difference of the block count
+        """
+        document = self._document
+
+        firstBlock = document.findBlock(from_)
+        if not firstBlock.isValid():
+            firstBlock = document.lastBlock()
+        lastBlock = document.findBlock(from_ + charsAdded)
+        if not lastBlock.isValid():  # Qt sometimes reports charsAdded, which is bigger, than the document
+            lastBlock = document.lastBlock()
+
+        firstIndex = firstBlock.blockNumber()
+        addedCount = lastBlock.blockNumber() - firstIndex + 1
+        removedCount = addedCount - (document.blockCount() - len(self._blockWords))
+
+        if removedCount < 0 or firstIndex + removedCount > len(self._blockWords):  # must not happen. Rebuild all
+            self._replaceBlocks(0, len(self._blockWords), document.begin(), document.blockCount())
+        else:
+            self._replaceBlocks(firstIndex, removedCount, firstBlock, addedCount)
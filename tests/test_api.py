@@ -1,18 +1,22 @@
 #!/usr/bin/env python
 
+import io
 import os
 import sys
+import tempfile
 import unittest
 
 import base
 
 from PyQt4.QtCore import Qt
+from PyQt4.QtGui import QColor, QTextCursor, QTextOption
 from PyQt4.QtTest import QTest
 
 from qutepart import Qutepart
 
 import qutepart.completer
-qutepart.completer._GlobalUpdateWordSetTimer._IDLE_TIMEOUT_MS = 0
+import qutepart.syntax
+import qutepart.syntax.colortheme
 
 class _BaseTest(unittest.TestCase):
     """Base class for tests
@@ -120,6 +124,235 @@ class InsertText(_BaseTest):
         self.assertEquals(self.qpart.text, '12345\n67890\nabcdeZ')
 
 
+class TextSnapshot(_BaseTest):
+    def test_snapshot(self):
+        self.qpart.text = '\n'.join(['line %d' % i for i in range(2000)])
+        snapshot = self.qpart.textSnapshot()
+        self.assertEquals(len(snapshot), 2000)
+        self.assertEquals(snapshot[1500], 'line 1500')
+        self.assertEquals(snapshot[1998:], ['line 1998', 'line 1999'])
+
+        self.qpart.insertText((1500, 0), 'new\n')
+        self.assertEquals(self.qpart.text, self.qpart.toPlainText())
+        self.assertEquals(self.qpart.textSnapshot()[1500:1502], ['new', 'line 1500'])
+        self.assertEquals(snapshot[1500], 'line 1500')  # old snapshot is not changed
+        self.assertEquals(len(snapshot), 2000)
+
+    def test_atomic_modification(self):
+        self.qpart.text = 'abc'
+        with self.qpart:
+            self.qpart.insertText(0, 'x\n')
+            self.assertEquals(self.qpart.text, 'x\nabc')
+        self.assertEquals(self.qpart.text, 'x\nabc')
+
+    def test_write_for_saving(self):
+        self.qpart.text = 'a\nb\n'
+        self.qpart.eol = '\r\n'
+        self.assertEquals(self.qpart.textForSaving(), 'a\r\nb')
+
+        file_ = io.BytesIO()
+        self.qpart.writeTextForSaving(file_, 'utf8')
+        self.assertEquals(file_.getvalue(), 'a\r\nb')
+
+
+class UpdateText(_BaseTest):
+    def test_update(self):
+        self.qpart.text = 'a\nb\nc\nd'
+        self.qpart.cursorPosition = (2, 1)
+        self.qpart.updateText('x\nb\nc\nd\ne')
+        self.assertEquals(self.qpart.text, 'x\nb\nc\nd\ne')
+        self.assertEquals(self.qpart.cursorPosition, (2, 1))
+
+        self.qpart.document().undo()
+        self.assertEquals(self.qpart.text, 'a\nb\nc\nd')
+
+    def test_setters(self):
+        self.qpart.text = 'a\nb\nc'
+        self.qpart.cursorPosition = (1, 1)
+        self.qpart.lines = ['a', 'b', 'c', 'd']
+        self.assertEquals(self.qpart.text, 'a\nb\nc\nd')
+        self.assertEquals(self.qpart.cursorPosition, (1, 1))
+        self.assertFalse(self.qpart.document().isModified())
+
+        self.qpart.text = ''
+        self.assertEquals(self.qpart.text, '')
+
+    def test_crlf_reload(self):
+        self.qpart.text = 'a\r\nb\r\n'
+        self.assertEquals(self.qpart.lines[:], ['a', 'b', ''])
+
+        self.qpart.text = 'a\r\nb\r\nc\r\n'
+        self.assertEquals(self.qpart.lines[:], ['a', 'b', 'c', ''])
+
+        self.qpart.updateText(u'a\rb\u2029c\nd')
+        self.assertEquals(self.qpart.lines[:], ['a', 'b', 'c', 'd'])
+
+    def test_big_scattered_changes(self):
+        oldLines = [('' if index % 5 == 0 else 'line %d' % index) for index in range(50000)]
+        newLines = list(oldLines)
+        for index in range(1, 50000, 500):
+            newLines[index] = 'changed %d' % index
+        self.qpart.lines = oldLines
+
+        changes = []
+        self.qpart.document().contentsChange.connect(lambda pos, removed, added: changes.append(pos))
+        self.qpart.updateText('\n'.join(newLines))
+        self.assertEquals(self.qpart.lines[:], newLines)
+        self.assertEquals(len(changes), 100)  # only the changed lines
+
+        self.qpart.document().undo()
+        self.assertEquals(self.qpart.lines[:], oldLines)
+
+
+class LoadFile(_BaseTest):
+    def setUp(self):
+        _BaseTest.setUp(self)
+        self._filePath = tempfile.mktemp()
+        with open(self._filePath, 'wb') as file_:
+            file_.write(u'\u0444\u0430\u0439\u043b\r\n'.encode('utf8') * 1000)
+
+    def tearDown(self):
+        os.remove(self._filePath)
+        _BaseTest.tearDown(self)
+
+    def _waitFinished(self, loader):
+        results = []
+        loader.finished.connect(results.append)
+        while not results:
+            self.app.processEvents()
+        return results[0]
+
+    def test_load(self):
+        self.qpart.text = 'old text'
+        loader = self.qpart.loadFile(self._filePath)
+        loader._FIRST_CHUNK_SIZE = loader._CHUNK_SIZE = 7  # split characters and \r\n between chunks
+        self.assertTrue(self.qpart.isReadOnly())
+
+        self.assertTrue(self._waitFinished(loader))
+        self.assertEquals(self.qpart.lines[:], [u'\u0444\u0430\u0439\u043b'] * 1000 + [''])
+        self.assertEquals(self.qpart.cursorPosition, (0, 0))
+        self.assertFalse(self.qpart.isReadOnly())
+        self.assertFalse(self.qpart.document().isUndoAvailable())
+
+    def test_cancel(self):
+        loader = self.qpart.loadFile(self._filePath)
+        loader._FIRST_CHUNK_SIZE = loader._CHUNK_SIZE = 100
+        loader.progress.connect(lambda loaded, total: loader.cancel())
+
+        self.assertFalse(self._waitFinished(loader))
+        self.assertLess(len(self.qpart.lines), 100)
+        self.assertFalse(self.qpart.isReadOnly())
+
+    def test_decoding_error(self):
+        with open(self._filePath, 'ab') as file_:
+            file_.write('\xff')
+
+        loader = self.qpart.loadFile(self._filePath)
+        loader._FIRST_CHUNK_SIZE = loader._CHUNK_SIZE = 1000
+        errors = []
+        loader.error.connect(errors.append)
+
+        self.assertFalse(self._waitFinished(loader))
+        self.assertEquals(len(errors), 1)
+        self.assertIn('at byte 10000', errors[0])
+        self.assertEquals(self.qpart.text, '')  # damaged text must not be saved
+        self.assertFalse(self.qpart.isReadOnly())
+
+        loader = self.qpart.loadFile(self._filePath, errors='replace')
+        self.assertTrue(self._waitFinished(loader))
+        self.assertEquals(self.qpart.lines[-1], u'\ufffd')
+
+
+class AtomicModification(_BaseTest):
+    def test_listeners_postponed(self):
+        self.qpart.text = 'a\nb\nc\nd'
+        calls = []
+        currentLineExtraSelections = self.qpart._currentLineExtraSelections
+
+        def countingCurrentLineExtraSelections():
+            calls.append(None)
+            return currentLineExtraSelections()
+        self.qpart._currentLineExtraSelections = countingCurrentLineExtraSelections
+
+        with self.qpart:
+            for line in range(4):
+                self.qpart.lines[line] = 'x'
+                self.qpart.cursorPosition = (line, 1)
+            self.assertEquals(calls, [])
+
+        self.assertEquals(len(calls), 1)
+        self.assertEquals(self.qpart.text, 'x\nx\nx\nx')
+
+
+class BlockMarkers(_BaseTest):
+    def test_geometry(self):
+        self.qpart.show()
+        self.qpart.text = 'x\n        y  '
+        base._processPendingEvents(self.app)
+
+        block = self.qpart.document().findBlockByNumber(1)
+        markers = self.qpart._blockMarkers.markers(block)
+        self.assertEquals([column for column, line in markers.indentMarkers], [4])
+        self.assertEquals(len(markers.spaceRects), 2)
+
+        offset = self.qpart.blockBoundingGeometry(block).translated(self.qpart.contentOffset()).topLeft().toPoint()
+        cursor = QTextCursor(block)
+        cursor.setPositionInBlock(4)
+        self.assertEquals(markers.indentMarkers[0][1].p1() + offset, self.qpart.cursorRect(cursor).topLeft())
+
+        self.assertIs(self.qpart._blockMarkers.markers(block), markers)  # cached
+        self.qpart.lines[1] = '    y'
+        self.assertIsNot(self.qpart._blockMarkers.markers(block), markers)
+
+    def test_color_theme_changed(self):
+        self.qpart.show()
+        self.qpart.text = 'x = 1  # comment  '
+        self.qpart.detectSyntax(language='Python')
+        base._processPendingEvents(self.app)
+
+        block = self.qpart.document().firstBlock()
+        markers = self.qpart._blockMarkers.markers(block)
+        self.assertIs(self.qpart._blockMarkers.markers(block), markers)
+
+        theme = qutepart.syntax.colortheme.ColorTheme(qutepart.syntax.TextFormat)
+        theme.format['dsComment'] = qutepart.syntax.TextFormat(bold=True)  # glyphs are wider
+        self.qpart.colorTheme = theme
+        base._processPendingEvents(self.app)
+        self.assertIsNot(self.qpart._blockMarkers.markers(block), markers)
+
+    def test_wrap_mode_changed(self):
+        self.qpart.show()
+        self.qpart.text = 'x  '
+        base._processPendingEvents(self.app)
+
+        block = self.qpart.document().firstBlock()
+        markers = self.qpart._blockMarkers.markers(block)
+        self.qpart.setWordWrapMode(QTextOption.WrapAnywhere)
+        self.assertIsNot(self.qpart._blockMarkers.markers(block), markers)
+
+
+class SideAreas(_BaseTest):
+    def test_line_number_width(self):
+        area = self.qpart._lineNumberArea
+        self.qpart.text = 'a'
+        width = area.width()
+        self.assertEquals(area.width(), width)
+        self.qpart.text = '\n' * 100
+        self.assertGreater(area.width(), width)
+
+    def test_visible_blocks(self):
+        self.qpart.show()
+        self.qpart.text = 'a\nb\nc'
+        base._processPendingEvents(self.app)
+
+        blocks = self.qpart._visibleBlocks.blocks()
+        self.assertEquals([blockNumber for block, blockNumber, top, height in blocks], [0, 1, 2])
+        self.assertIs(self.qpart._visibleBlocks.blocks(), blocks)  # cached
+
+        self.qpart.lines.append('d')
+        self.assertEquals(len(self.qpart._visibleBlocks.blocks()), 4)
+
+
 class IsCodeOrComment(_BaseTest):
     def _wait_highlighting_finished(self):
         base._processPendingEvents(self.app)
@@ -165,6 +398,22 @@ class IsCodeOrComment(_BaseTest):
         self.assertTrue(self.qpart.isComment(1, 2))
 
 
+    def test_text_types(self):
+        self.qpart.text = 'a = "(" # )\nb'
+        self.qpart.detectSyntax(language = 'Python')
+        self._wait_highlighting_finished()
+
+        self.assertEquals(self.qpart.textTypes(0), '    sss ccc')
+        self.assertEquals(self.qpart.textTypes(self.qpart.document().lastBlock()), ' ')
+        self.assertEquals(self.qpart.codeColumns(0), [0, 1, 2, 3, 7])
+        self.assertEquals(self.qpart.codeColumns(0, 2, 5), [2, 3])
+        self.assertEquals(list(self.qpart.iterateCodeChars((0, 1), (1, 1))),
+                          [(0, 1, ' '), (0, 2, '='), (0, 3, ' '), (0, 7, ' '), (1, 0, 'b')])
+
+    def test_text_types_no_syntax(self):
+        self.qpart.text = 'a # b'
+        self.assertEquals(self.qpart.textTypes(0), '     ')
+
 class DetectSyntax(_BaseTest):
     def test_1(self):
         self.qpart.detectSyntax(xmlFileName='ada.xml')
@@ -182,6 +431,48 @@ class DetectSyntax(_BaseTest):
         self.qpart.detectSyntax(firstLine='<?php hello() ?>')
         self.assertEquals(self.qpart.language(), 'HTML')
 
+    def test_clear(self):
+        self.qpart.text = 'a + b # comment'
+        self.qpart.detectSyntax(language='Python')
+        base._processPendingEvents(self.app)
+        self.assertFalse(self.qpart.isCode(0, 7))
+        self.assertTrue(self.qpart.document().firstBlock().layout().additionalFormats())
+
+        self.qpart.clearSyntax()
+        self.assertTrue(self.qpart.isCode(0, 7))
+        self.assertFalse(self.qpart.document().firstBlock().layout().additionalFormats())
+
+    def test_stale_data_ignored(self):
+        self.qpart.text = 'a + b # comment'
+        self.qpart.detectSyntax(language='Python')
+        base._processPendingEvents(self.app)
+        self.qpart.detectSyntax(language='C++')
+        self.assertTrue(self.qpart.isCode(0, 7))  # Python data is stale, C++ data is not ready yet
+
+    def test_clear_after_switch(self):
+        self.qpart.text = 'a + b # comment'
+        self.qpart.detectSyntax(language='Python')
+        base._processPendingEvents(self.app)
+        self.qpart.detectSyntax(language='C++')  # doesn't clear Python formats, C++ highlighter overwrites them
+        self.qpart.clearSyntax()
+        base._processPendingEvents(self.app)
+        self.assertFalse(self.qpart.document().firstBlock().layout().additionalFormats())
+
+
+class ColorTheme(_BaseTest):
+    def test_change_theme(self):
+        self.qpart.text = 'a + b # comment'
+        self.qpart.detectSyntax(language='Python')
+        base._processPendingEvents(self.app)
+
+        theme = qutepart.syntax.colortheme.ColorTheme(qutepart.syntax.TextFormat)
+        theme.format['dsComment'] = qutepart.syntax.TextFormat(color='#ff0000')
+        self.qpart.colorTheme = theme
+
+        ranges = self.qpart.document().firstBlock().layout().additionalFormats()
+        self.assertEqual(ranges[-1].start, 6)
+        self.assertEqual(ranges[-1].format.foreground().color(), QColor('#ff0000'))
+
 
 class Signals(_BaseTest):
     def test_language_changed(self):
@@ -337,6 +628,28 @@ class Lines(_BaseTest):
         with self.assertRaises(IndexError):
             self.qpart.lines[-5] = 'st'
 
+    def test_setSlice_step(self):
+        self.qpart.lines[::2] = ['st', 'uv']
+        self.assertEquals(self.qpart.text, 'st\nefgh\nuv\nopqr')
+        self.assertEquals(self.qpart.lines[::-2], ['opqr', 'efgh'])
+
+    def test_delSlice(self):
+        del self.qpart.lines[1:3]
+        self.assertEquals(self.qpart.text, 'abcd\nopqr')
+        del self.qpart.lines[1:]
+        self.assertEquals(self.qpart.text, 'abcd')
+        del self.qpart.lines[:]
+        self.assertEquals(self.qpart.text, '')
+
+    def test_replaceMany(self):
+        self.qpart.lines.replaceMany({0: 'st', 1: 'uv', -1: 'wx'})
+        self.assertEquals(self.qpart.text, 'st\nuv\nklmn\nwx')
+        self.qpart.document().undo()
+        self.assertEquals(self.qpart.text, 'abcd\nefgh\nklmn\nopqr')
+
+        with self.assertRaises(IndexError):
+            self.qpart.lines.replaceMany({4: 'st'})
+
 
 class LinesWin(Lines):
     def setUp(self):
@@ -2,6 +2,7 @@
 
 import os
 import sys
+import time
 import unittest
 
 import base
@@ -70,6 +71,88 @@ class Test(unittest.TestCase):
         self._verify(bh.extraSelections(self.qpart, secondBlock, 21),
                      [(32, 33, False)])
 
+    def test_long_distance(self):
+        """Match brackets across thousands of lines. Brackets in strings and comments are ignored
+        """
+        self.qpart.lines = ['def func(param,'] + \
+                           ['         "text ( param", # (comment'] * 5000 + \
+                           ['         [x for x in (1, 2)]):']
+
+        self.qpart.detectSyntax(language = 'Python')
+
+        while self.qpart.isHighlightingInProgress():
+            QTest.qWait(20)
+
+        tree = self.qpart._bracketTree()
+        while not tree.update(time.time()):  # built in the background
+            QTest.qWait(20)
+
+        firstBlock = self.qpart.document().firstBlock()
+        lastBlock = self.qpart.document().lastBlock()
+        lastBracketPos = lastBlock.position() + len(lastBlock.text()) - 2
+
+        bh = BracketHighlighter()
+
+        self._verify(bh.extraSelections(self.qpart, firstBlock, 8),
+                     [(8, 9, True), (lastBracketPos, lastBracketPos + 1, True)])
+        self._verify(bh.extraSelections(self.qpart, lastBlock, len(lastBlock.text()) - 1),
+                     [(lastBracketPos, lastBracketPos + 1, True), (8, 9, True)])
+
+    def test_bracket_tree_built_in_background(self):
+        """First query doesn't freeze the editor, while the tree of a big document is not built
+        """
+        self.qpart.lines = ['def func(param,'] + \
+                           ['         (x, [y])'] * 50000 + \
+                           ['         ):']
+
+        self.qpart.detectSyntax(language = 'Python')
+
+        while self.qpart.isHighlightingInProgress():
+            QTest.qWait(20)
+
+        tree = self.qpart._bracketTree()
+        self.assertFalse(tree.update(time.time()))
+
+        bh = BracketHighlighter()
+        firstBlock = self.qpart.document().firstBlock()
+        startTime = time.time()
+        bh.extraSelections(self.qpart, firstBlock, 8)  # timed search
+        self.assertLess(time.time() - startTime, 0.5)
+
+        while not tree.update(time.time()):
+            QTest.qWait(20)
+
+        lastBlock = self.qpart.document().lastBlock()
+        self._verify(bh.extraSelections(self.qpart, firstBlock, 8),
+                     [(8, 9, True), (lastBlock.position() + 9, lastBlock.position() + 10, True)])
+
+    def test_bracket_tree(self):
+        """Tree is updated, when the text is edited
+        """
+        self.qpart.lines = ['def func(a, # )',
+                            '         [b,',
+                            '          {c: "}"}],']
+
+        self.qpart.detectSyntax(language = 'Python')
+
+        while self.qpart.isHighlightingInProgress():
+            QTest.qWait(20)
+
+        tree = self.qpart._bracketTree()
+        self.assertEqual(tree.depthAt(2, '('), 1)
+        self.assertEqual(tree.depthAt(2, '['), 1)
+        self.assertEqual(tree.findEnclosingBracket(2, 11, '['), (1, 9))
+        self.assertEqual(tree.findMatchingBracket(2, 10), (2, 17))
+        self.assertEqual(tree.findMatchingBracket(0, 8), None)
+
+        self.qpart.lines.insert(2, '  [x], (y))')
+        while self.qpart.isHighlightingInProgress():
+            QTest.qWait(20)
+
+        self.assertEqual(tree.findMatchingBracket(0, 8), (2, 10))
+        self.assertEqual(tree.findEnclosingBracket(3, 11, '['), (1, 9))
+        self.assertEqual(tree.depthAt(3, '('), 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,6 +2,9 @@
 
 import os
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
 import base
@@ -12,7 +15,10 @@ from PyQt4.QtTest import QTest
 
 from qutepart import Qutepart
 import qutepart.completer
-qutepart.completer._GlobalUpdateWordSetTimer._IDLE_TIMEOUT_MS = 0
+from qutepart.completionprovider import CompletionProvider
+from qutepart.completer import Completer
+from qutepart.parentchildindex import MappedParentChildIndex, ParentChildCache
+from qutepart.wordindex import SortedWords, WordCorpus, WordIndex
 
 
 class Test(unittest.TestCase):
@@ -21,6 +27,10 @@ class Test(unittest.TestCase):
     app = base.papp  # app crashes, if created more than once
 
     def setUp(self):
+        # words of documents of other tests must not be completed
+        self._sharedCorpus = Completer._corpus
+        Completer._corpus = WordCorpus()
+
         self._window = QMainWindow()
         self.qpart = Qutepart()
         self._window.setCentralWidget(self.qpart)
@@ -28,6 +38,7 @@ class Test(unittest.TestCase):
 
     def tearDown(self):
         del self.qpart
+        Completer._corpus = self._sharedCorpus
 
     def test_down_selects_first(self):
         self.qpart.text = 'aaaa\nbbbb\ncccX\ndddd\ncccY'
@@ -91,6 +102,223 @@ class Test(unittest.TestCase):
         QTest.keyClick(self.qpart, Qt.Key_Tab)
         self.assertEqual(self.qpart.text, 'aaaaa\naaaaaXXXXX\naaaaa')
 
+    def test_words_from_other_document(self):
+        other = Qutepart()
+        other.text = 'xyzOther'
+        base._processPendingEvents(self.app)
+
+        QTest.keyClicks(self.qpart, "xyz")
+        QTest.keyClick(self.qpart, Qt.Key_Tab)
+        self.assertEqual(self.qpart.text, 'xyzOther')
+
+
+    def test_provider(self):
+        class Provider(CompletionProvider):
+            def complete(self, request):
+                return [word for word in ['provided', 'providedWord', 'other'] \
+                            if word.startswith(request.wordBeforeCursor)]
+
+        self.qpart.addCompletionProvider(Provider())
+        QTest.keyClicks(self.qpart, "prov")
+        QTest.qWait(200)  # result is delivered to the GUI thread
+        QTest.keyClick(self.qpart, Qt.Key_Tab)
+        self.assertEqual(self.qpart.text, 'provided')
+
+    def test_provider_latency_budget(self):
+        class SlowProvider(CompletionProvider):
+            latencyBudget = 0.05
+            def complete(self, request):
+                time.sleep(0.2)
+                return ['slowWord']
+
+        self.qpart.addCompletionProvider(SlowProvider())
+        QTest.keyClicks(self.qpart, "slo")
+        QTest.qWait(400)
+        QTest.keyClick(self.qpart, Qt.Key_Tab)
+        self.assertFalse('slowWord' in self.qpart.text)
+
+    def test_stalled_provider(self):
+        release = threading.Event()
+        requests = []
+
+        class StalledProvider(CompletionProvider):
+            timeout = 0.1
+            def complete(self, request):
+                requests.append(request)
+                release.wait()
+                return ['stalledWord']
+
+        class Provider(CompletionProvider):
+            def complete(self, request):
+                return ['providedWord']
+
+        self.qpart.addCompletionProvider(StalledProvider())
+        self.qpart.addCompletionProvider(Provider())
+        QTest.keyClicks(self.qpart, "pro")
+        QTest.qWait(300)
+        self.assertTrue(requests[0].isCancelled())  # timed out
+
+        QTest.keyClick(self.qpart, Qt.Key_Tab)  # other provider is not blocked
+        self.assertEqual(self.qpart.text, 'providedWord')
+        release.set()
+
+
+class WordIndexTest(unittest.TestCase):
+    app = base.papp
+
+    def setUp(self):
+        self.qpart = Qutepart()
+        self.qpart.text = 'one two\ntwo three\n'
+        self.index = WordIndex(self.qpart.document())
+
+    def tearDown(self):
+        del self.qpart
+
+    def test_initial(self):
+        self.assertEqual(sorted(self.index), ['one', 'three', 'two'])
+        self.assertEqual(self.index.count('two'), 2)
+        self.assertEqual(self.index.blockNumbers('two'), [0, 1])
+
+    def test_edit_line(self):
+        self.qpart.lines[0] = 'one four'
+        self.assertEqual(sorted(self.index), ['four', 'one', 'three', 'two'])
+        self.assertEqual(self.index.count('two'), 1)
+
+        self.qpart.lines[1] = 'three'
+        self.assertFalse('two' in self.index)
+
+    def test_insert_remove_lines(self):
+        self.qpart.lines.insert(1, 'five six')
+        self.assertEqual(self.index.blockNumbers('two'), [0, 2])
+
+        del self.qpart.lines[0:2]
+        self.assertEqual(sorted(self.index), ['three', 'two'])
+        self.assertEqual(self.index.blockNumbers('three'), [0])
+
+    def test_sorted_words_updated(self):
+        sortedWords = self.index.sortedWords()
+        self.qpart.lines[0] = 'One zero'
+        self.assertEqual(list(sortedWords), ['One', 'three', 'two', 'zero'])
+
+    def test_multiline_edit(self):
+        cursor = self.qpart.textCursor()
+        cursor.setPosition(4)
+        cursor.setPosition(11, cursor.KeepAnchor)  # 'two\ntwo'
+        cursor.insertText('seven\neight\nnine')
+        self.assertEqual(self.qpart.lines[:], ['one seven', 'eight', 'nine three', ''])
+        self.assertEqual(sorted(self.index), ['eight', 'nine', 'one', 'seven', 'three'])
+
+    def test_corpus(self):
+        corpus = WordCorpus()
+        index = WordIndex(self.qpart.document(), corpus=corpus)
+        otherQpart = Qutepart()
+        otherQpart.text = 'two four'
+        otherIndex = WordIndex(otherQpart.document(), corpus=corpus)
+
+        self.assertEqual(list(corpus.sortedWords()), ['four', 'one', 'three', 'two'])
+        self.assertEqual(corpus.count('two'), 2)
+
+        self.qpart.lines[0] = 'five'
+        self.assertEqual(list(corpus.sortedWords()), ['five', 'four', 'three', 'two'])
+
+        otherIndex.del_()
+        self.assertEqual(list(corpus.sortedWords()), ['five', 'three', 'two'])
+        self.assertEqual(corpus.count('two'), 1)
+
+    def test_replace_text(self):
+        self.qpart.text = 'x y\nz'
+        self.assertEqual(sorted(self.index), ['x', 'y', 'z'])
+        self.qpart.text = ''
+        self.assertEqual(len(self.index), 0)
+
+
+class SortedWordsTest(unittest.TestCase):
+    def test_prefix_range(self):
+        words = SortedWords(['foo', 'Bar', 'FooBar', 'baz', 'fo'])
+        self.assertEqual(list(words), ['Bar', 'baz', 'fo', 'foo', 'FooBar'])
+
+        start, end = words.prefixRange('FO')
+        self.assertEqual(words[start:end], ['fo', 'foo', 'FooBar'])
+
+        start, end = words.prefixRange('foob', start, end)
+        self.assertEqual(words[start:end], ['FooBar'])
+
+        self.assertEqual(words.prefixRange('x'), (5, 5))
+
+    def test_add_remove(self):
+        words = SortedWords(['b'])
+        words.add('a')
+        words.add('c')
+        words.remove('b')
+        words.remove('not existing')
+        self.assertEqual(list(words), ['a', 'c'])
+        self.assertEqual(words.index('c'), 1)
+        self.assertEqual(words.index('b'), -1)
+
+
+class CompletionModelTest(unittest.TestCase):
+    app = base.papp
+
+    def test_common_start_case(self):
+        model = qutepart.completer._CompletionModel(SortedWords(['fooA', 'FOOb', 'fooc']))
+        model.setData('f', 'f')
+        self.assertEqual(model.canCompleteText, '')
+
+        model = qutepart.completer._CompletionModel(SortedWords(['fooA', 'fooB', 'FOO']))
+        model.setData('f', 'f')
+        self.assertEqual(model.canCompleteText, '')
+
+        model = qutepart.completer._CompletionModel(SortedWords(['fooBarA', 'fooBarB', 'x']))
+        model.setData('FO', 'FO')
+        self.assertEqual(model.canCompleteText, 'oBar')
+
+
+class ParentChildTest(unittest.TestCase):
+    app = base.papp
+
+    _SCHEMA = {'db': ['users', 'orders'],
+               'db.users': ['id', 'name', 'nickname'],
+               'users': ['id', 'name', 'nickname']}
+
+    def test_mapped_index(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            MappedParentChildIndex.write(path, self._SCHEMA)
+            index = MappedParentChildIndex(path)
+            self.assertEqual(sorted(index.children('db.users')), ['id', 'name', 'nickname'])
+            self.assertEqual(sorted(index.children('db')), ['orders', 'users'])
+            self.assertEqual(index.children('d'), [])
+            self.assertEqual(index.children('unknown'), [])
+            index.close()
+        finally:
+            os.unlink(path)
+
+    def test_lazy_fetch(self):
+        requested = []
+        def getChildren(parent):
+            requested.append(parent)
+            return self._SCHEMA.get(parent)
+
+        cache = ParentChildCache(getChildren)
+        self.assertEqual(requested, [])
+        self.assertEqual(list(cache.children('db')), ['orders', 'users'])
+        self.assertEqual(cache.children('db'), cache.children('db'))
+        self.assertEqual(cache.children('unknown'), None)
+        self.assertEqual(requested, ['db', 'unknown'])
+
+    def test_multi_level_path(self):
+        qpart = Qutepart()
+        qpart._completer = Completer(qpart, ParentChildDict=self._SCHEMA)
+
+        QTest.keyClicks(qpart, "db.us")
+        QTest.keyClick(qpart, Qt.Key_Tab)
+        self.assertEqual(qpart.text, 'db.users')
+
+        QTest.keyClicks(qpart, ".ni")
+        QTest.keyClick(qpart, Qt.Key_Tab)
+        self.assertEqual(qpart.text, 'db.users.nickname')
+
 
 if __name__ == '__main__':
     unittest.main()
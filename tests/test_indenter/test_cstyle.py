@@ -3084,6 +3084,35 @@ class Other(BaseTestClass):
         self.alignLine(2)
         self.verifyExpected(expected)
 
+    def test_alignAll(self):
+        origin = [
+            "int main() {",
+            "if (a)",
+            "foo(1,",
+            "2);",
+            "x = bar(a,",
+            "b);",
+            "return 0;",
+            "}"]
+        expected = [
+            "int main() {",
+            "  if (a)",
+            "    foo(1,",
+            "        2);",
+            "    x = bar(a,",
+            "            b);",
+            "    return 0;",
+            "}"]
+
+        self.setOrigin(origin)
+        self.alignAll()
+        self.verifyExpected(expected)
+
+        self.setOrigin(origin)  # line by line indentation gives the same result
+        for index in range(len(origin)):
+            self.alignLine(index)
+        self.verifyExpected(expected)
+
     def test_137157(self):
         origin = [
             "# 1",
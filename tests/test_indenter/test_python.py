@@ -25,6 +25,31 @@ class Test(IndentTest):
         self.type("pass");
         self.verifyExpected(expected)
 
+    def test_alignAll(self):
+        origin = [
+            "def f(a,",
+            "b):",
+            "x = [1,",
+            "2]",
+            "return x",
+            "y"]
+        expected = [
+            "def f(a,",
+            "b):",
+            "  x = [1,",
+            "  2]",
+            "  return x",
+            "y"]
+
+        self.setOrigin(origin)
+        self.alignAll()
+        self.verifyExpected(expected)
+
+        self.setOrigin(origin)  # line by line indentation gives the same result
+        for index in range(len(origin)):
+            self.alignLine(index)
+        self.verifyExpected(expected)
+
     def test_dedentContinue(self):
         origin = [
             "while True:",
@@ -217,6 +242,23 @@ class Test(IndentTest):
         self.type("x");
         self.verifyExpected(expected)
 
+    def test_enclosingBracketFarAbove(self):
+        # the bracket is further, than the indenter searches in the text. It is found with the bracket tree
+        origin = [
+            "def f():",
+            "  x = foo(1,"] + \
+            ["          2,"] * 200 + \
+            ["          3)"]
+        expected = origin + \
+            ["  x"]
+
+        self.setOrigin(origin)
+
+        self.setCursorPosition(202, 12);
+        self.enter();
+        self.type("x");
+        self.verifyExpected(expected)
+
 
 if __name__ == '__main__':
     unittest.main()
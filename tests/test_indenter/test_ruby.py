@@ -310,6 +310,35 @@ class Basic(BaseTestClass):
 
         self.verifyExpected(expected)
 
+    def test_alignAll(self):
+        origin = [
+            "def foo",
+            "x = [1,",
+            "2]",
+            "if x",
+            "y = bar(a,",
+            "b)",
+            "end",
+            "end"]
+        expected = [
+            "def foo",
+            "  x = [1,",
+            "       2]",
+            "  if x",
+            "    y = bar(a,",
+            "            b)",
+            "  end",
+            "end"]
+
+        self.setOrigin(origin)
+        self.alignAll()
+        self.verifyExpected(expected)
+
+        self.setOrigin(origin)  # line by line indentation gives the same result
+        for index in range(len(origin)):
+            self.alignLine(index)
+        self.verifyExpected(expected)
+
 
 class EmptyFile(BaseTestClass):
     def test_empty_file1(self):
@@ -8,6 +8,33 @@ class BaseTestClass(IndentTest):
     LANGUAGE = 'XML'
     INDENT_WIDTH = 2
 
+class Align(BaseTestClass):
+    def test_alignAll(self):
+        origin = [
+            '<a>',
+            '<b>',
+            'text',
+            '</b>',
+            '<c/>',
+            '</a>']
+        expected = [
+            '<a>',
+            '  <b>',
+            '    text',
+            '  </b>',
+            '  <c/>',
+            '</a>']
+
+        self.setOrigin(origin)
+        self.alignAll()
+        self.verifyExpected(expected)
+
+        self.setOrigin(origin)  # line by line indentation gives the same result
+        for index in range(len(origin)):
+            self.alignLine(index)
+        self.verifyExpected(expected)
+
+
 class Split(BaseTestClass):
     def test_split1(self):
         origin = [
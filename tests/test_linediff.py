@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+import os.path
+import random
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from qutepart.linediff import diffLines
+
+
+def _apply(oldLines, newLines, changes):
+    result = list(oldLines)
+    for oldStart, oldEnd, newStart, newEnd in reversed(changes):
+        result[oldStart:oldEnd] = newLines[newStart:newEnd]
+    return result
+
+
+class Test(unittest.TestCase):
+    def _check(self, oldLines, newLines):
+        changes = diffLines(oldLines, newLines)
+        self.assertEqual(_apply(oldLines, newLines, changes), newLines)
+        return changes
+
+    def test_simple(self):
+        self.assertEqual(self._check(['a', 'b', 'c'], ['a', 'b', 'c']), [])
+        self.assertEqual(self._check(['a', 'b', 'c'], ['a', 'x', 'c']), [(1, 2, 1, 2)])
+        self.assertEqual(self._check(['a', 'b', 'c'], ['a', 'c']), [(1, 2, 1, 1)])
+        self.assertEqual(self._check(['a', 'c'], ['a', 'b', 'c']), [(1, 1, 1, 2)])
+        self.assertEqual(self._check([], ['a']), [(0, 0, 0, 1)])
+        self.assertEqual(self._check(['a'], []), [(0, 1, 0, 0)])
+
+    def test_anchors(self):
+        oldLines = ['a', '', 'b', '', 'c', '', 'd']
+        newLines = ['a', '', 'x', '', 'c', '', 'y']
+        self.assertEqual(self._check(oldLines, newLines), [(2, 3, 2, 3), (6, 7, 6, 7)])
+
+    def test_moved_block(self):
+        self._check(['a', 'b', 'c', 'd', 'e'], ['d', 'e', 'a', 'b', 'c'])
+
+    def test_random(self):
+        random.seed(1)
+        for i in range(300):
+            oldLines = [random.choice('abcde ') for j in range(random.randint(0, 30))]
+            newLines = list(oldLines)
+            for j in range(random.randint(0, 5)):
+                position = random.randint(0, len(newLines))
+                if random.random() < 0.5 and position < len(newLines):
+                    del newLines[position]
+                else:
+                    newLines.insert(position, random.choice('abcdef '))
+            self._check(oldLines, newLines)
+
+    def test_big_scattered_changes(self):
+        """Time must be about linear. difflib.SequenceMatcher spends tens of seconds here
+        """
+        oldLines = [('' if index % 5 == 0 else 'line %d' % index) for index in range(200000)]
+        newLines = list(oldLines)
+        for index in range(1, 200000, 1000):
+            newLines[index] = 'changed %d' % index
+
+        startTime = time.time()
+        changes = self._check(oldLines, newLines)
+        self.assertLess(time.time() - startTime, 5)
+        self.assertEqual(len(changes), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
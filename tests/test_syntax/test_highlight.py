@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import os.path
+import mmap
+import tempfile
+import unittest
+import sys
+
+topLevelPath = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, topLevelPath)
+sys.path.insert(0, os.path.join(topLevelPath, 'build/lib.linux-i686-2.7/'))
+sys.path.insert(0, os.path.join(topLevelPath, 'build/lib.linux-x86_64-2.7/'))
+
+from qutepart.syntax import SyntaxManager
+
+
+_TEXT = 'def foo(): # comment\n    """doc\nstring"""\n'
+
+
+class HighlightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.manager = SyntaxManager()
+
+    def _highlight(self, textOrFile):
+        return list(self.manager.highlight(textOrFile, language='Python'))
+
+    def test_text(self):
+        lines = self._highlight(unicode(_TEXT))
+        self.assertEqual(len(lines), 3)  # no empty line after the last EOL
+
+        self.assertEqual(lines[0][0], (0, 3, 'dsKeyword', ' '))
+        self.assertEqual(lines[0][-1], (11, 9, 'dsComment', 'c'))
+        self.assertEqual(lines[1], [(0, 4, 'dsNormal', ' '), (4, 6, 'dsComment', 'c')])
+        self.assertEqual(lines[2], [(0, 9, 'dsComment', 'c')])
+
+    def test_spans_cover_line(self):
+        for line, spans in zip(_TEXT.splitlines(), self._highlight(unicode(_TEXT))):
+            self.assertEqual(sum([span[1] for span in spans]), len(line))
+
+    def test_file_and_mmap(self):
+        expected = self._highlight(unicode(_TEXT))
+
+        with tempfile.TemporaryFile() as file_:
+            file_.write(_TEXT.replace('\n', '\r\n'))
+            file_.seek(0)
+            self.assertEqual(self._highlight(file_), expected)
+
+            file_.seek(0)
+            mapped = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self.assertEqual(self._highlight(mapped), expected)
+            finally:
+                mapped.close()
+
+    def test_multibyte_encoding(self):
+        expected = self._highlight(unicode(_TEXT))
+
+        with tempfile.TemporaryFile() as file_:
+            file_.write(unicode(_TEXT).encode('utf16'))
+            file_.seek(0)
+            self.assertEqual(list(self.manager.highlight(file_, language='Python', encoding='utf16')),
+                             expected)
+
+    def test_iterable(self):
+        self.assertEqual(self._highlight(_TEXT.splitlines()), self._highlight(unicode(_TEXT)))
+
+    def test_overridden_format(self):
+        lines = list(self.manager.highlight(u'raise ValueError', language='Python', withFormats=True))
+        start, length, styleName, textType, format = lines[0][-1]
+        self.assertEqual((start, length, styleName), (6, 10, 'dsOthers'))
+        self.assertEqual(format.color, '#054d00')
+        self.assertTrue(format.bold)
+
+    def test_syntax_parameter(self):
+        syntax = self.manager.getSyntax(languageName='Python')
+        self.assertEqual(list(self.manager.highlight(unicode(_TEXT), syntax=syntax, language='C++')),
+                         self._highlight(unicode(_TEXT)))
+
+    def test_unknown_syntax(self):
+        self.assertRaises(KeyError, self.manager.highlight, u'text', language='NotExisting')
+
+
+if __name__ == '__main__':
+    unittest.main()
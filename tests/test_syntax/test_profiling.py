@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+import os.path
+import unittest
+import sys
+
+topLevelPath = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, topLevelPath)
+sys.path.insert(0, os.path.join(topLevelPath, 'build/lib.linux-i686-2.7/'))
+sys.path.insert(0, os.path.join(topLevelPath, 'build/lib.linux-x86_64-2.7/'))
+
+from qutepart.syntax import SyntaxManager
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.syntax = SyntaxManager().getSyntax(xmlFileName='python.xml')
+
+    def tearDown(self):
+        self.syntax.setProfilingEnabled(False)
+
+    def _highlight(self, text):
+        contextStack = None
+        for line in text.splitlines():
+            lineData, segments = self.syntax.highlightBlock(line, contextStack)
+            contextStack = lineData[0]
+
+    def test_disabled(self):
+        self._highlight(u'def foo(): pass')
+        report = self.syntax.profile()
+        self.assertEqual(sum([rule['attempts'] for rule in report['rules']]), 0)
+
+    def test_counters(self):
+        self.syntax.setProfilingEnabled(True)
+        self._highlight(u'def foo(): pass\n# comment')
+        report = self.syntax.profile()
+
+        self.assertEqual(report['syntax'], 'Python')
+        normal = [context for context in report['contexts'] if context['context'] == 'Normal'][0]
+        self.assertTrue(normal['attempts'] >= normal['matches'] > 0)
+
+        rules = report['rules']
+        self.assertTrue(sum([rule['matches'] for rule in rules]) > 0)
+        self.assertTrue(all([rule['attempts'] >= rule['matches'] for rule in rules]))
+        self.assertEqual(rules, sorted(rules, key=lambda rule: rule['time'], reverse=True))
+
+    def test_reset(self):
+        self.syntax.setProfilingEnabled(True)
+        self._highlight(u'def foo(): pass')
+        self.syntax.setProfilingEnabled(True)
+        report = self.syntax.profile()
+        self.assertEqual(sum([context['attempts'] for context in report['contexts']]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
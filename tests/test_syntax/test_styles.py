@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import os.path
+import unittest
+import sys
+
+topLevelPath = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, topLevelPath)
+sys.path.insert(0, os.path.join(topLevelPath, 'build/lib.linux-i686-2.7/'))
+sys.path.insert(0, os.path.join(topLevelPath, 'build/lib.linux-x86_64-2.7/'))
+
+import qutepart.syntax
+from qutepart.syntax import SyntaxManager, TextFormat
+from qutepart.syntax.colortheme import ColorTheme
+
+
+class TextFormatTestCase(unittest.TestCase):
+    def test_interned(self):
+        self.assertTrue(TextFormat(bold=True) is TextFormat(bold=True))
+        self.assertEqual(TextFormat(color='#ff0000'), TextFormat(color='#ff0000'))
+        self.assertNotEqual(TextFormat(color='#ff0000'), TextFormat())
+        self.assertEqual(len(set([TextFormat(), TextFormat(), TextFormat(italic=True)])), 2)
+
+    def test_immutable(self):
+        format = TextFormat()
+        self.assertRaises(AttributeError, setattr, format, 'bold', True)
+
+        boldFormat = format.replace(bold=True)
+        self.assertFalse(format.bold)
+        self.assertTrue(boldFormat.bold)
+        self.assertTrue(boldFormat is TextFormat(bold=True))
+
+
+class StyleTestCase(unittest.TestCase):
+    def test_registry(self):
+        styleId = qutepart.syntax.registerStyle('dsKeyword', [('color', '#ff0000')])
+        self.assertEqual(styleId, qutepart.syntax.registerStyle('dsKeyword', [('color', '#ff0000')]))
+        self.assertNotEqual(styleId, qutepart.syntax.registerStyle('dsKeyword'))
+        self.assertEqual(qutepart.syntax.styleName(styleId), 'dsKeyword')
+
+    def test_theme(self):
+        styleId = qutepart.syntax.registerStyle('dsKeyword', [('color', '#ff0000')])
+
+        theme = ColorTheme(TextFormat)
+        self.assertEqual(qutepart.syntax.styleFormat(styleId, theme),
+                         TextFormat(color='#ff0000', bold=True))
+
+        theme.format['dsKeyword'] = TextFormat(italic=True)
+        self.assertEqual(qutepart.syntax.styleFormat(styleId, theme),
+                         TextFormat(color='#ff0000', italic=True))
+
+    def test_segments_have_style_ids(self):
+        syntax = SyntaxManager().getSyntax(xmlFileName='python.xml')
+        lineData, segments = syntax.highlightBlock(u'def foo(): # bar', None)
+        styleNames = [qutepart.syntax.styleName(styleId) \
+                        for length, styleId in segments \
+                            if styleId is not None]
+        self.assertEqual(styleNames[0], 'dsKeyword')
+        self.assertEqual(styleNames[-1], 'dsComment')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+"""Highlight many files in parallel and write HTML, ANSI or JSON token streams.
+
+Syntax is detected by file name and first line.
+Every worker process keeps own SyntaxManager, so loaded syntaxes are reused.
+A worker, which hasn't finished a file in time, is killed and replaced, because a signal can't interrupt
+a regular expression, which runs in the C parser.
+Results are written to temporary files, which are renamed when the file is highlighted completely.
+"""
+
+import argparse
+import cgi
+import itertools
+import json
+import multiprocessing
+import os
+import os.path
+import signal
+import sys
+import time
+
+sys.path.insert(0, '.')
+sys.path.insert(0, '..')
+
+from qutepart.syntax import SyntaxManager, TextFormat
+from qutepart.syntax.colortheme import ColorTheme
+
+
+_OUTPUT_EXTENSIONS = {'html': '.html', 'ansi': '.ansi', 'json': '.json'}
+
+_OK = 'ok'
+_NO_SYNTAX = 'no syntax'
+_TIMEOUT = 'timeout'
+_ERROR = 'error'
+
+_POLL_INTERVAL_SEC = 0.01
+
+
+################################################################################
+##                               Renderers
+################################################################################
+
+def _rgb(color):
+    color = color.lstrip('#')
+    if len(color) == 3:
+        color = ''.join([c * 2 for c in color])
+    return int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16)
+
+
+class _HtmlRenderer:
+    def __init__(self, output, theme):
+        self._output = output
+        self._theme = theme
+
+    def begin(self, path, syntaxName):
+        self._output.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n')
+        self._output.write('<title>%s</title>\n' % cgi.escape(path))
+        self._output.write('<style>\n')
+        normal = self._theme.getFormat('dsNormal')
+        self._output.write('pre {color: %s; background: %s}\n' % (normal.color, normal.background))
+        for styleName, format in sorted(self._theme.format.items()):
+            self._output.write('.%s {%s}\n' % (styleName, self._css(format)))
+        self._output.write('</style>\n</head>\n<body>\n<pre>')
+
+    @staticmethod
+    def _css(format):
+        properties = ['color: %s' % format.color]
+        if format.background != TextFormat().background:
+            properties.append('background: %s' % format.background)
+        if format.bold:
+            properties.append('font-weight: bold')
+        if format.italic:
+            properties.append('font-style: italic')
+        decorations = []
+        if format.underline:
+            decorations.append('underline')
+        if format.strikeOut:
+            decorations.append('line-through')
+        if decorations:
+            properties.append('text-decoration: %s' % ' '.join(decorations))
+        return '; '.join(properties)
+
+    def line(self, text, spans):
+        parts = []
+        end = 0
+        for start, length, styleName, textType, format in spans:
+            if format == self._theme.getFormat(styleName):
+                parts.append('<span class="%s">%s</span>' % (styleName, cgi.escape(text[start:start + length])))
+            else:  # attributes are overridden by the syntax definition
+                parts.append('<span class="%s" style="%s">%s</span>' % \
+                                (styleName, self._css(format), cgi.escape(text[start:start + length])))
+            end = start + length
+        parts.append(cgi.escape(text[end:]))
+        self._output.write(''.join(parts).encode('utf8') + '\n')
+
+    def end(self):
+        self._output.write('</pre>\n</body>\n</html>\n')
+
+
+class _AnsiRenderer:
+    _RESET = '\x1b[0m'
+
+    def __init__(self, output, theme):
+        self._output = output
+        self._escapes = {}  # TextFormat: escape sequence
+
+    def _escape(self, format):
+        if not format in self._escapes:
+            codes = ['38;2;%d;%d;%d' % _rgb(format.color)]
+            if format.bold:
+                codes.append('1')
+            if format.italic:
+                codes.append('3')
+            if format.underline:
+                codes.append('4')
+            if format.strikeOut:
+                codes.append('9')
+            self._escapes[format] = '\x1b[%sm' % ';'.join(codes)
+        return self._escapes[format]
+
+    def begin(self, path, syntaxName):
+        pass
+
+    def line(self, text, spans):
+        parts = []
+        end = 0
+        for start, length, styleName, textType, format in spans:
+            parts.append(self._escape(format) + text[start:start + length] + self._RESET)
+            end = start + length
+        parts.append(text[end:])
+        self._output.write(''.join(parts).encode('utf8') + '\n')
+
+    def end(self):
+        pass
+
+
+class _JsonRenderer:
+    """Writes one JSON object. Lines are written one by one, so memory usage doesn't depend on file size.
+    Span is ``[start, length, styleName, textType, overriddenAttributes]``, where ``overriddenAttributes``
+    are the format attributes, which the syntax definition changes in the style of the theme
+    """
+    def __init__(self, output, theme):
+        self._output = output
+        self._theme = theme
+        self._firstLine = True
+
+    def _overriddenAttributes(self, styleName, format):
+        themeFormat = self._theme.getFormat(styleName)
+        return dict([(name, getattr(format, name)) for name in TextFormat.__slots__ \
+                        if getattr(format, name) != getattr(themeFormat, name)])
+
+    def begin(self, path, syntaxName):
+        self._output.write('{"file": %s, "syntax": %s, "lines": [\n' % (json.dumps(path), json.dumps(syntaxName)))
+
+    def line(self, text, spans):
+        if not self._firstLine:
+            self._output.write(',\n')
+        self._firstLine = False
+        self._output.write(json.dumps([(start, length, styleName, textType,
+                                        self._overriddenAttributes(styleName, format)) \
+                                            for start, length, styleName, textType, format in spans]))
+
+    def end(self):
+        self._output.write('\n]}\n')
+
+
+_RENDERERS = {'html': _HtmlRenderer, 'ansi': _AnsiRenderer, 'json': _JsonRenderer}
+
+
+################################################################################
+##                               Worker
+################################################################################
+
+_manager = None
+_theme = None
+
+
+def _partPath(outputPath):
+    """Temporary file, to which the result is written
+    """
+    return outputPath + '.part'
+
+
+def _removeFile(path):
+    try:
+        os.remove(path)
+    except OSError:  # doesn't exist
+        pass
+
+
+def _decodedLines(file_):
+    for line in file_:
+        yield line.decode('utf8', 'replace').rstrip(u'\r\n')
+
+
+def _highlightFile(task):
+    """Highlight one file and write the result.
+    Returns (path, syntaxName, lineCount, byteCount, seconds, status, errorMessage)
+    """
+    path, outputPath, outputFormat = task
+
+    timeBefore = time.time()
+    syntaxName = None
+    lineCount = 0
+    byteCount = 0
+    partPath = _partPath(outputPath)
+
+    try:
+        byteCount = os.path.getsize(path)
+        with open(path, 'rb') as file_:
+            firstLine = file_.readline().decode('utf8', 'replace').rstrip(u'\r\n')
+            file_.seek(0)
+
+            syntax = _manager.getSyntax(sourceFilePath=path, firstLine=firstLine)
+            if syntax is None:
+                return path, None, 0, byteCount, time.time() - timeBefore, _NO_SYNTAX, None
+            syntaxName = syntax.name
+
+            outputDir = os.path.dirname(outputPath)
+            if outputDir and not os.path.isdir(outputDir):
+                try:
+                    os.makedirs(outputDir)
+                except OSError:  # created by other worker
+                    pass
+
+            linesForText, linesForHighlighting = itertools.tee(_decodedLines(file_))
+            with open(partPath, 'wb') as output:
+                renderer = _RENDERERS[outputFormat](output, _theme)
+                renderer.begin(path, syntaxName)
+                spanLines = _manager.highlight(linesForHighlighting, syntax=syntax, colorTheme=_theme,
+                                               withFormats=True)
+                for text, spans in itertools.izip(linesForText, spanLines):
+                    renderer.line(text, spans)
+                    lineCount += 1
+                renderer.end()
+
+        if os.path.exists(outputPath):  # os.rename() doesn't replace files on Windows
+            os.remove(outputPath)
+        os.rename(partPath, outputPath)
+    except Exception as ex:  # one broken file or syntax definition must not stop the batch
+        _removeFile(partPath)
+        return path, syntaxName, lineCount, byteCount, time.time() - timeBefore, _ERROR, \
+               '%s: %s' % (ex.__class__.__name__, ex)
+
+    return path, syntaxName, lineCount, byteCount, time.time() - timeBefore, _OK, None
+
+
+def _workerMain(connection):
+    """Worker process. Receives tasks and sends results, until None is received
+    """
+    global _manager, _theme
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # main process handles Ctrl+C
+    _manager = SyntaxManager()
+    _theme = ColorTheme(TextFormat)
+
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:  # main process has finished
+            return
+        if task is None:
+            return
+        connection.send(_highlightFile(task))
+
+
+class _Worker:
+    """Worker process and the task, which it is processing now
+    """
+    def __init__(self):
+        self._connection, childConnection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_workerMain, args=(childConnection,))
+        self._process.daemon = True
+        self._process.start()
+        childConnection.close()  # otherwise recv() doesn't get EOF, if the worker dies
+
+        self.task = None
+        self._startTime = None
+
+    def start(self, task):
+        self.task = task
+        self._startTime = time.time()
+        self._connection.send(task)
+
+    def isAlive(self):
+        return self._process.is_alive()
+
+    def result(self, timeout):
+        """Result of the task or None, if it is not finished yet.
+        The worker is killed, if the task takes longer than ``timeout`` seconds
+        """
+        if self._connection.poll():
+            try:
+                result = self._connection.recv()
+            except EOFError:  # crashed, i.e. segfault in the C parser
+                self._process.join()
+                result = self._failedResult(_ERROR,
+                                            'Worker process failed with exit code %s' % self._process.exitcode)
+        elif timeout and time.time() - self._startTime > timeout:
+            self._kill()
+            result = self._failedResult(_TIMEOUT, None)
+        else:
+            return None
+
+        self.task = None
+        return result
+
+    def stop(self):
+        if self.task is not None:
+            self._kill()
+            _removeFile(_partPath(self.task[1]))
+        elif self.isAlive():
+            self._connection.send(None)
+            self._process.join()
+
+    def _kill(self):
+        self._process.terminate()
+        self._process.join()
+
+    def _failedResult(self, status, errorMessage):
+        path, outputPath, outputFormat = self.task
+        _removeFile(_partPath(outputPath))
+        return path, None, 0, 0, time.time() - self._startTime, status, errorMessage
+
+
+def _runTasks(tasks, jobCount, timeout, onResult):
+    """Process tasks with jobCount workers. onResult is called for every result
+    """
+    tasks = list(reversed(tasks))  # pop() from the end
+    workers = [_Worker() for index in range(max(1, min(jobCount, len(tasks))))]
+    try:
+        while tasks or any([worker.task is not None for worker in workers]):
+            idle = True
+            for index, worker in enumerate(workers):
+                if worker.task is None:
+                    if tasks:
+                        worker.start(tasks.pop())
+                    continue
+
+                result = worker.result(timeout)
+                if result is not None:
+                    idle = False
+                    onResult(result)
+                    if not worker.isAlive():  # killed or crashed
+                        workers[index] = _Worker()
+            if idle:
+                time.sleep(_POLL_INTERVAL_SEC)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+
+################################################################################
+##                               Main process
+################################################################################
+
+def _collectTasks(paths, outputDir, outputFormat):
+    tasks = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirPath, dirNames, fileNames in os.walk(path):
+                dirNames[:] = [name for name in dirNames if not name.startswith('.')]
+                for fileName in sorted(fileNames):
+                    filePath = os.path.join(dirPath, fileName)
+                    relPath = os.path.relpath(filePath, path)
+                    tasks.append((filePath, os.path.join(outputDir, relPath + _OUTPUT_EXTENSIONS[outputFormat]),
+                                  outputFormat))
+        else:
+            tasks.append((path, os.path.join(outputDir, os.path.basename(path) + _OUTPUT_EXTENSIONS[outputFormat]),
+                          outputFormat))
+    return tasks
+
+
+def _printStats(results, totalTime, slowestCount):
+    statusCounts = {}
+    for path, syntaxName, lineCount, byteCount, seconds, status, errorMessage in results:
+        statusCounts[status] = statusCounts.get(status, 0) + 1
+
+    highlighted = [result for result in results if result[5] == _OK]
+    byteCount = sum([result[3] for result in highlighted])
+    lineCount = sum([result[2] for result in highlighted])
+
+    print 'Files: %d in %.2f sec, %.1f files/sec' % (len(results), totalTime, len(results) / max(totalTime, 1e-9))
+    print 'Highlighted: %d lines, %.2f MB, %.2f MB/s' % \
+            (lineCount, byteCount / 1024. / 1024., byteCount / 1024. / 1024. / max(totalTime, 1e-9))
+    for status in (_OK, _NO_SYNTAX, _TIMEOUT, _ERROR):
+        print '    %-10s %d' % (status, statusCounts.get(status, 0))
+
+    errors = [result for result in results if result[5] == _ERROR]
+    if errors:
+        print
+        print 'Errors:'
+        for path, syntaxName, lineCount, byteCount, seconds, status, errorMessage in errors:
+            print '    %s: %s' % (path, errorMessage)
+
+    print
+    print 'Slowest files:'
+    for path, syntaxName, lineCount, byteCount, seconds, status, errorMessage in \
+            sorted(results, key=lambda result: result[4], reverse=True)[:slowestCount]:
+        print '    %8.3f sec %-10s %-20s %s' % (seconds, status, syntaxName, path)
+
+    syntaxStats = {}  # syntax name: [files, bytes, seconds]
+    for path, syntaxName, lineCount, byteCount, seconds, status, errorMessage in results:
+        if syntaxName is not None:
+            stats = syntaxStats.setdefault(syntaxName, [0, 0, 0.])
+            stats[0] += 1
+            stats[1] += byteCount
+            stats[2] += seconds
+
+    print
+    print 'Slowest syntaxes:'
+    for syntaxName, (files, bytes, seconds) in \
+            sorted(syntaxStats.items(), key=lambda item: item[1][2], reverse=True)[:slowestCount]:
+        print '    %8.3f sec %6d files %8.3f MB/s %s' % \
+                (seconds, files, bytes / 1024. / 1024. / max(seconds, 1e-9), syntaxName)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='+', metavar='PATH', help='File or directory to highlight')
+    parser.add_argument('-o', '--output-dir', required=True, help='Directory for results')
+    parser.add_argument('-f', '--format', choices=sorted(_RENDERERS.keys()), default='html', help='Output format')
+    parser.add_argument('-j', '--jobs', type=int, default=multiprocessing.cpu_count(), help='Worker process count')
+    parser.add_argument('-t', '--timeout', type=float, default=10., help='Per file timeout in seconds, including syntax loading. 0 to disable')
+    parser.add_argument('--slowest', type=int, default=10, help='Count of files and syntaxes in the stats report')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Do not report progress')
+    args = parser.parse_args()
+
+    tasks = _collectTasks(args.paths, args.output_dir, args.format)
+
+    timeBefore = time.time()
+    results = []
+
+    def onResult(result):
+        results.append(result)
+        if not args.quiet:
+            sys.stderr.write('\r[%d/%d] %s' % (len(results), len(tasks), result[0][-50:].ljust(50)))
+
+    _runTasks(tasks, args.jobs, args.timeout, onResult)
+
+    if not args.quiet:
+        sys.stderr.write('\n')
+
+    _printStats(results, time.time() - timeBefore, args.slowest)
+
+    return 0 if all([result[5] != _TIMEOUT for result in results]) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
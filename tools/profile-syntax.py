@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""Highlight a file with profiling enabled and print the slowest contexts and rules of the syntax definition
+"""
+
+import argparse
+import sys
+import time
+
+sys.path.insert(0, '.')
+sys.path.insert(0, '..')
+
+import qutepart
+from qutepart.syntax import SyntaxManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('file', help='Source file')
+    parser.add_argument('-x', '--xml', help='Syntax definition XML file name. Detected by file name, if not set')
+    parser.add_argument('-n', '--top', type=int, default=20, help='Count of contexts and rules to print')
+    args = parser.parse_args()
+
+    with open(args.file, 'rb') as file_:
+        lines = [line.decode('utf8', 'replace').rstrip(u'\r\n') for line in file_]
+
+    syntax = SyntaxManager().getSyntax(xmlFileName=args.xml,
+                                       sourceFilePath=args.file,
+                                       firstLine=lines[0] if lines else None)
+    if syntax is None:
+        print >> sys.stderr, 'Failed to detect syntax'
+        return 1
+
+    syntax.setProfilingEnabled(True)
+    timeBefore = time.time()
+    contextStack = None
+    for line in lines:
+        lineData, segments = syntax.highlightBlock(line, contextStack)
+        contextStack = lineData[0]
+    totalTime = time.time() - timeBefore
+    syntax.setProfilingEnabled(False)
+
+    report = syntax.profile()
+
+    print 'Syntax: %s. Parser: %s' % (report['syntax'], 'C' if qutepart.binaryParserAvailable else 'Python')
+    print '%d lines highlighted in %.3f sec' % (len(lines), totalTime)
+    print
+    print 'Contexts:'
+    print '    %10s %10s %10s  %s' % ('time, sec', 'attempts', 'matches', 'context')
+    for item in report['contexts'][:args.top]:
+        print '    %10.4f %10d %10d  %s' % (item['time'], item['attempts'], item['matches'], item['context'])
+    print
+    print 'Rules:'
+    print '    %10s %10s %10s  %s' % ('time, sec', 'attempts', 'matches', 'context: index rule')
+    for item in report['rules'][:args.top]:
+        print '    %10.4f %10d %10d  %s: %d %s' % \
+                (item['time'], item['attempts'], item['matches'], item['context'], item['index'], item['rule'])
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())